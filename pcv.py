@@ -40,6 +40,16 @@ if sys.version_info < (3, 8):
   raise RuntimeError('This program requires Python 3.8 or later.')
 
 # pylint: disable=wrong-import-position
+if __name__ == '__main__' and sys.argv[1:2] == ['batch']:
+  from src.utils import batch_parser
+  n = batch_parser().parse_args(sys.argv[2:])
+  from src.core.batch import Batch # headless, does not import open3d
+  sys.exit(Batch(n).run())
+if __name__ == '__main__' and sys.argv[1:2] == ['serve']:
+  from src.utils import serve_parser
+  n = serve_parser().parse_args(sys.argv[2:])
+  from src.core.daemon import Daemon # headless, does not import open3d
+  sys.exit(Daemon(n).run())
 if __name__ == '__main__':
   from src.utils import parser
   n = parser().parse_args() # parse arguments before importing App
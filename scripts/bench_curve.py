@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Compare spatial operations on points in file order and sorted along space-filling curves.
+
+  Usage:
+    `python3 ./scripts/bench_curve.py [N]`
+
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from src.core.pipeline import RadiusOutlierRemoval, Reorder # pylint: disable=wrong-import-position
+from src.core.spatial import TileGrid                        # pylint: disable=wrong-import-position
+from src.core.store import PointStore                        # pylint: disable=wrong-import-position
+from src.core.voxel import VoxelGrid                         # pylint: disable=wrong-import-position
+
+
+def make_store(n: int) -> PointStore:
+  """
+  Makes `n` points of a scanned terrain, in the random order of overlapping scans.
+  """
+  rng = np.random.default_rng(42)
+  xyz = rng.random((n, 3)) * (500, 500, 1)
+  xyz[:, 2] += 10 * np.sin(xyz[:, 0] / 50) * np.cos(xyz[:, 1] / 70)
+  return PointStore(xyz, rng.integers(0, 256, (n, 3)), rng.integers(0, 16, n))
+
+
+def timed(func, *args) -> float:
+  start = time.perf_counter()
+  func(*args)
+  return time.perf_counter() - start
+
+
+def bench(store: PointStore) -> dict[str, float]:
+  """
+  Times the downstream operations on a store.
+  """
+  stage = RadiusOutlierRemoval(nb_points=4, radius=1.)
+  boxes = np.random.default_rng(0).random((200, 3)) * (480, 480, 0)
+  return {
+    'voxel grid': timed(VoxelGrid.from_xyz, store.xyz, 2.),
+    '200 bbox crops': timed(lambda: [store.crop(lo - (0, 0, 20), lo + (20, 20, 20)) for lo in boxes]),
+    'radius outlier': timed(stage.compute, store, TileGrid(store.xyz, 50.), None),
+  }
+
+
+def main() -> None:
+  n = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000
+  store = make_store(n)
+  print(f'{format(n, "_")} points')
+  results = {'file order': bench(store)}
+  for curve in ('morton', 'hilbert'):
+    stage = Reorder(curve=curve)
+    start = time.perf_counter()
+    sorted_store = stage.apply(store, stage.compute(store, None, None))
+    print(f'{curve:>14} sort : {time.perf_counter() - start:.3f} s')
+    results[curve] = bench(sorted_store)
+  print(f'{"":>14} ' + ' '.join(f'{name:>12}' for name in results))
+  for op in results['file order']:
+    print(f'{op:>14} ' + ' '.join(f'{r[op]:>10.3f} s' for r in results.values()))
+
+
+if __name__ == '__main__':
+  main()
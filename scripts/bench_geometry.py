@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Compare point cloud geometry build times, before and after render buffers.
+
+  Usage:
+    `python3 ./scripts/bench_geometry.py [N]`
+
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import time
+
+import numpy as np
+from open3d import geometry
+from open3d import utility
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from src.core.buffer import RenderBuffer # pylint: disable=wrong-import-position
+from src.core.point import Point         # pylint: disable=wrong-import-position
+
+
+def make_points(n: int) -> list[Point]:
+  """
+  Makes `n` random colored points with a handful of ids.
+  """
+  rng = np.random.default_rng(42)
+  data = np.concatenate((rng.random((n, 3)) * 100, rng.integers(0, 256, (n, 3)), rng.integers(0, 16, (n, 1))), axis=1)
+  return [Point(*row) for row in data]
+
+
+def bench_map(points: list[Point]) -> float:
+  """
+  Builds the geometry the way it used to be, converting points one by one.
+  """
+  start = time.perf_counter()
+  pc = geometry.PointCloud()
+  pc.points = utility.Vector3dVector(map(lambda p: p.get_xyz(), points))        # pylint: disable=bad-builtin
+  pc.colors = utility.Vector3dVector(map(lambda p: p.get_color(False), points)) # pylint: disable=bad-builtin
+  return time.perf_counter() - start
+
+
+def bench_buffer(points: list[Point]) -> float:
+  """
+  Builds the geometry from a contiguous render buffer.
+  """
+  start = time.perf_counter()
+  pc = geometry.PointCloud()
+  RenderBuffer.from_points(points).attach(pc)
+  return time.perf_counter() - start
+
+
+def bench_update(points: list[Point]) -> float:
+  """
+  Updates 1% of an already built geometry in place.
+  """
+  pc = geometry.PointCloud()
+  buffer = RenderBuffer.from_points(points)
+  buffer.attach(pc)
+  xyz, rgb = buffer.xyz.copy(), buffer.rgb.copy()
+  xyz[:len(xyz) // 100] += 1.
+  start = time.perf_counter()
+  buffer.update(pc, xyz, rgb)
+  return time.perf_counter() - start
+
+
+def main() -> None:
+  n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+  points = make_points(n)
+  print(f'{format(n, "_")} points')
+  for name, bench in (('map (before)', bench_map), ('buffer', bench_buffer), ('in-place 1%', bench_update)):
+    print(f'{name:>14} : {bench(points):.3f} s')
+
+
+if __name__ == '__main__':
+  main()
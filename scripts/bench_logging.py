@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Time a hot loop logging one warning per iteration (e.g. one per bad line) with every logging setup.
+
+  Usage:
+    `python3 ./scripts/bench_logging.py [N]`
+
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import time
+import logging
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from src.log.fmt import AsyncHandler, RepeatFilter, UsefulFormatter, UselessHandler # pylint: disable=wrong-import-position
+from src.log.fmt import formatter                                                   # pylint: disable=wrong-import-position
+from src.log.logger import skip_record_details                                      # pylint: disable=wrong-import-position
+
+
+class RebuiltFormatter(UsefulFormatter):
+  """
+  The formatter before caching : a new format and `logging.Formatter` per record.
+  """
+
+  def format(self, record: logging.LogRecord) -> str:
+    self.name_width = max(len(record.name) + 1, self.name_width)
+    c, attrs = self.colors[record.levelno]
+    return logging.Formatter(formatter(c, self.colored_output, self.name_width, attrs),
+                             self.dt_fmt).format(record)
+
+
+def make_handler(stream, fmt: type[UsefulFormatter], asynchronous: bool, repeats: bool) -> logging.Handler:
+  handler = UselessHandler(stream, exit_on_critical=False)
+  handler.setFormatter(fmt(colored_output=True))
+  if asynchronous:
+    handler = AsyncHandler(handler).start()
+  if repeats:
+    handler.addFilter(RepeatFilter())
+  return handler
+
+
+def bench(n: int, handler: logging.Handler) -> tuple[float, float]:
+  """
+  Logs `n` warnings, returns the time spent in the loop and the time until everything is written.
+  """
+  log = logging.getLogger('loader')
+  log.handlers, log.propagate = [handler], False
+  start = time.perf_counter()
+  for i in range(n):
+    log.warning('Skipped bad line %d (%s)', i, 'x;y;z')
+  loop = time.perf_counter() - start
+  if isinstance(handler, AsyncHandler):
+    handler.stop()
+  return loop, time.perf_counter() - start
+
+
+def main() -> None:
+  n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+  setups = {
+    'formatter per record': (RebuiltFormatter, False, False),
+    'cached formatter': (UsefulFormatter, False, False),
+    'async queue': (UsefulFormatter, True, False),
+    'async + repeats': (UsefulFormatter, True, True),
+  }
+  skip_record_details() # as init_logger does
+  print(f'{format(n, "_")} warnings')
+  print(f'{"":>20} {"loop":>10} {"written":>10}')
+  with open(os.devnull, 'w', encoding='utf-8') as devnull:
+    for name, setup in setups.items():
+      loop, total = bench(n, make_handler(devnull, *setup))
+      print(f'{name:>20} {loop:>8.3f} s {total:>8.3f} s')
+
+
+if __name__ == '__main__':
+  main()
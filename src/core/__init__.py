@@ -1 +1,11 @@
-from .app import *
+# `App` imports open3d which is slow and needs a display stack,
+# so it is only imported when accessed (headless modules stay importable without it)
+
+__all__ = ['App'] # pylint: disable=undefined-all-variable
+
+
+def __getattr__(name: str):
+  if name == 'App':
+    from .app import App # pylint: disable=import-outside-toplevel
+    return App
+  raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
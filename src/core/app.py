@@ -2,11 +2,14 @@ from __future__ import annotations
 
 import os
 import sys
+import json
+import math
+import time
 import signal
 import logging
-import random
 from multiprocessing import Process
 
+from collections.abc import Callable
 from typing import Any
 from datetime import datetime
 
@@ -17,16 +20,36 @@ from open3d import geometry
 from open3d import utility
 
 from termcolor import colored
-import pyjson5
 import numpy as np
-from alive_progress import alive_it, alive_bar, config_handler
+from alive_progress import alive_bar, config_handler
 from alive_progress.animations.bars import bar_factory
 from alive_progress.animations.spinners import frame_spinner_factory
 
+from .batch import save_npy
+from .budget import BYTES_PER_POINT, choose_voxel_size
+from .buffer import RenderBuffer
+from .cache import DownsampleCache, fingerprint
+from .colormap import apply_colormap
+from .compare import DistanceSummary, cloud_distances, load_xyz
 from .config import Config
-from .point import *
+from .daemon import DaemonClient
+from .journal import Journal
+from .layers import LayerSet
+from .loader import read_config_file, select_configs, iter_chunks, load_file
+from .pipeline import Pipeline
+from .ply import write_ply
+from .point import get_colors
+from .preview import PreviewStats, preview_file
+from .progressive import ChunkLoader, Throttle
+from .raster import BANDS, collect_raster
+from .rowindex import RowIndex
+from .sequence import FrameRing
+from .sketch import QuantileSketch
+from .stats import Stats, collect_stats, format_table
+from .store import PointStore
+from .thumbnail import write_thumbnails
 
-from ..log.logger import init_logger
+from ..log.logger import init_logger, flush_logger
 
 __all__ = ['App']
 
@@ -43,16 +66,38 @@ class Args:
   make_parent: bool        # make parent directory of save path if it does not exist
   no_exe: bool             # no gui
   only: set[int] | None    # only parse this many files
+  cache_dir: str | None    # downsample cache directory
+  cache_size: int          # maximum size of the downsample cache
+  no_cache: bool           # do not use the downsample cache
+  attach: str | None       # socket of a daemon to show the points of
+  preview: int | None      # number of windows read per file for a quick look
+  preview_random: bool     # random offsets instead of stratified ones for the quick look
+  window: tuple | None     # shown time window (start included, end excluded)
+  sequence: float | None   # play the files as frames, at this many frames per second
+  sequence_memory: int     # memory of the decoded frames around the shown one
+  layers: str | None       # one geometry per file or per class id
+  max_points: int | None   # rendered points budget, the voxel size is chosen to fit it
+  checkpoint: bool         # checkpoint the parsed points of --save, so that an interrupted run can be resumed
+  resume: bool             # continue an interrupted --save from its checkpoints
+  thumbnails: bool         # write png previews next to --save
+  stats: str | None        # print the statistics of the files (table or json) instead of showing them
+  compare: str | None      # config of a reference epoch the points are colored by their distance to
+  distance: float | None   # reference points are not looked for farther than this, with --compare
+  scalar: str | None       # colormap of the {i} scalar field
+  stretch: tuple           # percentiles of the scalar field at the ends of the colormap
+  raster: float | None     # cell size of the grids written to --save instead of the points
 
 
 class App:
 
+  REFRESH_HZ = 4 # maximum geometry updates per second while loading
+
   def __init__(self, args: Namespace) -> None:
     self.__check_args(args)
     self.args = Args(
       verbose=args.verbose,
       cbid=args.cbid,
-      cfg=args.cfg or self.__get_json_config_path(),
+      cfg=args.cfg or (None if args.attach is not None else self.__get_json_config_path()),
       frac=args.frac,
       voxel_size=args.voxel_size,
       downsample=args.downsample,
@@ -60,29 +105,74 @@ class App:
       make_parent=args.make_parent,
       no_exe=args.no_exe,
       only=args.only,
+      cache_dir=args.cache_dir,
+      cache_size=args.cache_size,
+      no_cache=args.no_cache,
+      attach=args.attach,
+      preview=args.preview,
+      preview_random=args.preview_random,
+      window=args.time_window,
+      sequence=args.sequence,
+      sequence_memory=args.sequence_memory,
+      layers=args.layers,
+      max_points=self.__budget(args),
+      checkpoint=args.checkpoint or args.resume,
+      resume=args.resume,
+      thumbnails=args.thumbnails,
+      stats=args.stats,
+      compare=args.compare,
+      distance=args.compare_max_distance,
+      scalar=args.scalar,
+      stretch=args.stretch or (2., 98.),
+      raster=args.raster,
     )
 
     log_lvl = logging.DEBUG if self.args.verbose else logging.INFO
     supports_color = init_logger(log_lvl)
     self.log = logging.getLogger('core.App')
     self.log.debug('Received json config file path (%s)', self.args.cfg)
-    if not os.path.isfile(self.args.cfg):
+    if self.args.attach is None and not os.path.isfile(self.args.cfg):
       self.log.critical('Invalid json config file path supplied (%s)', self.args.cfg)
 
     __bar = bar_factory('\u2501', borders=(' ', ' '), background=' ')
     __spinner = frame_spinner_factory([colored(p, 'cyan') if supports_color else p for p in '⠋⠙⠹⠸⠼⠴⠦⠧⠇⠏'])
     config_handler.set_global(length=40, max_cols=110, enrich_print=False, bar=__bar, spinner=__spinner)
 
-    self.vis: visualization.Visualizer = None
-    self.pc: geometry.PointCloud = geometry.PointCloud()  # point cloud geometry
-    self.spc: geometry.PointCloud = geometry.PointCloud() # saved point cloud geometry
-    if not self.args.no_exe:
-      self.vis = visualization.Visualizer()               # pylint: disable=no-member
+    self.vis: visualization.VisualizerWithKeyCallback = None
+    self.pc: geometry.PointCloud = geometry.PointCloud()   # point cloud geometry
+    self.buffer: RenderBuffer = None                       # arrays backing the geometry
+    self.shown = False                                     # whether the geometry was added to the gui
+    if not self.args.no_exe and self.args.stats is None and self.args.raster is None:
+      self.vis = visualization.VisualizerWithKeyCallback() # pylint: disable=no-member
       self.vis.create_window(window_name='Point Cloud Visualizer', height=600, width=800)
+      self.__register_keys()
       self.log.info('GUI up and ready 🚀')
 
     self.log.info('Setting up the application...')
-    self.points: list[Point] = [] # list of points (from all files)
+    self.chunks: list[np.ndarray] = [] # (N, 9) points of each file
+    self.store: PointStore = None      # columnar points, once all files are parsed
+    self.subset: PointStore = None     # points of the time window (shown and saved instead of the store)
+    self.last_window: tuple = None     # time window shown before toggling it off
+    self.cache: DownsampleCache = None # reductions memoized across sessions
+    self.fingerprint: str = None       # fingerprint of the parsed files
+    self.pipeline: Pipeline = None     # processing stages from the config file
+    self.loader: ChunkLoader = None    # background parsing, while the gui shows the first points
+    self.client: DaemonClient = None   # daemon holding the points, with --attach
+    self.ring: FrameRing = None        # frames decoded around the shown one, with --sequence
+    self.frame = -1                    # shown frame
+    self.target = 0                    # frame to show as soon as it is decoded
+    self.playing = False               # frames advance on a timer
+    self.requested = 0.                # when the target frame was requested
+    self.latencies: list[float] = []   # seconds from the request of a frame to its display
+    self.layers: LayerSet = None       # one geometry per file or per class id, with --layers
+    self.names: list[str] = []         # names of the parsed files
+    self.journal: Journal = None       # checkpoints of the parsed files, with --save
+    self.cancelled = False             # a signal asked to stop parsing (the checkpoints are kept)
+    self.saver: Process = None         # process writing --save
+    self.sketch = QuantileSketch()     # quantiles of the scalar field, updated while parsing
+    if not self.args.no_cache:
+      self.cache = DownsampleCache(self.args.cache_dir, self.args.cache_size)
+      self.cache.log_stats()
 
     signal.signal(signal.SIGINT, self.__on_end) # register the signal handler
     signal.signal(signal.SIGTERM, self.__on_end)
@@ -111,8 +201,8 @@ class App:
       raise RuntimeError('Passing --voxel-size with --no-exe but without --downsample will have no effect')
     if args.voxel_size and args.voxel_size <= 0:
       raise RuntimeError(f'Invalid value for --voxel-size : {args.voxel_size} (should be > 0)')
-    if args.downsample and not args.frac and not args.voxel_size:
-      raise RuntimeError('Passing --downsample without --frac or --voxel-size will have no effect')
+    if args.downsample and not (args.frac or args.voxel_size or args.max_points or args.max_memory):
+      raise RuntimeError('Passing --downsample without --frac, --voxel-size or a budget will have no effect')
     if args.frac and args.voxel_size:
       raise RuntimeError('--frac and --voxel-size are mutually exclusive')
     if args.save and os.path.isdir(args.save):
@@ -128,6 +218,103 @@ class App:
       raise RuntimeError('Passing --no-exe without --save will do nothing')
     if args.only and len(f := sorted(filter(lambda x: x <= 0, args.only))) > 0:
       raise RuntimeError(f'Invalid value for --only : {f} (should be > 0)')
+    self.__check_view_args(args)
+    self.__check_output_args(args)
+    self.__check_raster_args(args)
+
+  @staticmethod
+  def __check_view_args(args: Namespace) -> None:
+    """ check the arguments choosing the points to show and how """
+    if args.attach is not None and (args.cfg or args.only):
+      raise RuntimeError('--attach shows the points of the daemon, it cannot be used with --cfg or --only')
+    if args.preview is not None and args.preview <= 0:
+      raise RuntimeError(f'Invalid value for --preview : {args.preview} (should be > 0)')
+    if args.preview is not None and args.attach is not None:
+      raise RuntimeError('--preview only applies to parsed files, it cannot be used with --attach')
+    if args.preview_random and args.preview is None:
+      raise RuntimeError('Passing --preview-random without --preview will have no effect')
+    if args.sequence is not None and args.sequence < 0:
+      raise RuntimeError(f'Invalid value for --sequence : {args.sequence} (should be >= 0)')
+    if args.sequence is not None and (args.no_exe or args.save):
+      raise RuntimeError('--sequence plays the files in the gui, it cannot be used with --no-exe or --save')
+    for name, value in (('--max-points', args.max_points), ('--max-memory', args.max_memory)):
+      if value is not None and value <= 0:
+        raise RuntimeError(f'Invalid value for {name} : {value} (should be > 0)')
+      if value is not None and (args.frac or args.voxel_size):
+        raise RuntimeError(f'{name} chooses the voxel size, it cannot be used with --frac or --voxel-size')
+      if value is not None and args.no_exe and not args.downsample:
+        raise RuntimeError(f'Passing {name} with --no-exe but without --downsample will have no effect')
+    if args.layers and args.no_exe:
+      raise RuntimeError('Passing --layers with --no-exe will have no effect')
+    if args.layers and args.sequence is not None:
+      raise RuntimeError('--layers and --sequence are mutually exclusive')
+    if args.sequence is not None and (args.attach is not None or args.preview is not None):
+      raise RuntimeError(
+        '--sequence parses every file as a frame, it cannot be used with --attach or --preview')
+
+  @staticmethod
+  def __check_output_args(args: Namespace) -> None:
+    """ check the arguments of the checkpoints, statistics and colors """
+    if args.resume and not args.save:
+      raise RuntimeError('Passing --resume without --save will have no effect')
+    if args.checkpoint and not args.save:
+      raise RuntimeError('Passing --checkpoint without --save will have no effect')
+    if args.thumbnails and not args.save:
+      raise RuntimeError('Passing --thumbnails without --save will have no effect')
+    if (args.resume or args.checkpoint) and (args.attach is not None or args.preview is not None):
+      raise RuntimeError(
+        '--checkpoint and --resume parse whole files, they cannot be used with --attach or --preview')
+    if args.stats is not None and (args.save or args.no_exe or args.resume):
+      raise RuntimeError(
+        '--stats only prints statistics, it cannot be used with --save, --no-exe or --resume')
+    if args.stats is not None and (args.attach is not None or args.preview is not None or
+                                   args.sequence is not None or args.layers):
+      raise RuntimeError(
+        '--stats reads whole files once, it cannot be used with --attach, --preview, --sequence '
+        'or --layers')
+    if args.compare and not os.path.isfile(args.compare):
+      raise RuntimeError(f'Invalid value for --compare : {args.compare} is not a file')
+    if args.compare and (args.stats is not None or args.sequence is not None):
+      raise RuntimeError('--compare colors the merged points, it cannot be used with --stats or --sequence')
+    if args.compare_max_distance is not None and not args.compare:
+      raise RuntimeError('Passing --compare-max-distance without --compare will have no effect')
+    if args.compare_max_distance is not None and args.compare_max_distance <= 0:
+      raise RuntimeError(
+        f'Invalid value for --compare-max-distance : {args.compare_max_distance} (should be > 0)')
+    if args.scalar and (args.compare or args.stats is not None or args.sequence is not None):
+      raise RuntimeError(
+        '--scalar colors the merged points, it cannot be used with --compare, --stats or --sequence')
+    if args.stretch and not args.scalar:
+      raise RuntimeError('Passing --stretch without --scalar will have no effect')
+
+  @staticmethod
+  def __check_raster_args(args: Namespace) -> None:
+    """ check the arguments of --raster (grids written instead of the points) """
+    if args.raster is None:
+      return
+    if args.raster <= 0:
+      raise RuntimeError(f'Invalid value for --raster : {args.raster} (should be > 0)')
+    if not args.save:
+      raise RuntimeError('Passing --raster without --save will have no effect')
+    if args.save.lower().endswith('.ply'):
+      raise RuntimeError('--raster writes .npy grids, --save cannot be a .ply file')
+    if args.stats is not None or args.checkpoint or args.resume or args.thumbnails:
+      raise RuntimeError(
+        '--raster only writes grids, it cannot be used with --stats, --checkpoint, --resume or --thumbnails')
+    if args.compare or args.scalar or args.downsample:
+      raise RuntimeError('--raster grids every point as parsed, it cannot be used with --compare, --scalar '
+                         'or --downsample')
+    if args.attach is not None or args.preview is not None or args.sequence is not None or args.layers:
+      raise RuntimeError('--raster reads whole files once, it cannot be used with --attach, --preview, '
+                         '--sequence or --layers')
+
+  @staticmethod
+  def __budget(args: Namespace) -> int | None:
+    """ the smallest of --max-points and of the points that fit in --max-memory """
+    budgets = [args.max_points] if args.max_points else []
+    if args.max_memory:
+      budgets.append(max(args.max_memory // BYTES_PER_POINT, 1))
+    return min(budgets, default=None)
 
   def __get_json_config_path(self) -> str:
     # search for the config.json file or any json file recursively
@@ -147,7 +334,9 @@ class App:
 
   def __on_end(self, sig: int, _: Any, /) -> None:
     """
-    signal handler for the SIGINT signal
+    signal handler for the SIGINT and SIGTERM signals\\
+    while parsing with checkpoints, the first signal stops the parsing after the current chunk
+    (which is checkpointed), a second one exits right away ; a running save is always waited for
 
     ## Parameters
     ```py
@@ -161,9 +350,27 @@ class App:
     current stack frame
     """
     print('\r', end='')
+    if self.journal is not None and not self.cancelled and self.store is None:
+      self.cancelled = True
+      self.log.warning('Received %s signal ... Checkpointing the parsed points (again to exit now)',
+                       signal.Signals(sig).name)
+      return
     self.log.warning('Received %s signal ... Exiting', signal.Signals(sig).name)
+    self.__wait_saver()
     sys.exit(0)
 
+  def __cancel(self) -> None:
+    # checkpoint what was parsed and exit (after the first signal)
+    self.journal.flush()
+    self.log.warning('Parsing cancelled : %s points checkpointed in %s, run again with --resume to continue',
+                     format(self.journal.rows(), '_'), self.journal.directory)
+    sys.exit(0)
+
+  def __wait_saver(self) -> None:
+    if self.saver is not None and self.saver.is_alive():
+      self.log.info('Waiting for the point cloud to be saved...')
+      self.saver.join()
+
   def __parse_files(self, cfgs: list[Config]) -> None:
     """
     initially parse the files and store them in the database
@@ -175,129 +382,742 @@ class App:
     list of configs
     """
     start_ts = datetime.now()
-    for cfg in alive_it(cfgs): # get the points from each file
-      self.__load_points(cfg)  # load (somewhat slow)
+    # exact row counts for the progress bar when every file already has an index, none is built here
+    # (building one scans the whole file for newlines before it is parsed)
+    indexes = [RowIndex.load(cfg.file_path, cfg.skip_first_line) for cfg in cfgs]
+    total = None if any(index is None for index in indexes) else sum(len(index) for index in indexes)
+    with alive_bar(total, title='parsing', unit=' points') as progress:
+      for i, cfg in enumerate(cfgs):
+        self.__load_points(i, cfg, progress)
+        if self.cancelled:
+          break
+    if self.cancelled:
+      self.__cancel()
     end_ts = datetime.now()
 
     delta_seconds = (end_ts - start_ts).total_seconds()
-    self.log.info('Parsed %s points in %.3f s', format(len(self.points), '_'), delta_seconds)
-
-  def __load_points(self, cfg: Config) -> None:
-    offset = Point(*cfg.source_xyz, *([0] * 4)) # offset location (r,g,b,id to 0 for add method)
-    basename = os.path.basename(cfg.file_path)  # basename for logging
-    index = len(self.points)                    # number of points already loaded
-    self.log.debug('Loading file: \u2026/%s', basename)
-    self.log.debug('Offset: %s', offset)
-    try:
-      with open(cfg.file_path, 'r', encoding='utf-8') as f:
+    self.log.info('Parsed %s points in %.3f s', format(sum(len(c) for c in self.chunks), '_'), delta_seconds)
+
+  def __preview_files(self, cfgs: list[Config]) -> None:
+    """
+    parse short runs of lines at a few byte offsets of each file (quick look)
+
+    ## Parameters
+    ```py
+    >>> files : list[Config]
+    ```
+    list of configs
+    """
+    stats: list[PreviewStats] = []
+    for cfg in cfgs:
+      try:
+        data, s = preview_file(cfg, self.args.preview, stratified=not self.args.preview_random)
+      except Exception as e:                                                                                  # pylint: disable=broad-except
+        self.__report(cfg, e)
+        self.chunks.append(np.empty((0, 9)))
+        continue
+      name = os.path.basename(cfg.file_path)
+      self.log.debug('Previewed %s points from file: …/%s (%.2f%% of %.1f MiB)', format(s.points, '_'), name,
+                     100 * s.ratio, s.file_size / 2**20)
+      self.chunks.append(data)
+      self.sketch.add(data[:, 8])
+      stats.append(s)
+    points, seconds = sum(s.points for s in stats), sum(s.seconds for s in stats)
+    read, size = sum(s.bytes_read for s in stats), sum(s.file_size for s in stats)
+    self.log.info('Previewed %s points in %.3f s : read %.1f MiB of %.1f MiB (%.2f%%)', format(points, '_'),
+                  seconds, read / 2**20, size / 2**20, 100 * read / max(size, 1))
 
-        factory = PointFactory(cfg.pattern) # just so that the fmt is not being parsed at every line
-        start = True                        # skip the first line if needed (should be the same at casting bool to int)
+  def __print_stats(self, cfgs: list[Config]) -> None:
+    """
+    print the statistics of the files, parsed once by a pool of processes without keeping the points
 
-        for line in f:
-          if start == cfg.skip_first_line:
-            start = False
-            continue
-          try:
-            self.points.append(factory(line) + offset)
+    ## Parameters
+    ```py
+    >>> cfgs : list[Config]
+    ```
+    list of configs
+    """
+    start_ts = datetime.now()
+    try:
+      stats = collect_stats(cfgs)
+    except ValueError as e:
+      self.log.critical('%s', e)
+    total = Stats()
+    for cfg, s in zip(cfgs, stats):
+      if s is None:
+        self.log.error('Skipping unknown file: %s', cfg.file_path)
+      else:
+        total = total.merge(s)
+    self.log.info('Read %s points in %.3f s', format(total.points, '_'),
+                  (datetime.now() - start_ts).total_seconds())
+    flush_logger() # the statistics are printed after every record
+    if self.args.stats == 'json':
+      files = {name: None if s is None else s.to_json() for name, s in zip(self.names, stats)}
+      print(json.dumps({'files': files, 'total': total.to_json()}, indent=2))
+    else:
+      print(format_table(self.names, stats, total))
 
-          except Exception as e: # pylint: disable=broad-except
+  def __write_raster(self, cfgs: list[Config]) -> None:
+    """
+    write the grids of the files to --save, parsed once by a pool of processes without keeping the points
 
-            self.log.critical('Failed to parse line: %s (%s:%d)\n%s', line, cfg.file_path,
-                              len(self.points) + int(cfg.skip_first_line) - index, e)
+    ## Parameters
+    ```py
+    >>> cfgs : list[Config]
+    ```
+    list of configs
+    """
+    start_ts = datetime.now()
+    try:
+      raster, unknown = collect_raster(cfgs, self.args.raster)
+    except ValueError as e:
+      self.log.critical('%s', e)
+    for cfg in unknown:
+      self.log.error('Skipping unknown file: %s', cfg.file_path)
+    grids, georeference = raster.to_grids()
+    self.log.info('Rasterized %s points into %s occupied cells of a %s grid in %.3f s',
+                  format(raster.points, '_'), format(len(raster), '_'),
+                  ' x '.join(str(n) for n in grids.shape[1:]), (datetime.now() - start_ts).total_seconds())
+    save_npy(self.args.save, grids)
+    with open(f'{os.path.splitext(self.args.save)[0]}.raster.json', 'w', encoding='utf-8') as f:
+      json.dump(georeference, f, indent=2)
+    self.log.info('Saved %s grids to %s', ', '.join(BANDS), self.args.save)
 
-    except FileNotFoundError as e:
+  def __load_points(self, i: int, cfg: Config, progress: Callable[[int], Any]) -> None:
+    # points of a file, after its checkpointed ones (stops after the current chunk when cancelled)
+    start = 0 if self.journal is None else self.journal.start(i)
+    chunks: list[np.ndarray] = [] if start == 0 else self.journal.load(i)
+    for chunk in chunks:
+      self.sketch.add(chunk[:, 8])
+    progress(sum(len(chunk) for chunk in chunks))
+    try:
+      for chunk in iter_chunks(cfg, start=start) if start is not None else ():
+        chunks.append(chunk)
+        self.sketch.add(chunk[:, 8])
+        progress(len(chunk))
+        if self.journal is not None:
+          self.journal.add(i, chunk)
+        if self.cancelled:
+          return
+      if self.journal is not None and start is not None:
+        self.journal.finish(i)
+    except Exception as e:                                                                # pylint: disable=broad-except
+      self.__report(cfg, e)
+      chunks.clear()
+    self.chunks.append(np.concatenate(chunks) if chunks else np.empty((0, 9)))
+    self.log.debug('Loaded %s points from file: …/%s', format(len(self.chunks[-1]), '_'),
+                   os.path.basename(cfg.file_path))
+
+  def __report(self, cfg: Config, e: Exception) -> None:
+    # unknown files are skipped, anything else is fatal
+    if isinstance(e, FileNotFoundError):
       self.log.error('Skipping unknown file: %s', e)
-      return
-    except Exception as e:                                  # pylint: disable=broad-except
+    elif isinstance(e, ValueError):
+      self.log.critical('%s', e)
+    else:
       self.log.critical('Failed to read file: %s\n%s', cfg.file_path, e)
-    self.log.debug('Loaded %s points from file: \u2026/%s',
-                   format(len(self.points) + int(cfg.skip_first_line) - index, '_'), basename)
+
+  def __load_progressively(self) -> None:
+    """
+    gui loop while the background loader parses the files\
+    parsed chunks are appended to the displayed geometry at most `REFRESH_HZ` times per second,
+    the store and the final geometry are built once every file is parsed
+    """
+    start_ts = datetime.now()
+    throttle = Throttle(self.REFRESH_HZ)
+    # chunks of each file, and chunks not displayed yet
+    parts: list[list[np.ndarray]] = [[] for _ in self.loader.cfgs]
+    if self.journal is not None: # checkpointed points of a resumed run
+      parts = [self.journal.load(i) for i in range(len(self.loader.cfgs))]
+    pending: list[np.ndarray] = [chunk for p in parts for chunk in p]
+    for chunk in pending:
+      self.sketch.add(chunk[:, 8])
+    while not self.loader.done:
+      if not self.vis.poll_events() or self.cancelled:
+        self.loader.cancel()
+        self.log.warning('Loading cancelled' if self.cancelled else 'Window closed while loading')
+        if self.journal is not None:
+          self.__cancel()
+        return
+      for chunk in self.loader.poll(budget=1 / 60):
+        if chunk.error is not None:
+          self.__report(self.loader.cfgs[chunk.index], chunk.error)
+        elif chunk.data is not None:
+          parts[chunk.index].append(chunk.data)
+          pending.append(chunk.data)
+          self.sketch.add(chunk.data[:, 8])
+          if self.journal is not None:
+            self.journal.add(chunk.index, chunk.data)
+        elif self.journal is not None and chunk.index not in self.journal.finished:
+          self.journal.finish(chunk.index)
+      if pending and (throttle.ready() or self.loader.done):
+        first = not self.shown
+        self.__append(np.concatenate(pending))
+        pending.clear()
+        if first:
+          self.log.info('First points displayed after %.3f s', (datetime.now() - start_ts).total_seconds())
+      self.vis.update_renderer()
+      time.sleep(1 / 120)        # leave the interpreter to the loader between frames
+
+    self.chunks = [np.concatenate(p) if p else np.empty((0, 9)) for p in parts]
+    delta_seconds = (datetime.now() - start_ts).total_seconds()
+    self.log.info('Parsed %s points in %.3f s', format(sum(len(c) for c in self.chunks), '_'), delta_seconds)
+    self.loader = None
+    self.__create_pc_geometry()
+    self.vis.reset_view_point(True) # fit the whole cloud, the view was set on the first chunk
+    self.__save_pc()
+
+  def __append(self, data: np.ndarray) -> None:
+    """
+    display more points while loading, reduced like the final geometry will be
+
+    ## Parameters
+    ```py
+    >>> data : np.ndarray
+    ```
+    (n, 9) newly parsed points
+    """
+    if self.args.window is not None:
+      start, end = self.args.window
+      data = data[(data[:, 7] >= start) & (data[:, 7] < end)]
+    xyz, rgb = PointStore.from_array(data).view(self.args.frac, self.args.voxel_size, self.args.cbid)
+    if self.buffer is None:
+      self.__render(xyz, rgb)
+    else:
+      self.buffer.append(self.pc, xyz, rgb)
+    self.__show()
+
+  def __decode_frame(self, cfg: Config) -> tuple[np.ndarray, np.ndarray]:
+    """
+    coordinates and colors of one frame of a sequence, reduced like a merged cloud would be\
+    runs in the background thread of the frame ring
+
+    ## Parameters
+    ```py
+    >>> cfg : Config
+    ```
+    config of the frame
+
+    ## Returns
+    ```py
+    tuple[np.ndarray, np.ndarray] : (N, 3) coordinates and (N, 3) colors
+    ```
+    """
+    store = PointStore.from_array(load_file(cfg))
+    key = fingerprint([cfg])
+    if self.pipeline:
+      store, key = self.pipeline.run(store, self.cache, key)
+    if self.cache:
+      store.use_cache(self.cache, key)
+    if self.args.window is not None:
+      store = store.time_window(*self.args.window)
+    voxel_size = self.args.voxel_size
+    if self.args.max_points: # frames have their own size
+      voxel_size, _ = choose_voxel_size(store.xyz, self.args.max_points)
+    xyz, rgb = store.view(self.args.frac, voxel_size, self.args.cbid)
+    return np.ascontiguousarray(xyz), np.ascontiguousarray(rgb)
+
+  def __request_frame(self, index: int) -> bool:
+    """ ask for a frame, shown by `__play` once decoded (the gui never waits for the loader) """
+    self.target = index % len(self.ring)
+    self.requested = time.perf_counter()
+    self.ring.seek(self.target)
+    return False
+
+  def __show_frame(self) -> None:
+    """ swap the target frame into the geometry if it is decoded """
+    if self.target == self.frame or (frame := self.ring.get(self.target)) is None:
+      return
+    first = self.frame < 0
+    self.frame = self.target
+    if frame.error is not None:
+      self.__report(self.ring.cfgs[frame.index], frame.error)
+      return
+    self.__render(frame.xyz, frame.rgb)
+    self.__show()
+    if first:
+      self.vis.reset_view_point(True)
+    self.latencies.append(time.perf_counter() - self.requested)
+    self.log.debug('Frame %d/%d (%s points) shown %.1f ms after the request (%.1f MiB decoded)',
+                   frame.index + 1, len(self.ring), format(len(frame.xyz), '_'), 1e3 * self.latencies[-1],
+                   self.ring.nbytes / 2**20)
+
+  def __play(self) -> None:
+    """
+    gui loop of a sequence\
+    frames are swapped in as soon as they are decoded, and advance at most `--sequence` times per second
+    """
+    # a rate of 0 plays the frames as fast as they are decoded
+    throttle = Throttle(self.args.sequence or math.inf)
+    while self.vis.poll_events():
+      if self.playing and self.frame == self.target and throttle.ready():
+        self.__request_frame(self.target + 1)
+      self.__show_frame()
+      self.vis.update_renderer()
+      time.sleep(1 / 120)
+    self.ring.close()
+    if self.latencies:
+      latencies = np.array(self.latencies) * 1e3
+      self.log.info(
+        'Showed %d frames : %.1f ms median and %.1f ms max from request to display, '
+        '%d/%d frames decoded ahead, at most %.1f MiB of frames (bound %.1f MiB)', len(latencies),
+        np.median(latencies), latencies.max(), self.ring.hits, self.ring.hits + self.ring.misses,
+        self.ring.peak_bytes / 2**20, self.ring.max_bytes / 2**20)
+
+  def __attach(self) -> None:
+    """ use the shared columns of a running daemon instead of parsing files """
+    start_ts = datetime.now()
+    try:
+      self.client = DaemonClient(self.args.attach or None)
+      self.store, self.fingerprint = self.client.store()
+    except (OSError, RuntimeError) as e:
+      self.log.critical('Failed to attach to daemon : %s', e)
+    delta_seconds = (datetime.now() - start_ts).total_seconds()
+    self.log.info('Attached to %s points of %s in %.3f s', format(len(self.store), '_'), self.client.path,
+                  delta_seconds)
 
   def __create_pc_geometry(self) -> None:
-    points = self.points
-    a = '' if self.args.downsample else 'for rendering '
+    if self.store is None:
+      start_ts = datetime.now()
+      with alive_bar(title='please wait ', bar=None, receipt=False, monitor=False, elapsed=False,
+                     stats=False):
+        self.store = PointStore.from_chunks(self.chunks)
+        self.chunks.clear() # the store holds everything from now on
+      end_ts = datetime.now()
+      delta_seconds = (end_ts - start_ts).total_seconds()
+      self.log.info('Created point store in %.3f s', delta_seconds)
+
+    if self.pipeline:
+      start_ts = datetime.now()
+      self.store, self.fingerprint = self.pipeline.run(self.store, self.cache, self.fingerprint)
+      delta_seconds = (datetime.now() - start_ts).total_seconds()
+      self.log.info('Ran %d pipeline stages in %.3f s', len(self.pipeline), delta_seconds)
+    if self.args.compare:
+      self.__compare()
+    if self.args.scalar:
+      self.__color_by_scalar()
+    if self.cache:
+      self.store.use_cache(self.cache, self.fingerprint)
 
-    if self.args.frac:
-      __start_ts = datetime.now()
-      size = int(len(points) * self.args.frac)
-      points = random.sample(points, size)
-      __delta_seconds = (datetime.now() - __start_ts).total_seconds()
-      self.log.info('Pulled %s points randomly %sin %.3f s', format(len(points), '_'), a, __delta_seconds)
+    self.__select_window()
+    if self.vis is not None and 'time' in self.store.fields:
+      self.__register_keys(times=True)
+    if self.args.max_points:
+      self.__fit_budget()
+    self.__refresh()
 
+  def __compare(self) -> None:
+    """ color the points by their distance to the points of the reference epoch (see `cloud_distances`) """
     start_ts = datetime.now()
-    with alive_bar(title='please wait ', bar=None, receipt=False, monitor=False, elapsed=False, stats=False):
-      self.pc.points = utility.Vector3dVector(map(lambda p: p.get_xyz(), points))                 # pylint: disable=bad-builtin
-      self.pc.colors = utility.Vector3dVector(map(lambda p: p.get_color(self.args.cbid), points)) # pylint: disable=bad-builtin
-    end_ts = datetime.now()
-    delta_seconds = (end_ts - start_ts).total_seconds()
-    self.log.info('Created point cloud geometry in %.3f s', delta_seconds)
+    try:
+      cfgs, _ = read_config_file(self.args.compare)
+      reference, unknown = load_xyz(cfgs)
+    except ValueError as e:
+      self.log.critical('%s', e)
+    for cfg in unknown:
+      self.log.error('Skipping unknown reference file: %s', cfg.file_path)
+    self.log.info('Parsed %s reference points in %.3f s', format(len(reference), '_'),
+                  (datetime.now() - start_ts).total_seconds())
+
+    start_ts = datetime.now()
+    distances = cloud_distances(self.store.xyz, reference, self.args.distance)
+    summary = DistanceSummary.of(distances)
+    self.log.info('Compared to the reference in %.3f s : %s', (datetime.now() - start_ts).total_seconds(),
+                  summary)
+    # the last color is the limit of the search, or the 99th percentile of the distances
+    if (hi := self.args.distance) is None:
+      hi = float(np.percentile(distances[np.isfinite(distances)], 99)) if summary.matched else 1.
+    rgb = apply_colormap(distances, 0., hi, 'jet') * 255
+    self.store = self.store.with_columns(rgb=rgb, fields={'distance': distances})
+    # reductions of colored points are not the ones of the files
+    self.fingerprint = fingerprint(cfgs, 'compare', self.fingerprint, self.args.distance)
+
+  def __color_by_scalar(self) -> None:
+    """ color the points by their scalar field, stretched between percentiles of the sketch """
+    if 'scalar' not in self.store.fields:
+      self.log.warning('No {i} scalar field in the files, --scalar is ignored')
+      return
+    values = self.store.fields['scalar']
+    # parsed elsewhere (--attach), sketched once in chunks
+    if not self.sketch.count:
+      for k in range(0, len(values), 1 << 20):
+        self.sketch.add(values[k:k + (1 << 20)])
+    lo, hi = self.sketch.quantiles(np.array(self.args.stretch) / 100)
+    self.log.info('Scalar field of %s points stretched from %.6g (%g%%) to %.6g (%g%%)',
+                  format(self.sketch.count, '_'), lo, self.args.stretch[0], hi, self.args.stretch[1])
+    rgb = apply_colormap(values, lo, hi, self.args.scalar) * 255
+    self.store = self.store.with_columns(rgb=rgb)
+
+    # reductions of colored points are not the ones of the files
+    self.fingerprint = fingerprint([], 'scalar', self.fingerprint, self.args.scalar, lo, hi)
+
+  def __fit_budget(self) -> None:
+    """ choose the voxel size that lands closest to the points budget, from voxel occupancy counts """
+    start_ts = datetime.now()
+    points = self.__points()
+    size, estimate = choose_voxel_size(points.xyz, self.args.max_points)
+    if size is None:
+      self.log.info('All %s points fit in the budget of %s points', format(len(points), '_'),
+                    format(self.args.max_points, '_'))
+      return
+    self.args.voxel_size = size
+    # the grid is kept by the store for the rendering, the estimate only interpolates between levels
+    rendered = len(points.voxel_grid(size))
+    delta_seconds = (datetime.now() - start_ts).total_seconds()
+    self.log.info(
+      'Chose voxel size %.6g for a budget of %s points (%s points, %.1f MiB, %s estimated) in %.3f s '
+      '(reuse it with --voxel-size %.6g)', size, format(self.args.max_points, '_'), format(rendered, '_'),
+      rendered * BYTES_PER_POINT / 2**20, format(estimate, '_'), delta_seconds, size)
+
+  def __select_window(self) -> None:
+    """ restrict the shown and saved points to the current time window (binary searches, no scan) """
+    if self.args.window is None:
+      self.subset = None
+      return
+    start_ts = datetime.now()
+    start, end = self.args.window
+    try:
+      self.subset = self.store.time_window(start, end)
+    except ValueError as e:
+      self.log.critical('Invalid value for --time-window : %s', e)
+    delta_seconds = (datetime.now() - start_ts).total_seconds()
+    self.log.info('Selected %s points in the time window [%g, %g) in %.3f s', format(len(self.subset), '_'),
+                  start, end, delta_seconds)
+
+  def __points(self) -> PointStore:
+    """ the points to show and save """
+    return self.store if self.subset is None else self.subset
+
+  def __refresh(self) -> None:
+    """ (re)build the rendered points from the store with the current frac, voxel size and cbid """
+    if self.args.layers:
+      self.__refresh_layers()
+      return
+    a = '' if self.args.downsample else 'for rendering '
+    start_ts = datetime.now()
+    xyz, rgb = self.__points().view(self.args.frac, self.args.voxel_size, self.args.cbid)
+    self.__render(xyz, rgb)
+    normals = self.__points().fields.get('normals')
+    if normals is not None and len(normals) == len(xyz): # normals are only rendered without reduction
+      self.pc.normals = utility.Vector3dVector(normals)
+    elif self.pc.has_normals():
+      self.pc.normals = utility.Vector3dVector()
+    delta_seconds = (datetime.now() - start_ts).total_seconds()
 
     if self.args.voxel_size:
-      __start_ts = datetime.now()
-      self.pc = self.pc.voxel_down_sample(self.args.voxel_size)
-      __delta_seconds = (datetime.now() - __start_ts).total_seconds()
-      self.log.info('Downsampled point cloud geometry %sto %s points in %.3f s', a,
-                    format(len(self.pc.points), '_'), __delta_seconds)
+      self.log.info('Downsampled point cloud geometry %sto %s points (voxel size %g) in %.3f s', a,
+                    format(len(xyz), '_'), self.args.voxel_size, delta_seconds)
+    elif self.args.frac and self.args.frac < 1:
+      self.log.info('Pulled %s points randomly %s(fraction %g) in %.3f s', format(len(xyz), '_'), a,
+                    self.args.frac, delta_seconds)
+    else:
+      self.log.info('Created point cloud geometry with %s points in %.3f s', format(len(xyz), '_'),
+                    delta_seconds)
+    self.__show()
 
-    if not self.args.no_exe:
+  def __refresh_layers(self) -> None:
+    """ (re)build every layer in parallel, with the current frac, voxel size and cbid """
+    start_ts = datetime.now()
+    points = self.__points()
+    if self.layers is not None and self.layers.store is not points:                                       # another time window
+      for layer in self.layers:
+        layer.visible = False
+      self.__show_layers()
+      self.layers = None
+    if self.layers is None:
+      names = self.names if len(self.names) == len(points.spans) else None
+      self.layers = LayerSet(points, self.args.layers, names)
+    self.layers.build(self.args.frac, self.args.voxel_size, self.args.cbid)
+    self.__show_layers()
+    delta_seconds = (datetime.now() - start_ts).total_seconds()
+    self.log.info('Built %d layers (by %s) with %s points in %.3f s', len(self.layers), self.args.layers,
+                  format(sum(len(layer) for layer in self.layers), '_'), delta_seconds)
+
+  def __show_layers(self) -> None:
+    """ add, update or remove the geometry of each layer according to its visibility """
+    if self.shown: # the single geometry shown while loading
+      self.vis.remove_geometry(self.pc, reset_bounding_box=False)
+      self.shown = False
+    first = not any(layer.shown for layer in self.layers)
+    for layer in self.layers:
+      if layer.visible and layer.shown:
+        self.vis.update_geometry(layer.pc)
+      elif layer.visible:
+        self.vis.add_geometry(layer.pc, reset_bounding_box=first)
+      elif layer.shown:
+        self.vis.remove_geometry(layer.pc, reset_bounding_box=False)
+      layer.shown = layer.visible
+
+  def __register_keys(self, times: bool = False) -> None:
+    """
+    register the key callbacks that change the reduction and the coloring of a running gui\\
+    the keys of the time window are only bound once the points have times (`times`), the ones of the frames
+    with `--sequence` and the ones of the layers with `--layers`, so that the default bindings of open3d
+    (`[`/`]` field of view, `T` image stretch, `N` normals, `B` back faces, `P` screenshot, `L` lighting,
+    `O` render options...) are kept otherwise
+
+    ## Parameters
+    ```py
+    >>> times : bool, (optional)
+    ```
+    only register the keys of the time window
+    """
+
+    def __set(frac: float | None, voxel_size: float | None, cbid: bool) -> bool:
+      if self.store is None: # still loading
+        return False
+      self.args.frac, self.args.voxel_size, self.args.cbid = frac, voxel_size, cbid
+      self.__refresh()
+      return True
+
+    def __voxel_size() -> float:
+      if self.args.voxel_size:
+        return self.args.voxel_size
+      # start from a power of two close to a thousandth of the extent, so that grids nest
+      extent = float(np.linalg.norm(self.store.xyz.max(axis=0) - self.store.xyz.min(axis=0))) or 1.
+      return 2.**np.round(np.log2(extent / 1000))
+
+    def __scrub(step: int) -> bool:
+      # move the time window by `step` lengths, or toggle it with a step of 0
+      if self.store is None or (index := self.store.time_index()) is None or index.count == 0:
+        return False
+      first, last = index.span
+      if self.args.window is not None and step == 0:
+        self.last_window, self.args.window = self.args.window, None
+      elif self.args.window is None:
+        # start with a twentieth of the acquisition
+        self.args.window = self.last_window or (first, first + ((last-first) / 20 or 1.))
+      else:
+        start, end = self.args.window
+        shift = step * (end-start)
+        if start + shift > last or end + shift <= first: # no point after the last window or before the first
+          return False
+        self.args.window = start + shift, end + shift
+      self.__select_window()
+      self.__refresh()
+      return True
+
+    def __layer(action: str) -> bool:
+      # act on the selected layer only, the others are not rebuilt
+      if self.layers is None:
+        return False
+      layer = self.layers[self.layers.selected]
+      if action in {'next', 'previous'}:
+        layer = self.layers.select(1 if action == 'next' else -1)
+      elif action == 'visibility':
+        layer.visible = not layer.visible
+      elif action == 'only':
+        self.layers.solo(layer)
+      else:
+        self.layers.recolor(layer)
+      self.__show_layers()
+      shown = sum(lay.visible for lay in self.layers)
+      self.log.info('Layer %d/%d : %s (%s points, %s, %d layers shown)', self.layers.selected + 1,
+                    len(self.layers), layer.name, format(len(layer), '_'),
+                    'shown' if layer.visible else 'hidden', shown)
+      return True
+
+    def __play_pause() -> bool:
+      if self.ring is not None:
+        self.playing = not self.playing
+        self.log.info('%s the sequence', 'Playing' if self.playing else 'Paused')
+      return False
+
+    keys = {
+      ord('.'): ('more points', lambda _: __set(min(1., (self.args.frac or 1.) * 2), None, self.args.cbid)),
+      ord(','): ('fewer points', lambda _: __set((self.args.frac or 1.) / 2, None, self.args.cbid)),
+      ord('X'): ('bigger voxels', lambda _: __set(None, 2 * __voxel_size(), self.args.cbid)),
+      ord('Z'): ('smaller voxels', lambda _: __set(None, .5 * __voxel_size(), self.args.cbid)),
+      ord('C'):
+        ('toggle color by id', lambda _: __set(self.args.frac, self.args.voxel_size, not self.args.cbid)),
+      ord('A'): ('show all points', lambda _: __set(None, None, self.args.cbid)),
+    }
+    if self.args.sequence is not None:
+      keys.update({
+        ord('N'): ('next frame', lambda _: self.ring is not None and self.__request_frame(self.target + 1)),
+        ord('B'):
+          ('previous frame', lambda _: self.ring is not None and self.__request_frame(self.target - 1)),
+        ord('P'): ('play or pause the frames', lambda _: __play_pause()),
+      })
+    if self.args.layers:
+      keys.update({
+        ord('L'): ('select the next layer', lambda _: __layer('next')),
+        ord('K'): ('select the previous layer', lambda _: __layer('previous')),
+        ord('V'): ('show or hide the selected layer', lambda _: __layer('visibility')),
+        ord('O'): ('only show the selected layer, or every layer', lambda _: __layer('only')),
+        ord('F'): ('flat color of the selected layer', lambda _: __layer('recolor')),
+      })
+    if times:
+      keys = {
+        ord('T'): ('toggle the time window', lambda _: __scrub(0)),
+        ord(']'): ('next time window', lambda _: __scrub(1)),
+        ord('['): ('previous time window', lambda _: __scrub(-1)),
+      }
+    for key, (hint, callback) in keys.items():
+      self.vis.register_key_callback(key, callback)
+      self.log.debug('Key %s : %s', chr(key), hint)
+
+  def __render(self, xyz: np.ndarray, rgb: np.ndarray) -> None:
+    """
+    write new arrays into the point cloud geometry\
+    the geometry object is kept so that it can be updated in place once shown
+
+    ## Parameters
+    ```py
+    >>> xyz : np.ndarray
+    ```
+    (N, 3) coordinates
+    ```py
+    >>> rgb : np.ndarray
+    ```
+    (N, 3) colors in range [0, 1]
+    """
+    if self.buffer is None:
+      self.buffer = RenderBuffer(xyz, rgb)
+      self.buffer.attach(self.pc)
+    else:
+      rows = self.buffer.update(self.pc, xyz, rgb)
+      self.log.debug('Updated %s rows of the geometry',
+                     'all' if rows is None else format(rows.stop - rows.start, '_'))
+
+  def __show(self) -> None:
+    """ add the geometry to the visualizer, or only update it if it is already there """
+    if self.args.no_exe:
+      return
+    if self.shown:
+      self.vis.update_geometry(self.pc)
+    else:
       self.vis.add_geometry(self.pc)
+      self.shown = True
+
+  def __write_ply(self, filepath: str, points: PointStore, data: np.ndarray = None) -> None:
+    """
+    save the points to a binary .ply file, streamed from the store (with their ids and scalar field)
+
+    ## Parameters
+    ```py
+    >>> filepath : str
+    ```
+    .ply output path
+    ```py
+    >>> points : PointStore
+    ```
+    saved points
+    ```py
+    >>> data : np.ndarray, (optional)
+    ```
+    (N, 6) reduced points to save instead, from the geometry (--downsample)
+    """
+    if data is not None:
+      write_ply(filepath, data[:, :3], data[:, 3:6])
+      return
+    # colors are computed chunk by chunk (the palette of the ids does not depend on the chunks)
+    def colors(start: int, stop: int) -> np.ndarray:
+      return get_colors(points.rgb[start:stop], points.ids[start:stop], self.args.cbid)
+
+    ids = points.ids if len(points) and points.ids.max() >= 0 else None
+    write_ply(filepath, points.xyz, colors, ids, points.fields.get('scalar'))
 
   def __save_pc(self) -> None:
 
     def __save_npy(filepath: str):
       # save point data but not object data
-      spc = geometry.PointCloud()
-      if self.args.save and not self.args.downsample:
-        spc.points = utility.Vector3dVector(map(lambda p: p.get_xyz(), self.points))                 # pylint: disable=bad-builtin
-        spc.colors = utility.Vector3dVector(map(lambda p: p.get_color(self.args.cbid), self.points)) # pylint: disable=bad-builtin
-      elif self.args.save and self.args.downsample:
-        spc = self.pc
-      points = np.asarray(spc.points)
-      colors = np.asarray(spc.colors)
-      np.save(filepath, np.concatenate((points, colors), axis=1), allow_pickle=False)
+      # a ctrl-c of the terminal reaches this process too : the output is finished anyway (see `__on_end`),
+      # and it is written next to the target then renamed, so that a kill never leaves a truncated file
+      signal.signal(signal.SIGINT, signal.SIG_IGN)
+      signal.signal(signal.SIGTERM, lambda *_: sys.exit(1))
+      data: np.ndarray = None
+      points = self.__points()
+      ply = filepath.lower().endswith('.ply')
+      if self.args.downsample:
+        data = self.buffer.to_array() if self.layers is None else self.layers.to_array()
+      elif not ply:
+        data = np.concatenate((points.xyz, points.colors(self.args.cbid)), axis=1)
+      if ply:
+        self.__write_ply(filepath, points, data)
+      else:
+        save_npy(filepath, data)
       self.log.info('Saved point cloud to %s', filepath)
+      if points.curve and not self.args.downsample:                # the saved rows are in the order of the index
+        points.curve.save(f'{os.path.splitext(filepath)[0]}.curve.npz')
+      if 'distance' in points.fields and not self.args.downsample: # rows of the saved points
+        save_npy(f'{os.path.splitext(filepath)[0]}.distances.npy', points.fields['distance'])
+      if self.args.thumbnails:
+        xyz = points.xyz if data is None else data[:, :3]
+        rgb = points.colors(self.args.cbid) if data is None else data[:, 3:6]
+        paths = write_thumbnails(os.path.splitext(filepath)[0], xyz, rgb)
+        self.log.info('Wrote previews %s', ', '.join(os.path.basename(path) for path in paths))
+      if self.journal is not None:                                 # the checkpoints are not needed anymore
+        self.journal.remove()
 
     if self.args.save:
-      # launch the save function in a separate thread
-      Process(target=__save_npy, args=(self.args.save,)).start()
+      # launch the save function in a separate process
+      saver = Process(target=__save_npy, args=(self.args.save,))
+      saver.start()
+      self.saver = saver
 
   def __setup(self) -> None:
     """ setup the application """
+    if self.args.attach is not None: # the daemon already parsed and processed everything
+      self.__attach()
+      self.__create_pc_geometry()
+      self.__save_pc()
+      return
+
     # load the json file and create the configs
-    raw_data = None
-    with open(self.args.cfg, 'r', encoding='utf-8') as f:
-      try:
-        raw_data = pyjson5.decode_io(f, 4, some=False) # pylint: disable=no-member
-      except pyjson5.Json5DecoderException as e:       # pylint: disable=no-member
-        self.log.critical(
-          'Failed to parse json config file : '
-          'maximum nesting level could be reached, please check your file\n%s', e)
-    if not raw_data:
-      self.log.critical('Failed to parse %s : empty file', self.args.cfg)
-    default: dict[str, Any] = None
-    configs: list[dict[str, Any]] = None
-    try:
-      default = raw_data['default']
-      configs = raw_data['configs']
-    except KeyError as e:
-      self.log.critical('Failed to parse %s : %s', self.args.cfg, e)
     cfgs: list[Config] = []
     try:
-      for cfg in configs:
-        cfgs.append(Config.from_json(json=cfg, **default))
+      cfgs, raw_data = read_config_file(self.args.cfg)
+      if 'pipeline' in raw_data:
+        self.pipeline = Pipeline.from_json(raw_data['pipeline'])
     except ValueError as e:
-      self.log.critical('Failed to parse config n°%d : %s', len(cfgs), e)
-
-    fset: list[int] = None
-    if self.args.only and any(map(lambda x: x > len(cfgs), self.args.only)): # pylint: disable=bad-builtin
-      fset = sorted(list(filter(lambda x: x > len(cfgs), self.args.only)))
-      self.log.warning('Omitted invalid values for --only : %s', fset)
+      self.log.critical('%s', e)
 
-    # parse the files (slicing with None has no effect on small lists)
+    # parse the files
+    cfgs, fset = select_configs(cfgs, self.args.only)
     if fset:
+      self.log.warning('Omitted invalid values for --only : %s', fset)
       self.args.only -= set(fset)
-    self.__parse_files([cfgs[i - 1] for i in self.args.only] if self.args.only else cfgs)
+    self.fingerprint = fingerprint(cfgs)
+    self.names = [os.path.basename(cfg.file_path) for cfg in cfgs]
+    if self.args.stats is not None:
+      self.__print_stats(cfgs)
+      return
+    if self.args.raster is not None:
+      self.__write_raster(cfgs)
+      return
+    if self.args.preview is not None:
+      # reductions of a preview are not the ones of the whole files
+      self.fingerprint = fingerprint(cfgs, 'preview', self.args.preview, self.args.preview_random)
+      self.__preview_files(cfgs)
+      self.__create_pc_geometry()
+      self.__save_pc()
+      return
+
+    if self.args.sequence is not None:
+      # every file is a frame, decoded in the background around the shown one (see `run`)
+      if not cfgs:
+        self.log.critical('No file to play with --sequence')
+      self.ring = FrameRing(cfgs, self.__decode_frame, max_bytes=self.args.sequence_memory).start()
+      self.__request_frame(0)
+      return
+
+    if self.args.checkpoint:
+      # checkpoint the parsed points next to the output, so that an interrupted run can be resumed
+      try:
+        self.journal = Journal.open(self.args.save, self.fingerprint, self.args.resume)
+      except ValueError as e:
+        self.log.critical('%s', e)
+      if self.journal.parts or self.journal.finished:
+        self.log.info('Resuming from %s : %d/%d files parsed, %s points checkpointed', self.journal.directory,
+                      len(self.journal.finished), len(cfgs), format(self.journal.rows(), '_'))
+
+    # parse in the background and show the points as they come (see `run`)
+    if not self.args.no_exe:
+      starts = None if self.journal is None else [self.journal.start(i) for i in range(len(cfgs))]
+      self.loader = ChunkLoader(cfgs, starts=starts).start()
+      return
+    self.__parse_files(cfgs)
     # create the point cloud geometry
     self.__create_pc_geometry()
     # save the point cloud if needed
@@ -307,13 +1127,24 @@ class App:
     """
     run the gui
     """
-    if not self.args.no_exe:
+    if self.args.no_exe or self.args.stats is not None or self.args.raster is not None:
+      return
+    if self.ring:
+      self.__play()
+      return
+    if self.loader:
+      self.__load_progressively()
+    if self.store is not None: # not closed while loading
       self.vis.run()
 
   def __del__(self) -> None:
     """ cleanup """
     try:
+      if self.cache:
+        self.cache.save_stats()
       self.log.debug('Shutting down...')
+      if self.client:
+        self.client.close()
       self.pc.clear()
       self.vis.destroy_window()
     except AttributeError: # --no-exe case
@@ -0,0 +1,306 @@
+from __future__ import annotations
+
+import os
+import json
+import time
+import logging
+from argparse import Namespace
+from collections import Counter
+from collections.abc import Iterator
+from contextlib import contextmanager
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field, asdict
+from typing import Any, BinaryIO
+
+import numpy as np
+import pyjson5
+
+from .cache import fingerprint
+from .config import Config
+from .loader import read_config_file, select_configs, load_file
+from .pipeline import Pipeline
+from .store import PointStore
+from .thumbnail import write_thumbnails
+
+from ..log.logger import init_logger, worker_logging
+from ..utils.parser import parse_int_set
+
+__all__ = ['Batch', 'Job', 'atomic_write', 'save_npy']
+
+
+@dataclass
+class Job:
+  name: str                       # name in the summary
+  cfg: str                        # config path
+  save: str                       # .npy output path
+  only: set[int] | None = None    # only parse these entries of the config
+  frac: float | None = None       # fraction of points to save
+  voxel_size: float | None = None # voxel size for downsampling
+  cbid: bool = False              # force color by id
+  thumbnails: bool = False        # write png previews next to the output
+
+  def __post_init__(self):
+    if isinstance(self.only, str):
+      self.only = parse_int_set(self.only)
+    if self.frac and (self.frac <= 0 or self.frac > 1):
+      raise ValueError(f'invalid frac for job {self.name} : {self.frac} (should be > 0 and <= 1)')
+    if self.voxel_size is not None and self.voxel_size <= 0:
+      raise ValueError(f'invalid voxel_size for job {self.name} : {self.voxel_size} (should be > 0)')
+    if self.frac and self.voxel_size:
+      raise ValueError(f'frac and voxel_size are mutually exclusive (job {self.name})')
+
+  @classmethod
+  def from_json(cls, json: dict[str, Any], index: int = 0) -> 'Job': # pylint: disable=redefined-outer-name
+    """
+    create a Job from an entry of a job list
+
+    ## Parameters
+    ```py
+    >>> json : dict[str, Any]
+    ```
+    job entry, `cfg` and `save` are required
+    ```py
+    >>> index : int, (optional)
+    ```
+    position in the job list (for the default name)
+
+    ## Returns
+    ```py
+    Job : new job
+    ```
+    """
+    kwargs = dict(json)
+    kwargs.setdefault('name', f'{index + 1}:{os.path.splitext(os.path.basename(kwargs.get("save", "")))[0]}')
+    return cls(**kwargs)
+
+
+@dataclass
+class JobSummary:
+  name: str
+  cfg: str
+  save: str
+  status: str = 'ok'
+  error: str | None = None
+  files: int = 0
+  points: int = 0           # points saved
+  parsed_points: int = 0    # points before reduction
+  parse_seconds: float = 0. # worker time parsing the files of the job (shared files count for every job)
+  seconds: float = 0.       # wall time from the first file being ready to the output being written
+  bytes: int = 0            # size of the output
+  shared_files: list[str] = field(default_factory=list)
+  thumbnails: list[str] = field(default_factory=list)
+
+
+@contextmanager
+def atomic_write(path: str, buffering: int = -1) -> Iterator[BinaryIO]:
+  """
+  binary file written next to its target then renamed, so that a failure never leaves a truncated file\
+  (a plain file named after the process, created with the permissions of the umask like the target)
+
+  ## Parameters
+  ```py
+  >>> path : str
+  ```
+  output path (parent directories are created)
+  ```py
+  >>> buffering : int, (optional)
+  ```
+  buffer size of the file (default: the one of `open`)
+
+  ## Yields
+  ```py
+  BinaryIO : temporary file, renamed to `path` once the block exits without error
+  ```
+  """
+  os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+  tmp = f'{path}.{os.getpid()}.tmp'
+  try:
+    with open(tmp, 'wb', buffering=buffering) as f:
+      yield f
+    os.replace(tmp, path)
+  finally:
+    if os.path.exists(tmp):
+      os.remove(tmp)
+
+
+def save_npy(path: str, data: np.ndarray) -> int:
+  """
+  save an array to a .npy file atomically (written next to the target then renamed,
+  so that a failure never leaves a truncated file)
+
+  ## Parameters
+  ```py
+  >>> path : str
+  ```
+  .npy output path (parent directories are created)
+  ```py
+  >>> data : np.ndarray
+  ```
+  array to save
+
+  ## Returns
+  ```py
+  int : size of the written file
+  ```
+  """
+  with atomic_write(path) as f:
+    np.save(f, data, allow_pickle=False)
+  return os.path.getsize(path)
+
+
+def timed_load(cfg: Config) -> tuple[np.ndarray, float]:
+  """ `load_file` that also returns the time spent (runs in worker processes) """
+  start = time.perf_counter()
+  return load_file(cfg), time.perf_counter() - start
+
+
+class Batch:
+
+  def __init__(self, args: Namespace) -> None:
+    """
+    headless conversion of many config files to .npy files in one process\\
+    files are parsed once by a pool of worker processes, even when several jobs reference them
+
+    ## Parameters
+    ```py
+    >>> args : Namespace
+    ```
+    arguments from `batch_parser`
+    """
+    init_logger(logging.DEBUG if args.verbose else logging.INFO)
+    self.log = logging.getLogger('core.Batch')
+    self.workers: int = (os.cpu_count() or 1) if args.workers is None else args.workers
+    if self.workers <= 0:
+      raise RuntimeError(f'Invalid value for --workers : {self.workers} (should be > 0)')
+    self.summary_path: str = args.summary or os.path.join(args.out_dir, 'batch-summary.json')
+
+    self.jobs: list[Job] = []
+    for cfg in args.cfgs:
+      name = os.path.splitext(os.path.basename(cfg))[0]
+      save = os.path.join(args.out_dir, f'{name}.npy')
+      self.jobs.append(Job(name, cfg, save, None, args.frac, args.voxel_size, args.cbid, args.thumbnails))
+    if args.jobs:
+      with open(args.jobs, 'r', encoding='utf-8') as f:
+        entries = pyjson5.decode_io(f, some=False) # pylint: disable=no-member
+      if not isinstance(entries, list):
+        raise RuntimeError(f'Invalid job list {args.jobs} : expected an array of jobs')
+      self.jobs.extend(Job.from_json(e, i) for i, e in enumerate(entries))
+    if not self.jobs:
+      raise RuntimeError('No job given : pass config files and/or --jobs')
+    if len(names := [j.name for j in self.jobs]) != len(set(names)):
+      raise RuntimeError(f'Duplicated job names : {sorted(n for n, c in Counter(names).items() if c > 1)}')
+
+    self.__futures: dict[str, Future] = {}        # parsed files, shared between jobs
+    self.__pending: list[tuple[str, Config]] = [] # files not submitted yet, in order of first use
+    self.__uses: Counter = Counter()              # number of jobs using each file
+    self.__pipelines: dict[str, Pipeline] = {}    # processing stages of each job
+
+  def run(self) -> int:
+    """
+    run every job in order
+
+    ## Returns
+    ```py
+    int : exit code, 1 if any job failed
+    ```
+    """
+    start = time.perf_counter()
+    plans: list[list[tuple[str, Config]] | Exception] = []
+    for job in self.jobs:
+      try:
+        cfgs, raw_data = read_config_file(job.cfg)
+        if 'pipeline' in raw_data:
+          self.__pipelines[job.name] = Pipeline.from_json(raw_data['pipeline'])
+        cfgs, fset = select_configs(cfgs, job.only)
+        if fset:
+          self.log.warning('Omitted invalid values for only in job %s : %s', job.name, fset)
+        plans.append([(fingerprint([cfg]), cfg) for cfg in cfgs])
+      except (OSError, ValueError) as e:
+        plans.append(e)
+
+    refs = Counter(key for plan in plans if isinstance(plan, list) for key, _ in plan)
+    self.__uses = Counter(refs)
+    self.log.info('Running %d jobs over %d distinct files with %d workers', len(self.jobs), len(refs),
+                  self.workers)
+    for plan in plans:
+      if isinstance(plan, list):
+        for key, cfg in plan:
+          if key not in self.__futures and all(key != k for k, _ in self.__pending):
+            self.__pending.append((key, cfg))
+
+    summaries: list[JobSummary] = []
+    with ProcessPoolExecutor(max_workers=self.workers, **worker_logging()) as pool:
+      for job, plan in zip(self.jobs, plans):
+        summary = JobSummary(job.name, job.cfg, job.save)
+        if isinstance(plan, Exception):
+          summary.status, summary.error = 'failed', str(plan)
+        else:
+          self.__run_job(pool, job, plan, refs, summary)
+        if summary.status != 'ok':
+          self.log.error('Job %s failed : %s', job.name, summary.error)
+        summaries.append(summary)
+
+    self.__write_summary(summaries, time.perf_counter() - start)
+    return int(any(s.status != 'ok' for s in summaries))
+
+  def __submit(self, pool: ProcessPoolExecutor, until: set[str]) -> None:
+    # submit file loads in order of first use, keeping about two files per worker in memory
+    # (parsed or being parsed) so that parsing runs ahead of the jobs without holding every file
+    while self.__pending and (self.__pending[0][0] in until or len(self.__futures) < 2 * self.workers):
+      key, cfg = self.__pending.pop(0)
+      self.__futures[key] = pool.submit(timed_load, cfg)
+
+  def __run_job(self, pool: ProcessPoolExecutor, job: Job, plan: list[tuple[str, Config]], refs: Counter,
+                summary: JobSummary) -> None:
+    keys = {k for k, _ in plan}
+    self.__submit(pool, keys)
+    chunks: list[np.ndarray] = []
+    try:
+      for key, cfg in plan:
+        try:
+          data, seconds = self.__futures[key].result()
+        except FileNotFoundError as e:
+          self.log.warning('Skipping unknown file in job %s : %s', job.name, e)
+          data, seconds = np.empty((0, 9)), 0.
+        chunks.append(data)
+        summary.parse_seconds += seconds
+        if self.__uses[key] > 1:
+          summary.shared_files.append(cfg.file_path)
+        # keep the workers busy while this job is assembled
+        self.__submit(pool, set())
+      start = time.perf_counter()
+      summary.files = len(chunks)
+      store = PointStore.from_chunks(chunks)
+      summary.parsed_points = len(store)
+      if (pipeline := self.__pipelines.get(job.name)) is not None:
+        store, _ = pipeline.run(store)
+      xyz, rgb = store.view(job.frac, job.voxel_size, job.cbid)
+      summary.points = len(xyz)
+      summary.bytes = save_npy(job.save, np.concatenate((xyz, rgb), axis=1))
+      if store.curve and not job.frac and not job.voxel_size:
+        store.curve.save(f'{os.path.splitext(job.save)[0]}.curve.npz')
+      if job.thumbnails:
+        summary.thumbnails = write_thumbnails(os.path.splitext(job.save)[0], xyz, rgb)
+      summary.seconds = time.perf_counter() - start
+      self.log.info('Job %s : saved %s points to %s', job.name, format(summary.points, '_'), job.save)
+    except Exception as e:              # pylint: disable=broad-except
+      summary.status, summary.error = 'failed', f'{type(e).__name__}: {e}'
+    finally:
+      for key in keys:
+        refs[key] -= sum(1 for k, _ in plan if k == key)
+        if refs[key] <= 0:
+          self.__futures.pop(key, None) # no other job needs this file
+
+  def __write_summary(self, summaries: list[JobSummary], seconds: float) -> None:
+    ok = [s for s in summaries if s.status == 'ok']
+    points, size = sum(s.points for s in ok), sum(s.bytes for s in ok)
+    self.log.info('%d/%d jobs done in %.3f s : %s points, %.1f MiB written', len(ok), len(summaries), seconds,
+                  format(points, '_'), size / 2**20)
+    for s in summaries:
+      self.log.debug('%-20s %-6s %12s points %8.3f s %12d bytes', s.name, s.status, format(s.points, '_'),
+                     s.seconds, s.bytes)
+    os.makedirs(os.path.dirname(self.summary_path) or '.', exist_ok=True)
+    with open(self.summary_path, 'w', encoding='utf-8') as f:
+      doc = {'seconds': seconds, 'workers': self.workers, 'jobs': [asdict(s) for s in summaries]}
+      json.dump(doc, f, indent=2)
+    self.log.info('Wrote job summary to %s', self.summary_path)
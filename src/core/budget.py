@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass
+
+import numpy as np
+
+from .curve import BITS, CurveIndex, morton_keys, sort_keys
+
+__all__ = ['BYTES_PER_POINT', 'Occupancy', 'occupancy', 'choose_voxel_size']
+
+BYTES_PER_POINT = 48 # float64 coordinates and colors of a rendered point
+
+U64 = np.uint64
+
+
+@dataclass
+class Occupancy:
+  sizes: np.ndarray  # (L,) voxel sizes, finest first, each twice the previous one
+  counts: np.ndarray # (L,) occupied voxels at each size
+
+  def estimate(self, size: float) -> float:
+    """ occupied voxels at any size, interpolated between the two nearest levels (log-log) """
+    t = np.log2(size / self.sizes[0])
+    if t <= 0:
+      return float(self.counts[0])
+    if t >= len(self.sizes) - 1:
+      return float(self.counts[-1])
+    k = int(t)
+    n0, n1 = self.counts[k], self.counts[k + 1]
+    return float(n0 * (n1 / n0)**(t - k))
+
+
+def occupancy(xyz: np.ndarray, bits: int = BITS, workers: int = None) -> Occupancy:
+  """
+  number of occupied voxels at every power of two voxel size, from a single sort of the points\\
+  voxels are the ones of `VoxelGrid` (a lattice aligned on the origin), points are sorted along a morton
+  curve once, a voxel twice as large is then 3 bits less of the key,
+  so that every level is a linear pass over the (shrinking) distinct keys of the previous one
+
+  ## Parameters
+  ```py
+  >>> xyz : np.ndarray
+  ```
+  (N, 3) coordinates
+  ```py
+  >>> bits : int, (optional)
+  ```
+  bits per coordinate of the keys, the finest voxels are 2**(bits-1) times smaller than the cloud
+  and the coarsest ones are larger than the cloud (at most 2 per axis, as the lattice is not centered on it)
+  ```py
+  >>> workers : int, (optional)
+  ```
+  threads sorting the keys (default: number of cores)
+
+  ## Returns
+  ```py
+  Occupancy : voxel sizes and occupied voxels
+  ```
+  """
+  _, scale = CurveIndex.grid(xyz, bits - 1)
+  # cells of the finest voxels as in VoxelGrid.from_xyz, shifted by a multiple of the coarsest voxels
+  # so that shifted keys stay on the lattice of the origin
+  cells = np.floor(xyz / (1./scale)).astype(np.int64)
+  if len(cells):
+    cells -= cells.min(axis=0) >> (bits - 1) << (bits - 1)
+  keys = morton_keys(cells.astype(U64))
+  keys = keys[sort_keys(keys, workers)]
+  counts = []
+  for _ in range(bits):
+    if len(keys) > 1: # distinct keys only, in order
+      keys = keys[np.concatenate(([True], keys[1:] != keys[:-1]))]
+    counts.append(len(keys))
+    keys = keys >> U64(3)
+  return Occupancy(np.ldexp(1. / scale, np.arange(bits)), np.array(counts))
+
+
+def choose_voxel_size(xyz: np.ndarray, max_points: int, workers: int = None) -> tuple[float | None, int]:
+  """
+  voxel size whose downsampling lands closest to a number of points
+
+  ## Parameters
+  ```py
+  >>> xyz : np.ndarray
+  ```
+  (N, 3) coordinates
+  ```py
+  >>> max_points : int
+  ```
+  target number of points
+  ```py
+  >>> workers : int, (optional)
+  ```
+  threads sorting the keys (default: number of cores)
+
+  ## Returns
+  ```py
+  tuple[float | None, int] : voxel size (`None` if every point fits) and estimated number of points
+  ```
+  """
+  if len(xyz) <= max_points:
+    return None, len(xyz)
+  occ = occupancy(xyz, workers=workers)
+  # the coarsest level holds at most 8 voxels
+  if not (fits := occ.counts <= max_points).any():
+    return float(occ.sizes[-1]), int(occ.counts[-1])
+  if (k := int(np.argmax(fits))) == 0:
+    return float(occ.sizes[0]), int(occ.counts[0])
+
+  # occupancy follows a power law of the size between two levels (the dimension of the cloud)
+  n0, n1 = occ.counts[k - 1], occ.counts[k]
+  t = math.log(n0 / max_points) / math.log(n0 / n1)
+  size = float(occ.sizes[k - 1] * 2**t)
+  return size, round(occ.estimate(size))
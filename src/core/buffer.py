@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+import numpy as np
+from open3d import geometry
+from open3d import utility
+
+from .point import Point, get_colors
+
+__all__ = ['RenderBuffer']
+
+
+class RenderBuffer:
+
+  def __init__(self, xyz: np.ndarray, rgb: np.ndarray) -> None:
+    """
+    contiguous float64 (N, 3) arrays backing a point cloud geometry\\
+    once bound to a geometry, `xyz` and `rgb` are views on the geometry memory,
+    so that writing into a slice of them updates the rendered points in place
+
+    ## Parameters
+    ```py
+    >>> xyz : np.ndarray
+    ```
+    (N, 3) coordinates
+    ```py
+    >>> rgb : np.ndarray
+    ```
+    (N, 3) colors in range [0, 1]
+    """
+    self.xyz = np.ascontiguousarray(xyz, dtype=np.float64).reshape(-1, 3)
+    self.rgb = np.ascontiguousarray(rgb, dtype=np.float64).reshape(-1, 3)
+    if len(self.xyz) != len(self.rgb):
+      raise ValueError(f'xyz and rgb must have the same length ({len(self.xyz)} != {len(self.rgb)})')
+
+  def __len__(self) -> int:
+    return len(self.xyz)
+
+  @classmethod
+  def from_array(cls, data: np.ndarray, cbid: bool = False) -> 'RenderBuffer':
+    """
+    create a RenderBuffer from an (N, 9) array of points
+
+    ## Parameters
+    ```py
+    >>> data : np.ndarray
+    ```
+    (N, 9) array of points (x, y, z, r, g, b, id, t, i)
+    ```py
+    >>> cbid : bool, (optional)
+    ```
+    force color by id
+
+    ## Returns
+    ```py
+    RenderBuffer : new buffer
+    ```
+    """
+    data = np.asarray(data, dtype=np.float64).reshape(-1, 9)
+    return cls(data[:, :3], get_colors(data[:, 3:6], data[:, 6], cbid))
+
+  @classmethod
+  def from_points(cls, points: list[Point], cbid: bool = False) -> 'RenderBuffer':
+    """
+    create a RenderBuffer from a list of points\\
+    the points are stacked once into a single array instead of being converted one by one
+
+    ## Parameters
+    ```py
+    >>> points : list[Point]
+    ```
+    list of points
+    ```py
+    >>> cbid : bool, (optional)
+    ```
+    force color by id
+
+    ## Returns
+    ```py
+    RenderBuffer : new buffer
+    ```
+    """
+    if len(points) == 0:
+      return cls(np.empty((0, 3)), np.empty((0, 3)))
+    return cls.from_array(np.asarray(points, dtype=np.float64), cbid)
+
+  @classmethod
+  def from_geometry(cls, pc: geometry.PointCloud) -> 'RenderBuffer':
+    """
+    create a RenderBuffer bound to an existing geometry (e.g. after a downsampling)
+
+    ## Parameters
+    ```py
+    >>> pc : geometry.PointCloud
+    ```
+    point cloud geometry
+
+    ## Returns
+    ```py
+    RenderBuffer : new buffer, already bound to `pc`
+    ```
+    """
+    buffer = cls(np.empty((0, 3)), np.empty((0, 3)))
+    buffer.bind(pc)
+    return buffer
+
+  def attach(self, pc: geometry.PointCloud) -> None:
+    """
+    copy the buffer into the geometry (one memcpy per array) and bind to it
+
+    ## Parameters
+    ```py
+    >>> pc : geometry.PointCloud
+    ```
+    point cloud geometry
+    """
+    pc.points = utility.Vector3dVector(self.xyz)
+    pc.colors = utility.Vector3dVector(self.rgb)
+    self.bind(pc)
+
+  def bind(self, pc: geometry.PointCloud) -> None:
+    """
+    make `xyz` and `rgb` views on the geometry memory
+
+    ## Parameters
+    ```py
+    >>> pc : geometry.PointCloud
+    ```
+    point cloud geometry
+    """
+    self.xyz = np.asarray(pc.points)
+    self.rgb = np.asarray(pc.colors)
+
+  def update(self, pc: geometry.PointCloud, xyz: np.ndarray, rgb: np.ndarray) -> slice | None:
+    """
+    update the geometry with new arrays\\
+    if the size did not change, only the slice spanning the changed rows is written,
+    otherwise the geometry is rebuilt from the new arrays
+
+    ## Parameters
+    ```py
+    >>> pc : geometry.PointCloud
+    ```
+    point cloud geometry the buffer is bound to
+    ```py
+    >>> xyz : np.ndarray
+    ```
+    (N, 3) new coordinates
+    ```py
+    >>> rgb : np.ndarray
+    ```
+    (N, 3) new colors
+
+    ## Returns
+    ```py
+    slice | None : rows that were written in place, `None` if the geometry had to be rebuilt
+    ```
+    """
+    if len(xyz) != len(self) or len(rgb) != len(self):
+      RenderBuffer(xyz, rgb).attach(pc)
+      self.bind(pc)
+      return None
+    changed = np.flatnonzero(np.any(self.xyz != xyz, axis=1) | np.any(self.rgb != rgb, axis=1))
+    if len(changed) == 0:
+      return slice(0, 0)
+    rows = slice(int(changed[0]), int(changed[-1]) + 1)
+    self.xyz[rows] = xyz[rows]
+    self.rgb[rows] = rgb[rows]
+    return rows
+
+  def append(self, pc: geometry.PointCloud, xyz: np.ndarray, rgb: np.ndarray) -> None:
+    """
+    add points at the end of the geometry (amortized growth of the geometry vectors,
+    the existing points are not copied again on every call)
+
+    ## Parameters
+    ```py
+    >>> pc : geometry.PointCloud
+    ```
+    point cloud geometry the buffer is bound to
+    ```py
+    >>> xyz : np.ndarray
+    ```
+    (n, 3) coordinates
+    ```py
+    >>> rgb : np.ndarray
+    ```
+    (n, 3) colors in range [0, 1]
+    """
+    if len(xyz) != len(rgb):
+      raise ValueError(f'xyz and rgb must have the same length ({len(xyz)} != {len(rgb)})')
+    pc.points.extend(utility.Vector3dVector(np.ascontiguousarray(xyz, dtype=np.float64).reshape(-1, 3)))
+    pc.colors.extend(utility.Vector3dVector(np.ascontiguousarray(rgb, dtype=np.float64).reshape(-1, 3)))
+    self.bind(pc) # the geometry memory may have moved
+
+  def to_array(self) -> np.ndarray:
+    """
+    concatenate coordinates and colors
+
+    ## Returns
+    ```py
+    np.ndarray : (N, 6) array of points (x, y, z, r, g, b), as saved in .npy files
+    ```
+    """
+    return np.concatenate((self.xyz, self.rgb), axis=1)
@@ -0,0 +1,242 @@
+from __future__ import annotations
+
+import os
+import json
+import hashlib
+import logging
+import tempfile
+from typing import Any
+
+import numpy as np
+
+from .config import Config
+
+__all__ = ['DownsampleCache', 'fingerprint']
+
+CACHE_VERSION = 1 # bump when the layout of cached arrays changes
+
+
+def default_cache_dir() -> str:
+  """
+  cache directory from the `PCV_CACHE_DIR` environment variable, or `~/.cache/pcv`
+  """
+  return os.environ.get('PCV_CACHE_DIR') or os.path.join(os.path.expanduser('~'), '.cache', 'pcv')
+
+
+def fingerprint(cfgs: list[Config], *extra: Any) -> str:
+  """
+  fingerprint of a set of inputs\\
+  changes whenever a file is modified or when the way it is parsed changes
+
+  ## Parameters
+  ```py
+  >>> cfgs : list[Config]
+  ```
+  configs of the parsed files, in order
+  ```py
+  >>> *extra : Any
+  ```
+  other json parameters of the parsing (e.g. only a preview of the files)
+
+  ## Returns
+  ```py
+  str : hex digest
+  ```
+  """
+  desc = [CACHE_VERSION]
+  for cfg in cfgs:
+    try:
+      st = os.stat(cfg.file_path)
+      stamp = (st.st_size, st.st_mtime_ns)
+    except OSError:
+      stamp = None
+    desc.append(
+      (os.path.abspath(cfg.file_path), stamp, list(cfg.source_xyz), cfg.pattern, cfg.skip_first_line))
+  if extra:
+    desc.append(list(extra))
+  return hashlib.sha1(json.dumps(desc).encode('utf-8')).hexdigest()[:20]
+
+
+class DownsampleCache:
+
+  def __init__(self, root: str = None, max_bytes: int = 2 << 30) -> None:
+    """
+    on-disk cache of reduction results (voxel grids, random permutations) shared across sessions\\
+    entries are `.npz` files named after the input fingerprint and the reduction parameters,
+    the least recently used ones are evicted when the cache grows past `max_bytes`
+
+    ## Parameters
+    ```py
+    >>> root : str, (optional)
+    ```
+    cache directory (see `default_cache_dir`)
+    ```py
+    >>> max_bytes : int, (optional)
+    ```
+    maximum total size of the entries
+    """
+    self.log = logging.getLogger('cache')
+    self.root = root or default_cache_dir()
+    self.max_bytes = max_bytes
+    os.makedirs(self.root, exist_ok=True)
+    self.__stats_path = os.path.join(self.root, 'stats.json')
+    self.session = {'hits': 0, 'misses': 0, 'derived': 0}
+
+  def __path(self, key: str, name: str) -> str:
+    return os.path.join(self.root, f'{key}-{name}.npz')
+
+  def __entries(self) -> list[tuple[str, int, float]]:
+    # (path, size, last use) of every entry
+    entries = []
+    for file in os.listdir(self.root):
+      if file.endswith('.npz'):
+        try:
+          st = os.stat(path := os.path.join(self.root, file))
+        except OSError: # evicted concurrently
+          continue
+        entries.append((path, st.st_size, st.st_mtime))
+    return entries
+
+  def __load_stats(self) -> dict[str, int]:
+    try:
+      with open(self.__stats_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+    except (OSError, ValueError):
+      return {'hits': 0, 'misses': 0, 'derived': 0}
+
+  def record(self, event: str) -> None:
+    """
+    count a cache event for this session (merged in the persistent statistics by `save_stats`)
+
+    ## Parameters
+    ```py
+    >>> event : str
+    ```
+    one of `hits`, `misses`, `derived`
+    """
+    self.session[event] += 1
+
+  def save_stats(self) -> None:
+    """ add the events of this session to the persistent statistics, once at shutdown """
+    # batch imports the fingerprints of this module
+    from .batch import atomic_write # pylint: disable=import-outside-toplevel
+    if not any(self.session.values()):
+      return
+    stats = self.__load_stats()
+    for event, n in self.session.items():
+      stats[event] = stats.get(event, 0) + n
+    try:
+      with atomic_write(self.__stats_path) as f:
+        f.write(json.dumps(stats).encode('utf-8'))
+    except OSError as e:
+      self.log.debug('Could not write cache statistics : %s', e)
+      return
+    self.session = dict.fromkeys(self.session, 0)
+
+  def log_stats(self) -> None:
+    """ log the size of the cache and the hit/miss statistics of previous sessions """
+    entries = self.__entries()
+    stats = self.__load_stats()
+    hits, misses, derived = stats.get('hits', 0), stats.get('misses', 0), stats.get('derived', 0)
+    size = sum(e[1] for e in entries)
+    self.log.info(
+      'Downsample cache at %s : %d entries, %.1f / %.1f MiB, %d hits, %d misses, %d derived '
+      '(%.0f%% hit rate)', self.root, len(entries), size / 2**20, self.max_bytes / 2**20, hits, misses,
+      derived, 100 * hits / max(hits + misses, 1))
+
+  def names(self, key: str, prefix: str = '') -> list[str]:
+    """
+    names of the entries stored for an input fingerprint
+
+    ## Parameters
+    ```py
+    >>> key : str
+    ```
+    input fingerprint
+    ```py
+    >>> prefix : str, (optional)
+    ```
+    only keep names starting with this prefix
+
+    ## Returns
+    ```py
+    list[str] : entry names
+    ```
+    """
+    head = f'{key}-{prefix}'
+    return [
+      f[len(key) + 1:-len('.npz')] for f in os.listdir(self.root) if f.startswith(head) and f.endswith('.npz')
+    ]
+
+  def get(self, key: str, name: str) -> dict[str, np.ndarray] | None:
+    """
+    load an entry (and mark it as recently used)
+
+    ## Parameters
+    ```py
+    >>> key : str
+    ```
+    input fingerprint
+    ```py
+    >>> name : str
+    ```
+    reduction name and parameters
+
+    ## Returns
+    ```py
+    dict[str, np.ndarray] | None : stored arrays, `None` on a miss
+    ```
+    """
+    path = self.__path(key, name)
+    try:
+      with np.load(path, allow_pickle=False) as npz:
+        arrays = {k: npz[k] for k in npz.files}
+      os.utime(path)
+    except (OSError, ValueError) as e:
+      self.log.debug('Cache miss for %s (%s)', name, type(e).__name__)
+      self.record('misses')
+      return None
+    self.log.debug('Cache hit for %s', name)
+    self.record('hits')
+    return arrays
+
+  def put(self, key: str, name: str, arrays: dict[str, np.ndarray]) -> None:
+    """
+    store an entry (atomically) then evict old entries if the cache is too large
+
+    ## Parameters
+    ```py
+    >>> key : str
+    ```
+    input fingerprint
+    ```py
+    >>> name : str
+    ```
+    reduction name and parameters
+    ```py
+    >>> arrays : dict[str, np.ndarray]
+    ```
+    arrays to store
+    """
+    try:
+      fd, tmp = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+      with os.fdopen(fd, 'wb') as f:
+        np.savez(f, **arrays)
+      os.replace(tmp, self.__path(key, name))
+    except OSError as e:
+      self.log.warning('Could not write %s to the cache : %s', name, e)
+      return
+    self.__evict()
+
+  def __evict(self) -> None:
+    entries = sorted(self.__entries(), key=lambda e: e[2]) # oldest first
+    total = sum(e[1] for e in entries)
+    for path, size, _ in entries:
+      if total <= self.max_bytes:
+        break
+      try:
+        os.remove(path)
+        total -= size
+        self.log.debug('Evicted %s from the cache', os.path.basename(path))
+      except OSError:
+        pass
@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .voxel import group_keys, pack_keys
+
+__all__ = ['union_find', 'cluster_points']
+
+# half of the 26 neighbours of a voxel : every pair of touching voxels is seen once
+OFFSETS = np.array([
+  (i, j, k) for i in (-1, 0, 1) for j in (-1, 0, 1) for k in (-1, 0, 1) if (i, j, k) > (0, 0, 0)
+])
+
+
+def union_find(parent: np.ndarray, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+  """
+  connected components of a graph, vectorized union-find\\
+  every round hooks the larger root of each edge under the smaller one (a scatter-min),
+  then compresses the paths by pointer jumping until every node points to its root
+
+  ## Parameters
+  ```py
+  >>> parent : np.ndarray
+  ```
+  (n,) initial parent of every node, pointing to a root (e.g. `np.arange(n)`, or the roots of subgraphs)
+  ```py
+  >>> a, b : np.ndarray
+  ```
+  (e,) ends of the edges
+
+  ## Returns
+  ```py
+  np.ndarray : (n,) root of every node, the smallest node of its component
+  ```
+  """
+  parent = parent.copy()
+  while len(a):
+    ra, rb = parent[a], parent[b]
+    hooked = ra != rb
+    if not hooked.any():
+      break
+    a, b, ra, rb = a[hooked], b[hooked], ra[hooked], rb[hooked]
+    np.minimum.at(parent, np.maximum(ra, rb), np.minimum(ra, rb))
+    while True:
+      grand = parent[parent]
+      if np.array_equal(grand, parent):
+        break
+      parent = grand
+  return parent
+
+
+# pylint: disable-next=too-many-positional-arguments,too-many-locals
+def cluster_points(xyz: np.ndarray,
+                   voxel_size: float,
+                   min_points: int = 1,
+                   min_size: int = 1,
+                   tile_size: float = None,
+                   workers: int = None) -> np.ndarray:
+  """
+  ids of the connected clusters of points, on a voxel hash grid\\
+  points fall in voxels of `voxel_size`, voxels with at least `min_points` points are kept (density, like the
+  core points of DBSCAN) and two kept voxels are connected when they touch (26 neighbours), so that clusters
+  are separated by gaps of at least one voxel ; voxels are split into xy tiles whose edges and components are
+  found in parallel, then the edges crossing the tiles merge the components of the tiles
+
+  ## Parameters
+  ```py
+  >>> xyz : np.ndarray
+  ```
+  (N, 3) coordinates
+  ```py
+  >>> voxel_size : float
+  ```
+  side of the voxels
+  ```py
+  >>> min_points : int, (optional)
+  ```
+  points of a voxel for it to take part in a cluster
+  ```py
+  >>> min_size : int, (optional)
+  ```
+  points of a cluster for it to get an id
+  ```py
+  >>> tile_size : float, (optional)
+  ```
+  side of the xy tiles processed in parallel (default: 64 voxels)
+  ```py
+  >>> workers : int, (optional)
+  ```
+  number of threads, defaults to the number of cores
+
+  ## Returns
+  ```py
+  np.ndarray : (N,) int64 ids, from 1 for the largest cluster, -1 for the points of no cluster
+  ```
+
+  ## Raises
+  ```py
+  ValueError : if the voxel size is not > 0 or too small for the extent of the points
+  ```
+  """
+  if voxel_size <= 0:
+    raise ValueError(f'voxel size must be > 0 (got {voxel_size})')
+  if len(xyz) == 0:
+    return np.empty(0, dtype=np.int64)
+  log = logging.getLogger('cluster')
+  ijk = np.floor(xyz / voxel_size).astype(np.int64)
+  first, inverse = group_keys(pack_keys(ijk))
+  counts = np.bincount(inverse, minlength=len(first))
+  dense = np.flatnonzero(counts >= min_points)
+  vox = ijk[first[dense]]
+
+  # hash of the kept voxels : mixed radix keys with a margin of one voxel, searched in sorted order
+  lo = vox.min(axis=0) - 1 if len(vox) else np.zeros(3, dtype=np.int64)
+  span = (vox.max(axis=0) - lo + 2) if len(vox) else np.ones(3, dtype=np.int64)
+  if int(span[0]) * int(span[1]) * int(span[2]) >= 2**62:
+    raise ValueError(f'voxel size {voxel_size} is too small for the extent of the points')
+
+  def pack(v: np.ndarray) -> np.ndarray:
+    return ((v[:, 0] - lo[0]) * span[1] + (v[:, 1] - lo[1])) * span[2] + (v[:, 2] - lo[2])
+
+  keys = pack(vox)
+  order = np.argsort(keys)
+  sorted_keys = keys[order]
+
+  # xy tiles of voxels
+  side = max(int((tile_size or 64 * voxel_size) / voxel_size), 1)
+  tile_first, tile_of = group_keys(
+    pack_keys(np.column_stack((vox[:, :2] // side, np.zeros(len(vox), np.int64)))))
+  by_tile = np.argsort(tile_of, kind='stable')
+  bounds = np.concatenate(([0], np.cumsum(np.bincount(tile_of, minlength=len(tile_first)))))
+
+  def process(t: int) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    # components of the voxels of a tile, and the edges leaving the tile
+    own = by_tile[bounds[t]:bounds[t + 1]]
+    a, b = [], []
+    for offset in OFFSETS:
+      k = pack(vox[own] + offset)
+      pos = np.minimum(np.searchsorted(sorted_keys, k), len(sorted_keys) - 1)
+      found = sorted_keys[pos] == k
+      a.append(own[found])
+      b.append(order[pos[found]])
+    a, b = np.concatenate(a), np.concatenate(b)
+    inside = tile_of[b] == t
+    # voxels of the tile are in increasing order, their local index is a binary search away
+    roots = union_find(np.arange(len(own)), np.searchsorted(own, a[inside]), np.searchsorted(own, b[inside]))
+    return own, own[roots], a[~inside], b[~inside]
+
+  with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+    results = list(pool.map(process, range(len(tile_first))))
+  parent = np.empty(len(vox), dtype=np.int64)
+  for own, roots, _, _ in results:
+    parent[own] = roots
+  # boundary merging, over the few edges between tiles, from the components of the tiles
+  a = np.concatenate([r[2] for r in results] or [np.empty(0, dtype=np.int64)])
+  b = np.concatenate([r[3] for r in results] or [np.empty(0, dtype=np.int64)])
+  roots = union_find(parent, a, b)
+
+  # ids by decreasing number of points (ids start at 1, 0 shares the color of missing ids)
+  components, component = np.unique(roots, return_inverse=True)
+  sizes = np.bincount(component, weights=counts[dense], minlength=len(components)).astype(np.int64)
+  rank = np.empty(len(components), dtype=np.int64)
+  rank[np.argsort(-sizes, kind='stable')] = np.arange(1, len(components) + 1)
+  rank[sizes < min_size] = -1
+  voxel_ids = np.full(len(first), -1, dtype=np.int64)
+  voxel_ids[dense] = rank[component]
+  log.debug('Clustered %s voxels over %d tiles (%s edges between tiles) into %s clusters',
+            format(len(vox), '_'), len(tile_first), format(len(a), '_'),
+            format(int((sizes >= min_size).sum()), '_'))
+  return voxel_ids[inverse]
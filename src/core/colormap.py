@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import numpy as np
+
+__all__ = ['COLORMAPS', 'apply_colormap']
+
+# evenly spaced (r, g, b) stops in [0, 1], linearly interpolated
+VIRIDIS = [[.267, .005, .329], [.283, .141, .458], [.254, .265, .530], [.207, .372, .553], [.164, .471, .558],
+           [.128, .567, .551], [.135, .659, .518], [.369, .789, .383], [.993, .906, .144]]
+JET = [[0., 0., .5], [0., 0., 1.], [0., .5, 1.], [0., 1., 1.], [.5, 1., .5], [1., 1., 0.], [1., .5, 0.],
+       [1., 0., 0.], [.5, 0., 0.]]
+GRAY = [[0., 0., 0.], [1., 1., 1.]]
+COLORMAPS: dict[str, np.ndarray] = {
+  name: np.array(stops) for name, stops in (('viridis', VIRIDIS), ('jet', JET), ('gray', GRAY))
+}
+MISSING = (.5, .5, .5) # color of nan values
+
+
+def apply_colormap(values: np.ndarray, lo: float, hi: float, name: str = 'viridis') -> np.ndarray:
+  """
+  colors of scalar values, vectorized\\
+  values are stretched linearly from [lo, hi] to the colormap and clipped outside of it
+
+  ## Parameters
+  ```py
+  >>> values : np.ndarray
+  ```
+  (N,) scalar values (nan for missing values, inf for values above any bound)
+  ```py
+  >>> lo, hi : float
+  ```
+  values mapped to the first and last colors
+  ```py
+  >>> name : str, (optional)
+  ```
+  colormap, one of `COLORMAPS`
+
+  ## Returns
+  ```py
+  np.ndarray : (N, 3) contiguous float64 array of colors in range [0, 1]
+  ```
+
+  ## Raises
+  ```py
+  ValueError : if the colormap is unknown
+  ```
+  """
+  if name not in COLORMAPS:
+    raise ValueError(f'Unknown colormap : {name} (should be one of {", ".join(COLORMAPS)})')
+  stops = COLORMAPS[name]
+  values = np.asarray(values, dtype=np.float64).ravel()
+  u = np.clip((values-lo) / (hi-lo) if hi > lo else np.zeros(len(values)), 0, 1) * (len(stops) - 1)
+  colors = np.empty((len(values), 3), dtype=np.float64)
+  for c in range(3):
+    colors[:, c] = np.interp(u, np.arange(len(stops)), stops[:, c])
+  colors[np.isnan(values)] = MISSING
+  return colors
@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import os
+import logging
+from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from .config import Config
+from .loader import load_rows
+from .rowindex import RowIndex, split_files
+from .spatial import TileGrid, run_tiled
+
+from ..log.logger import worker_logging
+
+__all__ = ['DistanceSummary', 'load_xyz', 'cloud_distances']
+
+POINTS_PER_TILE = 500_000 # query points of a tile (the reference points of a tile come along)
+
+
+def load_xyz_part(part: tuple[Config, int, int, RowIndex]) -> np.ndarray:
+  """ coordinates of some rows of a file (runs in worker processes) """
+  return np.ascontiguousarray(load_rows(*part)[:, :3])
+
+
+def load_xyz(cfgs: list[Config], workers: int = None) -> tuple[np.ndarray, list[Config]]:
+  """
+  coordinates of the points of every file, parsed by a pool of processes\\
+  files are split on their row index so that every worker parses about as many rows
+
+  ## Parameters
+  ```py
+  >>> cfgs : list[Config]
+  ```
+  configs of the files
+  ```py
+  >>> workers : int, (optional)
+  ```
+  parsing processes (default: one per cpu)
+
+  ## Returns
+  ```py
+  tuple[np.ndarray, list[Config]] : (N, 3) coordinates, and the configs of the unknown files
+  ```
+
+  ## Raises
+  ```py
+  ValueError : if a line could not be parsed
+  ```
+  """
+  workers = workers or os.cpu_count() or 1
+  parts, unknown = split_files(cfgs, workers)
+  with ProcessPoolExecutor(max_workers=workers, **worker_logging()) as pool:
+    xyz = list(pool.map(load_xyz_part, parts))
+  return (np.concatenate(xyz) if xyz else np.empty((0, 3))), unknown
+
+
+@dataclass
+class DistanceSummary:
+  points: int  # compared points
+  matched: int # points with a reference point within the maximum distance
+  mean: float  # over the matched points
+  median: float
+  p95: float
+  max: float
+
+  @classmethod
+  def of(cls, distances: np.ndarray) -> 'DistanceSummary':
+    d = distances[np.isfinite(distances)]
+    if len(d) == 0:
+      return cls(len(distances), 0, np.nan, np.nan, np.nan, np.nan)
+    median, p95 = np.percentile(d, [50, 95])
+    return cls(len(distances), len(d), float(d.mean()), float(median), float(p95), float(d.max()))
+
+  def __str__(self) -> str:
+    return (f'{format(self.matched, "_")}/{format(self.points, "_")} points matched, distances : '
+            f'mean {self.mean:.4g}, median {self.median:.4g}, 95% {self.p95:.4g}, max {self.max:.4g}')
+
+
+def cloud_distances(xyz: np.ndarray,
+                    reference: np.ndarray,
+                    max_distance: float = None,
+                    tiles: TileGrid = None,
+                    workers: int = None) -> np.ndarray:
+  """
+  distance from every point to its nearest neighbour in another cloud (cloud to cloud change detection)\\
+  the points are split into xy tiles searched in parallel, each one in a k-d tree of the reference points
+  of the tile and of a halo around it ; points farther from their neighbour than from the edge of the halo
+  are searched again in a tree of the whole reference, so that the distances are exact
+
+  ## Parameters
+  ```py
+  >>> xyz : np.ndarray
+  ```
+  (N, 3) compared coordinates
+  ```py
+  >>> reference : np.ndarray
+  ```
+  (M, 3) reference coordinates
+  ```py
+  >>> max_distance : float, (optional)
+  ```
+  distances are not looked for beyond it (the halo of the tiles), farther points get `inf`
+  (default: no limit, the halo is an eighth of the tiles)
+  ```py
+  >>> tiles : TileGrid, (optional)
+  ```
+  tiling of the compared points (default: about 500k points per tile)
+  ```py
+  >>> workers : int, (optional)
+  ```
+  number of threads (k-d tree queries release the GIL), defaults to the number of cores
+
+  ## Returns
+  ```py
+  np.ndarray : (N,) float64 distances
+  ```
+  """
+  if max_distance is not None and max_distance <= 0:
+    raise ValueError(f'maximum distance must be > 0 (got {max_distance})')
+  if len(xyz) == 0 or len(reference) == 0:
+    return np.full(len(xyz), np.inf)
+  tiles = tiles or TileGrid.auto(xyz, POINTS_PER_TILE)
+  bound = np.inf if max_distance is None else max_distance
+
+  def func(tree: cKDTree, query: np.ndarray) -> tuple[dict[str, np.ndarray], np.ndarray]:
+    d, _ = tree.query(query, distance_upper_bound=bound)
+    return {'distances': d}, np.minimum(d, bound)
+
+  # a limited search never leaves a halo of that width (beyond the limit is the same as anywhere)
+  halo = tiles.size / 8 if max_distance is None else max_distance * (1+1e-9)
+  log = logging.getLogger('compare')
+  log.debug('Comparing %s points to %s points over %d tiles of %.6g', format(len(xyz), '_'),
+            format(len(reference), '_'), len(tiles), tiles.size)
+  return run_tiled(xyz, func, halo, tiles, workers, reference=reference)['distances']
@@ -0,0 +1,334 @@
+from __future__ import annotations
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+__all__ = ['CURVES', 'CurveIndex', 'curve_keys', 'morton_keys', 'hilbert_keys', 'sort_keys']
+
+CURVES = ('morton', 'hilbert')
+BITS = 21                   # bits per coordinate, 63 bits keys
+PARALLEL_MIN_KEYS = 1 << 18 # smaller arrays are sorted by a single thread
+
+U64 = np.uint64
+
+
+def spread_bits(v: np.ndarray) -> np.ndarray:
+  """ insert two zero bits between the 21 lowest bits of every value """
+  v = v & U64(0x1FFFFF)
+  v = (v | v << U64(32)) & U64(0x1F00000000FFFF)
+  v = (v | v << U64(16)) & U64(0x1F0000FF0000FF)
+  v = (v | v << U64(8)) & U64(0x100F00F00F00F00F)
+  v = (v | v << U64(4)) & U64(0x10C30C30C30C30C3)
+  v = (v | v << U64(2)) & U64(0x1249249249249249)
+  return v
+
+
+def morton_keys(cells: np.ndarray) -> np.ndarray:
+  """ (N,) uint64 z-order keys of (N, 3) uint64 cells (at most 21 bits per coordinate) """
+  return spread_bits(cells[:, 0]) | spread_bits(cells[:, 1]) << U64(1) | spread_bits(cells[:, 2]) << U64(2)
+
+
+def hilbert_keys(cells: np.ndarray, bits: int = BITS) -> np.ndarray:
+  """
+  (N,) uint64 hilbert keys of (N, 3) uint64 cells\\
+  (J. Skilling, "Programming the Hilbert curve", run over every cell at once)
+  """
+  x = [cells[:, i].copy() for i in range(3)]
+  zero = U64(0)
+  q = 1 << (bits - 1)
+  while q > 1:
+    p = U64(q - 1)
+    for i in range(3):
+      high = (x[i] & U64(q)) != 0
+      x[0] ^= np.where(high, p, zero)             # invert the low bits of x[0]
+      t = np.where(high, zero, (x[0] ^ x[i]) & p) # or exchange them with x[i]
+      x[0] ^= t
+      x[i] ^= t
+    q >>= 1
+  x[1] ^= x[0]
+  x[2] ^= x[1]
+  t = np.zeros(len(cells), dtype=U64)
+  q = 1 << (bits - 1)
+  while q > 1:
+    t ^= np.where((x[2] & U64(q)) != 0, U64(q - 1), zero)
+    q >>= 1
+  x = [v ^ t for v in x]
+  return spread_bits(x[0]) << U64(2) | spread_bits(x[1]) << U64(1) | spread_bits(x[2])
+
+
+def curve_keys(xyz: np.ndarray,
+               lo: np.ndarray,
+               scale: float,
+               curve: str = 'morton',
+               bits: int = BITS) -> np.ndarray:
+  """
+  keys of points along a space-filling curve
+
+  ## Parameters
+  ```py
+  >>> xyz : np.ndarray
+  ```
+  (N, 3) coordinates
+  ```py
+  >>> lo : np.ndarray
+  ```
+  (3,) corner of the grid
+  ```py
+  >>> scale : float
+  ```
+  cells per unit of length (points outside of the grid are clamped to its border)
+  ```py
+  >>> curve : str, (optional)
+  ```
+  `morton` or `hilbert`
+  ```py
+  >>> bits : int, (optional)
+  ```
+  bits per coordinate (at most 21)
+
+  ## Returns
+  ```py
+  np.ndarray : (N,) uint64 keys
+  ```
+  """
+  cells = np.clip(np.floor((xyz-lo) * scale), 0, (1 << bits) - 1).astype(U64)
+  return hilbert_keys(cells, bits) if curve == 'hilbert' else morton_keys(cells)
+
+
+def sort_keys(keys: np.ndarray, workers: int = None) -> np.ndarray:
+  """
+  stable argsort of uint64 keys\\
+  keys are bucketed by their highest bits, then the buckets are sorted by a pool of threads
+
+  ## Parameters
+  ```py
+  >>> keys : np.ndarray
+  ```
+  (N,) keys
+  ```py
+  >>> workers : int, (optional)
+  ```
+  number of threads (default: number of cores)
+
+  ## Returns
+  ```py
+  np.ndarray : (N,) order of the keys
+  ```
+  """
+  workers = workers or os.cpu_count() or 1
+  if workers <= 1 or len(keys) < PARALLEL_MIN_KEYS:
+    return np.argsort(keys, kind='stable')
+  shift = max(int(keys.max()).bit_length() - 8, 0)
+  buckets = (keys >> U64(shift)).astype(np.uint16)
+  order = np.argsort(buckets, kind='stable') # radix sort of small integers
+  bounds = np.concatenate(([0], np.cumsum(np.bincount(buckets, minlength=256)))).tolist()
+
+  def sort(b: int) -> None:
+    rows = order[bounds[b]:bounds[b + 1]]
+    rows[...] = rows[np.argsort(keys[rows], kind='stable')] # buckets are disjoint slices of `order`
+
+  with ThreadPoolExecutor(max_workers=workers) as pool:
+    list(pool.map(sort, range(len(bounds) - 1)))
+  return order
+
+
+class CurveIndex:
+
+  # pylint: disable-next=too-many-positional-arguments
+  def __init__(
+    self,
+    curve: str,
+    lo: np.ndarray,
+    scale: float,
+    bits: int,
+    starts: np.ndarray,
+    stops: np.ndarray,
+    ranges: np.ndarray,
+  ) -> None:
+    """
+    blocks of consecutive rows sorted along a space-filling curve, with the key range of each block\\
+    rows are sorted within each file, so that key ranges map to one contiguous slice per file
+
+    ## Parameters
+    ```py
+    >>> curve : str
+    ```
+    `morton` or `hilbert`
+    ```py
+    >>> lo : np.ndarray
+    ```
+    (3,) corner of the grid
+    ```py
+    >>> scale : float
+    ```
+    cells per unit of length
+    ```py
+    >>> bits : int
+    ```
+    bits per coordinate
+    ```py
+    >>> starts : np.ndarray
+    ```
+    (B,) first row of each block
+    ```py
+    >>> stops : np.ndarray
+    ```
+    (B,) row after the last row of each block
+    ```py
+    >>> ranges : np.ndarray
+    ```
+    (B, 2) smallest and largest key of each block
+    """
+    self.curve = curve
+    self.lo = np.asarray(lo, dtype=np.float64)
+    self.scale = float(scale)
+    self.bits = int(bits)
+    self.starts = np.asarray(starts, dtype=np.int64)
+    self.stops = np.asarray(stops, dtype=np.int64)
+    self.ranges = np.asarray(ranges, dtype=U64).reshape(-1, 2)
+
+  def __len__(self) -> int:
+    return len(self.starts)
+
+  @classmethod
+  def grid(cls, xyz: np.ndarray, bits: int = BITS) -> tuple[np.ndarray, float]:
+    """ corner and scale of a cubic grid over the points """
+    if len(xyz) == 0:
+      return np.zeros(3), 1.
+    lo = xyz.min(axis=0)
+    extent = float((xyz.max(axis=0) - lo).max())
+    return lo, ((1 << bits) - 1) / extent if extent > 0 else 1.
+
+  @classmethod
+  # pylint: disable-next=too-many-positional-arguments
+  def sort(
+    cls,
+    xyz: np.ndarray,
+    spans: list[tuple[int, int]],
+    curve: str = 'morton',
+    bits: int = BITS,
+    block: int = 4096,
+    workers: int = None,
+  ) -> tuple[np.ndarray, 'CurveIndex']:
+    """
+    order of the rows along a space-filling curve, within each file
+
+    ## Parameters
+    ```py
+    >>> xyz : np.ndarray
+    ```
+    (N, 3) coordinates
+    ```py
+    >>> spans : list[tuple[int, int]]
+    ```
+    (start, stop) rows of each file
+    ```py
+    >>> curve : str, (optional)
+    ```
+    `morton` or `hilbert`
+    ```py
+    >>> bits : int, (optional)
+    ```
+    bits per coordinate (at most 21)
+    ```py
+    >>> block : int, (optional)
+    ```
+    rows per block
+    ```py
+    >>> workers : int, (optional)
+    ```
+    number of threads for the sort
+
+    ## Returns
+    ```py
+    tuple[np.ndarray, CurveIndex] : (N,) order of the rows, and index of the reordered rows
+    ```
+    """
+    if curve not in CURVES:
+      raise ValueError(f'unknown curve {curve!r} (expected one of {list(CURVES)})')
+    if not 0 < bits <= BITS:
+      raise ValueError(f'bits must be in 1..={BITS} (got {bits})')
+    lo, scale = cls.grid(xyz, bits)
+    keys = curve_keys(xyz, lo, scale, curve, bits)
+    order = np.arange(len(xyz))
+    for start, stop in spans:
+      order[start:stop] = start + sort_keys(keys[start:stop], workers)
+    keys = keys[order]
+    blocks = [np.arange(start, stop, block) for start, stop in spans]
+    starts = np.concatenate(blocks + [np.empty(0, np.int64)])
+    stops = np.minimum(starts + block, np.repeat([stop for _, stop in spans], [len(b) for b in blocks]))
+    ranges = np.stack((keys[starts], keys[stops - 1]), axis=1) if len(starts) else np.empty((0, 2), U64)
+    return order, cls(curve, lo, scale, bits, starts, stops, ranges)
+
+  @classmethod
+  def from_arrays(cls, arrays: dict[str, np.ndarray]) -> 'CurveIndex':
+    """ index from `to_arrays` (from the cache or a sidecar file) """
+    return cls(str(arrays['curve']), arrays['lo'], float(arrays['scale']), int(arrays['bits']),
+               arrays['starts'], arrays['stops'], arrays['ranges'])
+
+  def to_arrays(self) -> dict[str, np.ndarray]:
+    """ arrays to persist the index """
+    return {
+      'curve': np.array(self.curve),
+      'lo': self.lo,
+      'scale': np.array(self.scale),
+      'bits': np.array(self.bits),
+      'starts': self.starts,
+      'stops': self.stops,
+      'ranges': self.ranges,
+    }
+
+  def save(self, path: str) -> None:
+    """ write the index to a .npz sidecar file """
+    np.savez(path, **self.to_arrays())
+
+  def keys(self, xyz: np.ndarray) -> np.ndarray:
+    """ keys of some coordinates on the grid of the index """
+    return curve_keys(
+      np.asarray(xyz, dtype=np.float64).reshape(-1, 3), self.lo, self.scale, self.curve, self.bits)
+
+  def slices(self, kmin: int, kmax: int) -> list[slice]:
+    """
+    rows whose keys may be in [kmin, kmax], as contiguous slices (one per file at most)
+
+    ## Parameters
+    ```py
+    >>> kmin : int
+    ```
+    smallest key
+    ```py
+    >>> kmax : int
+    ```
+    largest key
+
+    ## Returns
+    ```py
+    list[slice] : slices of rows (a superset of the matching rows)
+    ```
+    """
+    hit = np.flatnonzero((self.ranges[:, 1] >= U64(kmin)) & (self.ranges[:, 0] <= U64(kmax)))
+    if len(hit) == 0:
+      return []
+    # blocks of a file are sorted by key, so hits are runs of consecutive blocks
+    cuts = np.flatnonzero((np.diff(hit) != 1) | (self.starts[hit[1:]] != self.stops[hit[:-1]])) + 1
+    runs = [(int(self.starts[run[0]]), int(self.stops[run[-1]])) for run in np.split(hit, cuts)]
+    return [slice(start, stop) for start, stop in runs if stop > start]
+
+  def box(self, lo: np.ndarray, hi: np.ndarray) -> list[slice]:
+    """
+    rows that may be within a box, as contiguous slices\\
+    z-order keys are monotonic along every axis, so the box lies between the keys of its corners
+    (hilbert keys are not, and every row is a candidate)
+    """
+    if self.curve != 'morton':
+      return self.slices(0, np.iinfo(U64).max)
+    kmin, kmax = self.keys(np.stack((lo, hi)))
+    return self.slices(int(kmin), int(kmax))
+
+  def take(self, rows: np.ndarray) -> 'CurveIndex':
+    """ index over a sorted subset of the rows (key ranges of the blocks remain valid bounds) """
+    starts = np.searchsorted(rows, self.starts)
+    stops = np.searchsorted(rows, self.stops)
+    return CurveIndex(self.curve, self.lo, self.scale, self.bits, starts, stops, self.ranges)
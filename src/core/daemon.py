@@ -0,0 +1,428 @@
+from __future__ import annotations
+
+import os
+import json
+import time
+import signal
+import socket
+import logging
+import tempfile
+import threading
+import socketserver
+from argparse import Namespace
+from collections import Counter
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any
+
+import numpy as np
+
+from .batch import save_npy
+from .cache import DownsampleCache, fingerprint
+from .config import Config
+from .loader import read_config_file, select_configs, load_rows
+from .pipeline import Pipeline
+from .rowindex import RowIndex, split_files
+from .shared import SharedArray
+from .store import PointStore
+
+from ..log.logger import init_logger, worker_logging
+
+__all__ = ['Daemon', 'DaemonClient', 'default_socket_path']
+
+
+def default_socket_path() -> str:
+  """
+  socket path from the `PCV_SOCKET` environment variable, or `pcv-<uid>.sock` in the runtime directory
+  """
+  runtime = os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir()
+  return os.environ.get('PCV_SOCKET') or os.path.join(runtime, f'pcv-{os.getuid()}.sock')
+
+
+def load_part(part: tuple[Config, int, int, RowIndex]) -> np.ndarray:
+  """ `load_rows` over a (config, start, stop, index) tuple (runs in worker processes) """
+  return load_rows(*part)
+
+
+class Daemon:
+
+  def __init__(self, args: Namespace) -> None:
+    """
+    resident process holding the points of a config file in shared memory\\
+    local clients query it over a Unix socket with one json object per line ;
+    result arrays are handed back as shared memory handles, never serialized
+
+    ## Parameters
+    ```py
+    >>> args : Namespace
+    ```
+    arguments from `serve_parser`
+    """
+    init_logger(logging.DEBUG if args.verbose else logging.INFO)
+    self.log = logging.getLogger('core.Daemon')
+    self.socket_path: str = args.socket or default_socket_path()
+    self.workers: int = (os.cpu_count() or 1) if args.workers is None else args.workers
+    if self.workers <= 0:
+      self.log.critical('Invalid value for --workers : %d (should be > 0)', self.workers)
+
+    try:
+      cfgs, raw_data = read_config_file(args.cfg)
+      self.pipeline: Pipeline = Pipeline.from_json(raw_data['pipeline']) if 'pipeline' in raw_data else None
+    except (OSError, ValueError) as e:
+      self.log.critical('%s', e)
+    cfgs, fset = select_configs(cfgs, args.only)
+    if fset:
+      self.log.warning('Omitted invalid values for --only : %s', fset)
+    self.cfgs: list[Config] = cfgs
+    self.cache: DownsampleCache = None if args.no_cache else DownsampleCache(args.cache_dir, args.cache_size)
+    self.fingerprint: str = fingerprint(cfgs)
+
+    self.store: PointStore = None             # store over the shared columns
+    self.columns: dict[str, SharedArray] = {} # shared columns (xyz, rgb, ids, fields and colors)
+    self.requests: Counter = Counter()        # requests served, per operation
+    self.clients = 0                          # connected clients
+    self.started = time.time()
+    self.__lock = threading.Lock()            # the store caches are not thread safe
+    self.__clients_lock = threading.Lock()    # handlers connect and disconnect concurrently
+
+    self.__server: socketserver.BaseServer = None
+    self.__ops: dict[str, Callable[[dict[str, Any], dict[str, SharedArray]], dict[str, Any]]] = {
+      'stats': self.__stats,
+      'columns': self.__columns,
+      'bbox': self.__bbox,
+      'ids': self.__ids,
+      'sample': self.__sample,
+      'export': self.__export,
+      'release': self.__release,
+      'shutdown': self.__shutdown,
+    }
+
+  def load(self) -> None:
+    """ parse the files in parallel, run the pipeline and move the columns to shared memory """
+    start = time.perf_counter()
+    # large files are split on their row index, so that every worker parses about as many rows
+    ranges, unknown = split_files(self.cfgs, self.workers)
+    for cfg in unknown:
+      self.log.error('Skipping unknown file: %s', cfg.file_path)
+    with ProcessPoolExecutor(max_workers=self.workers, **worker_logging()) as pool:
+      data = list(pool.map(load_part, ranges))
+    chunks = [[d for (c, *_), d in zip(ranges, data) if c is cfg] for cfg in self.cfgs]
+    chunks = [np.concatenate(c or [np.empty((0, 9))]) for c in chunks]
+    del data
+    store = PointStore.from_chunks(chunks)
+    del chunks
+    self.log.info('Parsed %s points from %d files in %.3f s', format(len(store), '_'), len(self.cfgs),
+                  time.perf_counter() - start)
+    if self.pipeline:
+      store, self.fingerprint = self.pipeline.run(store, self.cache, self.fingerprint)
+
+    arrays = {'xyz': store.xyz, 'rgb': store.rgb, 'ids': store.ids, **store.fields}
+    self.columns = {name: SharedArray.from_array(a) for name, a in arrays.items()}
+    fields = {name: self.columns[name].array for name in store.fields}
+    self.store = PointStore(self.columns['xyz'].array, self.columns['rgb'].array, self.columns['ids'].array,
+                            store.spans, fields)
+    self.store.curve = store.curve
+    if self.cache:
+      self.store.use_cache(self.cache, self.fingerprint)
+    size = sum(c.nbytes for c in self.columns.values())
+    self.log.info('Shared %s points (%.1f MiB) in %.3f s', format(len(self.store), '_'), size / 2**20,
+                  time.perf_counter() - start)
+
+  def run(self) -> int:
+    """
+    load the points and serve clients until a `shutdown` request or a signal
+
+    ## Returns
+    ```py
+    int : exit code
+    ```
+    """
+    if os.path.exists(self.socket_path):
+      try: # a socket file left by a daemon that died, or a daemon still running
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+          s.connect(self.socket_path)
+        self.log.error('A daemon is already listening on %s', self.socket_path)
+        return 1
+      except ConnectionRefusedError:
+        os.remove(self.socket_path)
+
+    self.load()
+    daemon, clients_lock = self, self.__clients_lock
+
+    class Handler(socketserver.StreamRequestHandler):
+
+      def handle(self) -> None:
+        owned: dict[str, SharedArray] = {} # results of this client, destroyed when it disconnects
+        with clients_lock:
+          daemon.clients += 1
+        try:
+          for line in self.rfile:
+            response = daemon.dispatch(line, owned)
+            self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+          pass
+        finally:
+          with clients_lock:
+            daemon.clients -= 1
+          for shared in owned.values():
+            shared.close()
+
+    class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+      daemon_threads = True
+
+    self.__server = Server(self.socket_path, Handler)
+    os.chmod(self.socket_path, 0o600) # local user only
+
+    # handlers can only be set from the main thread
+    if threading.current_thread() is threading.main_thread():
+      signal.signal(signal.SIGINT, lambda *_: threading.Thread(target=self.__server.shutdown).start())
+      signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=self.__server.shutdown).start())
+    self.log.info('Listening on %s 🚀', self.socket_path)
+    try:
+      self.__server.serve_forever()
+    finally:
+      self.__server.server_close()
+      os.remove(self.socket_path)
+      for shared in self.columns.values():
+        shared.close()
+      if self.cache:
+        self.cache.save_stats()
+      self.log.info('Served %d requests in %.0f s : %s', sum(self.requests.values()),
+                    time.time() - self.started, dict(self.requests))
+    return 0
+
+  def dispatch(self, line: bytes, owned: dict[str, SharedArray]) -> dict[str, Any]:
+    """
+    answer one request
+
+    ## Parameters
+    ```py
+    >>> line : bytes
+    ```
+    json request `{"op": <operation>, <parameters>...}`
+    ```py
+    >>> owned : dict[str, SharedArray]
+    ```
+    shared results of the client (released on request or on disconnection)
+
+    ## Returns
+    ```py
+    dict[str, Any] : `{"ok": true, <results>...}` or `{"ok": false, "error": <message>}`
+    ```
+    """
+    try:
+      request = json.loads(line)
+      if (op := request.pop('op', None)) not in self.__ops:
+        raise ValueError(f'unknown operation {op!r} (expected one of {sorted(self.__ops)})')
+      self.requests[op] += 1
+      start = time.perf_counter()
+      response = {'ok': True, **self.__ops[op](request, owned)}
+      self.log.debug('%s %s in %.3f s', op, request, time.perf_counter() - start)
+      return response
+    except Exception as e: # pylint: disable=broad-except
+      self.log.debug('Failed request %s : %s', line, e)
+      return {'ok': False, 'error': f'{type(e).__name__}: {e}'}
+
+  @staticmethod
+  def __share(array: np.ndarray, owned: dict[str, SharedArray]) -> dict[str, Any]:
+    shared = SharedArray.from_array(array)
+    owned[shared.shm.name] = shared
+    return shared.handle
+
+  def __colors(self, cbid: bool) -> SharedArray:
+    # colors of every point are shared once, like the other columns
+    if (name := 'colors_cbid' if cbid else 'colors') not in self.columns:
+      self.columns[name] = SharedArray.from_array(self.store.colors(cbid))
+    return self.columns[name]
+
+  def __stats(self, _: dict[str, Any], __: dict[str, SharedArray]) -> dict[str, Any]:
+    xyz = self.store.xyz
+    return {
+      'points': len(self.store),
+      'files': [cfg.file_path for cfg in self.cfgs],
+      'spans': self.store.spans,
+      'fingerprint': self.fingerprint,
+      'bounds': [xyz.min(axis=0).tolist(), xyz.max(axis=0).tolist()] if len(xyz) else None,
+      'ids': int(len(np.unique(self.store.ids[self.store.ids >= 0]))),
+      'fields': sorted(self.store.fields),
+      'shared_bytes': sum(c.nbytes for c in self.columns.values()),
+      'clients': self.clients,
+      'requests': dict(self.requests),
+      'uptime': time.time() - self.started,
+    }
+
+  def __columns(self, _: dict[str, Any], __: dict[str, SharedArray]) -> dict[str, Any]:
+    names = ['xyz', 'rgb', 'ids', *self.store.fields]
+    columns = {name: self.columns[name].handle for name in names}
+    return {
+      'columns': columns,
+      'spans': self.store.spans,
+      'fingerprint': self.fingerprint,
+    }
+
+  def __bbox(self, request: dict[str, Any], owned: dict[str, SharedArray]) -> dict[str, Any]:
+    # `null` components are unbounded
+    lo = np.array([-np.inf if v is None else v for v in request.get('min', [None] * 3)], dtype=np.float64)
+    hi = np.array([np.inf if v is None else v for v in request.get('max', [None] * 3)], dtype=np.float64)
+    rows = self.store.crop(lo, hi)
+    return {'rows': self.__share(rows, owned), 'count': len(rows)}
+
+  def __ids(self, request: dict[str, Any], owned: dict[str, SharedArray]) -> dict[str, Any]:
+    rows = np.flatnonzero(np.isin(self.store.ids, np.asarray(request['ids'], dtype=np.float64)))
+    return {'rows': self.__share(rows, owned), 'count': len(rows)}
+
+  def __view(self, request: dict[str, Any]) -> tuple[np.ndarray, np.ndarray]:
+    frac, voxel_size, cbid = request.get('frac'), request.get('voxel_size'), bool(request.get('cbid', False))
+    if frac and (frac <= 0 or frac > 1):
+      raise ValueError(f'invalid frac : {frac} (should be > 0 and <= 1)')
+    if voxel_size is not None and voxel_size <= 0:
+      raise ValueError(f'invalid voxel_size : {voxel_size} (should be > 0)')
+    with self.__lock:
+      return self.store.view(frac, voxel_size, cbid)
+
+  def __sample(self, request: dict[str, Any], owned: dict[str, SharedArray]) -> dict[str, Any]:
+    xyz, rgb = self.__view(request)
+    if xyz is self.store.xyz: # no reduction, hand the columns themselves
+      with self.__lock:
+        colors = self.__colors(bool(request.get('cbid', False)))
+      return {'xyz': self.columns['xyz'].handle, 'rgb': colors.handle, 'count': len(xyz)}
+    return {'xyz': self.__share(xyz, owned), 'rgb': self.__share(rgb, owned), 'count': len(xyz)}
+
+  def __export(self, request: dict[str, Any], _: dict[str, SharedArray]) -> dict[str, Any]:
+    path = os.path.abspath(request['path']) # relative to the daemon working directory
+    xyz, rgb = self.__view(request)
+    size = save_npy(path, np.concatenate((xyz, rgb), axis=1))
+    self.log.info('Exported %s points to %s', format(len(xyz), '_'), path)
+    return {'path': path, 'points': len(xyz), 'bytes': size}
+
+  def __release(self, request: dict[str, Any], owned: dict[str, SharedArray]) -> dict[str, Any]:
+    if (shared := owned.pop(request['name'], None)) is not None:
+      shared.close()
+    return {'released': shared is not None}
+
+  def __shutdown(self, _: dict[str, Any], __: dict[str, SharedArray]) -> dict[str, Any]:
+    threading.Thread(target=self.__server.shutdown).start() # not from the thread serving this request
+    return {}
+
+
+class DaemonClient:
+
+  def __init__(self, path: str = None, timeout: float = None) -> None:
+    """
+    connection to a running daemon\\
+    arrays returned by the queries are read-only views on the daemon shared memory ;
+    results of queries stay valid until released or until the connection is closed
+
+    ## Parameters
+    ```py
+    >>> path : str, (optional)
+    ```
+    socket path (see `default_socket_path`)
+    ```py
+    >>> timeout : float, (optional)
+    ```
+    timeout of every request, in seconds
+    """
+    self.path = path or default_socket_path()
+    self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    self.sock.settimeout(timeout)
+    self.sock.connect(self.path)
+    self.__file = self.sock.makefile('rwb')
+    self.__attached: list[SharedArray] = []
+
+  def __enter__(self) -> 'DaemonClient':
+    return self
+
+  def __exit__(self, *_: Any) -> None:
+    self.close()
+
+  def request(self, op: str, **params: Any) -> dict[str, Any]:
+    """
+    send a request and wait for the answer
+
+    ## Parameters
+    ```py
+    >>> op : str
+    ```
+    operation (`stats`, `columns`, `bbox`, `ids`, `sample`, `export`, `release` or `shutdown`)
+    ```py
+    >>> params : Any
+    ```
+    parameters of the operation
+
+    ## Returns
+    ```py
+    dict[str, Any] : answer of the daemon
+    ```
+
+    ## Raises
+    ```py
+    RuntimeError : if the daemon could not answer the request
+    ```
+    """
+    self.__file.write(json.dumps({'op': op, **params}).encode('utf-8') + b'\n')
+    self.__file.flush()
+    if not (line := self.__file.readline()):
+      raise RuntimeError(f'Connection to {self.path} closed by the daemon')
+    response = json.loads(line)
+    if not response.pop('ok'):
+      raise RuntimeError(f'Request {op} failed : {response["error"]}')
+    return response
+
+  def array(self, handle: dict[str, Any]) -> np.ndarray:
+    """ read-only view on a shared array of the daemon """
+    shared = SharedArray.attach(handle)
+    self.__attached.append(shared)
+    return shared.array
+
+  def stats(self) -> dict[str, Any]:
+    return self.request('stats')
+
+  def store(self) -> tuple[PointStore, str]:
+    """
+    store over the daemon columns, without any copy
+
+    ## Returns
+    ```py
+    tuple[PointStore, str] : points and their fingerprint
+    ```
+    """
+    response = self.request('columns')
+    columns = {name: self.array(handle) for name, handle in response['columns'].items()}
+    xyz, rgb, ids = columns.pop('xyz'), columns.pop('rgb'), columns.pop('ids')
+    spans = [tuple(span) for span in response['spans']]
+    return PointStore(xyz, rgb, ids, spans, columns), response['fingerprint']
+
+  def bbox(self, lo: list[float | None], hi: list[float | None]) -> np.ndarray:
+    """ rows of the points within the box (`None` components are unbounded) """
+    return self.array(self.request('bbox', min=list(lo), max=list(hi))['rows'])
+
+  def ids(self, ids: list[int]) -> np.ndarray:
+    """ rows of the points with one of the ids """
+    return self.array(self.request('ids', ids=[int(i) for i in ids])['rows'])
+
+  def sample(self,
+             frac: float = None,
+             voxel_size: float = None,
+             cbid: bool = False) -> tuple[np.ndarray, np.ndarray]:
+    """ coordinates and colors to render for a given reduction (see `PointStore.view`) """
+    response = self.request('sample', frac=frac, voxel_size=voxel_size, cbid=cbid)
+    return self.array(response['xyz']), self.array(response['rgb'])
+
+  def export(self,
+             path: str,
+             frac: float = None,
+             voxel_size: float = None,
+             cbid: bool = False) -> dict[str, Any]:
+    """ have the daemon write a reduction to a .npy file """
+    return self.request('export', path=os.path.abspath(path), frac=frac, voxel_size=voxel_size, cbid=cbid)
+
+  def close(self) -> None:
+    for shared in self.__attached:
+      shared.close()
+    self.__attached.clear()
+    try:
+      self.__file.close()
+    finally:
+      self.sock.close()
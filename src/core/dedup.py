@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+import os
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any
+
+import numpy as np
+
+from .shared import SharedArray
+from .voxel import pack_keys
+
+from ..log.logger import worker_logging
+
+__all__ = ['POLICIES', 'quantize', 'partition', 'dedup_rows', 'deduplicate']
+
+POLICIES = ('first', 'max_id', 'avg_color')
+PARALLEL_MIN_POINTS = 1 << 20 # smaller inputs are deduplicated in this process
+
+log = logging.getLogger('pipeline')
+
+
+def quantize(xyz: np.ndarray, tolerance: float) -> np.ndarray:
+  """ (N, 3) int64 cells of side `tolerance` (points in the same cell are duplicates) """
+  return np.floor(xyz/tolerance + .5).astype(np.int64)
+
+
+def partition(ijk: np.ndarray, parts: int) -> tuple[np.ndarray, np.ndarray]:
+  """
+  hash partitioning of the cells, so that duplicates always land in the same partition
+
+  ## Parameters
+  ```py
+  >>> ijk : np.ndarray
+  ```
+  (N, 3) int64 cells
+  ```py
+  >>> parts : int
+  ```
+  number of partitions
+
+  ## Returns
+  ```py
+  tuple[np.ndarray, np.ndarray] : (N,) rows grouped by partition (in increasing order within each partition)
+  and (parts + 1,) bounds of the partitions in these rows
+  ```
+  """
+  u = ijk.view(np.uint64) if ijk.flags.c_contiguous else np.ascontiguousarray(ijk).view(np.uint64)
+  h = u[:, 0] * np.uint64(0x9E3779B97F4A7C15) ^ u[:, 1] * np.uint64(0xC2B2AE3D27D4EB4F) \
+    ^ u[:, 2] * np.uint64(0x165667B19E3779F9)
+  h ^= h >> np.uint64(29) # the low bits mix every coordinate
+  part = (h % np.uint64(parts)).astype(np.uint16 if parts <= 2**16 else np.int64)
+  rows = np.argsort(part, kind='stable')
+  bounds = np.concatenate(([0], np.cumsum(np.bincount(part, minlength=parts))))
+  return rows, bounds
+
+
+def dedup_rows(ijk: np.ndarray, rows: np.ndarray, ids: np.ndarray, rgb: np.ndarray,
+               policy: str) -> tuple[np.ndarray, np.ndarray | None]:
+  """
+  one row per cell, chosen by a policy
+
+  ## Parameters
+  ```py
+  >>> ijk : np.ndarray
+  ```
+  (N, 3) cells of the rows
+  ```py
+  >>> rows : np.ndarray
+  ```
+  (N,) increasing row numbers (lower rows come from earlier files)
+  ```py
+  >>> ids : np.ndarray
+  ```
+  (N,) ids of the rows
+  ```py
+  >>> rgb : np.ndarray
+  ```
+  (N, 3) colors of the rows (negative if missing)
+  ```py
+  >>> policy : str
+  ```
+  `first` keeps the first row, `max_id` the row with the highest id (then the first one),
+  and `avg_color` the first row with the mean color of the colored rows of the cell
+
+  ## Returns
+  ```py
+  tuple[np.ndarray, np.ndarray | None] : kept rows, and their colors with `avg_color`
+  ```
+  """
+  if len(rows) == 0:
+    return rows, np.empty((0, 3)) if policy == 'avg_color' else None
+  # one int64 key per cell, or every coordinate when the extent is too large for that
+  keys = pack_keys(ijk)
+  keys = ijk[:, ::-1].T if keys.dtype.names else keys[None]
+  # sorts are stable and rows are increasing, so ties keep the first row
+  order = np.lexsort((-ids, *keys)) if policy == 'max_id' else np.lexsort(keys)
+  sorted_keys = keys[:, order]
+  starts = np.empty(len(order), dtype=bool)
+  starts[0] = True
+  starts[1:] = (sorted_keys[:, 1:] != sorted_keys[:, :-1]).any(axis=0)
+  starts = np.flatnonzero(starts)
+  kept = rows[order[starts]]
+  if policy != 'avg_color':
+    return kept, None
+  colored = (rgb >= 0).all(axis=1)[order]
+  sums = np.add.reduceat(np.where(colored[:, None], rgb[order], 0.), starts)
+  counts = np.add.reduceat(colored.astype(np.int64), starts)
+  colors = np.where(counts[:, None] > 0, sums / np.maximum(counts, 1)[:, None], rgb[order[starts]])
+  return kept, colors
+
+
+def dedup_partitions(handles: dict[str, dict[str, Any]], bounds: list[tuple[int, int]], policy: str) -> int:
+  """ deduplicate some partitions from the shared columns (runs in worker processes) """
+  arrays = {
+    k: SharedArray.attach(h, writable=k in {'keep', 'rgb'}, inherited=True) for k, h in handles.items()
+  }
+  kept = 0
+  try:
+    for start, stop in bounds:
+      rows = np.array(arrays['rows'].array[start:stop])
+      keep, colors = dedup_rows(arrays['ijk'].array[rows], rows, arrays['ids'].array[rows],
+                                arrays['rgb'].array[rows], policy)
+      arrays['keep'].array[keep] = True
+      if colors is not None:
+        arrays['rgb'].array[keep] = colors
+      kept += len(keep)
+  finally:
+    for shared in arrays.values():
+      shared.close()
+  return kept
+
+
+# pylint: disable-next=too-many-positional-arguments
+def deduplicate(xyz: np.ndarray,
+                ids: np.ndarray,
+                rgb: np.ndarray,
+                tolerance: float,
+                policy: str = 'first',
+                processes: int = None) -> tuple[np.ndarray, np.ndarray | None]:
+  """
+  remove the points falling in the same cell of side `tolerance` as another point\\
+  cells are hash partitioned and the partitions deduplicated by a pool of processes
+
+  ## Parameters
+  ```py
+  >>> xyz : np.ndarray
+  ```
+  (N, 3) coordinates
+  ```py
+  >>> ids : np.ndarray
+  ```
+  (N,) ids
+  ```py
+  >>> rgb : np.ndarray
+  ```
+  (N, 3) colors (negative if missing)
+  ```py
+  >>> tolerance : float
+  ```
+  side of the cells
+  ```py
+  >>> policy : str, (optional)
+  ```
+  which point of a cell is kept (see `dedup_rows`)
+  ```py
+  >>> processes : int, (optional)
+  ```
+  number of worker processes (default: number of cores)
+
+  ## Returns
+  ```py
+  tuple[np.ndarray, np.ndarray | None] : (N,) mask of the kept points, and (N, 3) colors with `avg_color`
+  ```
+  """
+  if policy not in POLICIES:
+    raise ValueError(f'unknown dedup policy {policy!r} (expected one of {list(POLICIES)})')
+  processes = processes or os.cpu_count() or 1
+  ijk = quantize(xyz, tolerance)
+  keep = np.zeros(len(xyz), dtype=bool)
+  if processes <= 1 or len(xyz) < PARALLEL_MIN_POINTS:
+    rows, colors = dedup_rows(ijk, np.arange(len(xyz)), ids, rgb, policy)
+    keep[rows] = True
+    if colors is None:
+      return keep, None
+    out = np.array(rgb, dtype=np.float64)
+    out[rows] = colors
+    return keep, out
+
+  # a few partitions per process, so that an unlucky partition does not hold the others
+  rows, bounds = partition(ijk, 4 * processes)
+  columns = {'ijk': ijk, 'rows': rows, 'ids': ids, 'rgb': rgb, 'keep': keep}
+  shared = {k: SharedArray.from_array(v) for k, v in columns.items()}
+  try:
+    handles = {k: s.handle for k, s in shared.items()}
+    spans = list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+    shares = [spans[i::processes] for i in range(processes)]
+    with ProcessPoolExecutor(max_workers=processes, **worker_logging()) as pool:
+      kept = sum(pool.map(dedup_partitions, [handles] * processes, shares, [policy] * processes))
+    log.debug('Deduplicated %s points over %d partitions with %d processes, %s kept', format(len(xyz), '_'),
+              len(spans), processes, format(kept, '_'))
+    keep = shared['keep'].array.copy()
+    return keep, shared['rgb'].array.copy() if policy == 'avg_color' else None
+  finally:
+    for s in shared.values():
+      s.close()
@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+import os
+import json
+import shutil
+import logging
+
+import numpy as np
+
+from .batch import save_npy
+
+__all__ = ['Journal']
+
+JOURNAL_VERSION = 2
+SUFFIX = '.parts'         # checkpoint directory next to the output
+CHECKPOINT_ROWS = 1 << 22 # rows of a file gathered before they are checkpointed (288 MiB of points)
+
+
+class Journal:
+
+  def __init__(self, directory: str, key: str, every: int = CHECKPOINT_ROWS) -> None:
+    """
+    checkpoints of an ingestion, so that an interrupted conversion continues where it stopped\\
+    parsed rows of each file are written as .npy parts (atomically) in a directory next to the output,
+    and every part (then the end of each file) is appended to a journal, synced to disk,
+    so that a crash at any point leaves the journal describing only complete parts
+
+    ## Parameters
+    ```py
+    >>> directory : str
+    ```
+    checkpoint directory (see `Journal.open`)
+    ```py
+    >>> key : str
+    ```
+    fingerprint of the inputs (a journal is only resumed for the same inputs)
+    ```py
+    >>> every : int, (optional)
+    ```
+    rows of a file gathered before being checkpointed
+    """
+    self.log = logging.getLogger('journal')
+    self.directory = directory
+    self.key = key
+    self.every = every
+    self.parts: dict[int, list[tuple[int, int, str]]] = {} # file -> checkpointed (start, stop, part) in order
+    self.finished: set[int] = set()                        # files parsed to the end
+    self.__pending: dict[int, list[np.ndarray]] = {}       # parsed chunks not checkpointed yet
+
+  @staticmethod
+  def directory_of(save: str) -> str:
+    return os.path.splitext(save)[0] + SUFFIX
+
+  @property
+  def path(self) -> str:
+    return os.path.join(self.directory, 'journal.jsonl')
+
+  @classmethod
+  def open(cls, save: str, key: str, resume: bool = False, every: int = CHECKPOINT_ROWS) -> 'Journal':
+    """
+    journal of the conversion to an output file
+
+    ## Parameters
+    ```py
+    >>> save : str
+    ```
+    output path
+    ```py
+    >>> key : str
+    ```
+    fingerprint of the inputs
+    ```py
+    >>> resume : bool, (optional)
+    ```
+    continue from the checkpoints of an interrupted run (otherwise they are discarded)
+    ```py
+    >>> every : int, (optional)
+    ```
+    rows of a file gathered before being checkpointed
+
+    ## Returns
+    ```py
+    Journal : journal, with the checkpoints to resume from
+    ```
+
+    ## Raises
+    ```py
+    ValueError : if resuming a journal written for other inputs, or if the directory is not a journal
+    ```
+    """
+    journal = cls(cls.directory_of(save), key, every)
+    if resume and os.path.isfile(journal.path):
+      cls.__replay(journal)
+    else:
+      if resume:
+        journal.log.warning('No checkpoint to resume from in %s, starting over', journal.directory)
+      if os.path.exists(journal.directory):
+        # only the checkpoints of a previous run are discarded, never an unrelated directory
+        if not os.path.isfile(journal.path):
+          raise ValueError(
+            f'{journal.directory} exists but holds no journal, move it or choose another --save')
+        shutil.rmtree(journal.directory)
+      os.makedirs(journal.directory)
+      journal.__write({'version': JOURNAL_VERSION, 'key': key})
+    return journal
+
+  def __replay(self) -> None:
+    with open(self.path, 'r', encoding='utf-8') as f:
+      lines = f.read().splitlines()
+    try:
+      header = json.loads(lines[0])
+    except (IndexError, json.JSONDecodeError) as e:
+      raise ValueError(f'Invalid journal {self.path} : no header') from e
+    if header.get('version') != JOURNAL_VERSION or header.get('key') != self.key:
+      raise ValueError(f'Journal {self.path} was written for other input files (or they changed since), '
+                       'run again without --resume to start over')
+    # files with a missing part, parsed again after their last valid part
+    broken: set[int] = set()
+    for line in lines[1:]:
+      try:
+        entry = json.loads(line)
+      except json.JSONDecodeError:
+        # a truncated last line, the part it described is redone
+        break
+      if (i := entry['file']) in broken:
+        continue
+      if 'done' in entry:
+        self.finished.add(i)
+        continue
+      parts = self.parts.setdefault(i, [])
+      contiguous = entry['start'] == (parts[-1][1] if parts else 0)
+      if contiguous and os.path.isfile(os.path.join(self.directory, entry['part'])):
+        parts.append((entry['start'], entry['stop'], entry['part']))
+      else:
+        broken.add(i)
+
+  def __write(self, entry: dict) -> None:
+    # appended then synced : the entry is on disk before the parsing goes on
+    with open(self.path, 'a', encoding='utf-8') as f:
+      f.write(json.dumps(entry) + '\n')
+      f.flush()
+      os.fsync(f.fileno())
+
+  def start(self, file: int) -> int | None:
+    """ first row of a file left to parse, None if the whole file was parsed """
+    if file in self.finished:
+      return None
+    parts = self.parts.get(file)
+    return parts[-1][1] if parts else 0
+
+  def rows(self) -> int:
+    """ checkpointed rows, over every file """
+    return sum(stop - start for parts in self.parts.values() for start, stop, _ in parts)
+
+  def load(self, file: int) -> list[np.ndarray]:
+    """ (n, 9) checkpointed points of a file, in row order """
+    return [np.load(os.path.join(self.directory, part)) for _, _, part in self.parts.get(file, [])]
+
+  def add(self, file: int, data: np.ndarray) -> None:
+    """ parsed points of a file, following the previous ones (checkpointed once there are enough) """
+    pending = self.__pending.setdefault(file, [])
+    pending.append(data)
+    if sum(map(len, pending)) >= self.every: # pylint: disable=bad-builtin
+      self.__checkpoint(file)
+
+  def finish(self, file: int) -> None:
+    """ checkpoint the last points of a file and mark it as parsed """
+    self.__checkpoint(file)
+    self.__write({'file': file, 'done': True})
+    self.finished.add(file)
+
+  def flush(self) -> None:
+    """ checkpoint every parsed point (before stopping) """
+    for file in list(self.__pending):
+      self.__checkpoint(file)
+
+  def __checkpoint(self, file: int) -> None:
+    if not (pending := self.__pending.pop(file, [])):
+      return
+    start = self.start(file) or 0
+    data = np.concatenate(pending)
+    part = f'{file:05d}-{start:012d}.npy'
+    save_npy(os.path.join(self.directory, part), data)
+    self.__write({'file': file, 'start': start, 'stop': start + len(data), 'part': part})
+    self.parts.setdefault(file, []).append((start, start + len(data), part))
+
+  def remove(self) -> None:
+    """ discard the checkpoints (once the output is written) """
+    shutil.rmtree(self.directory, ignore_errors=True)
@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from open3d import geometry
+
+from .buffer import RenderBuffer
+from .point import Point
+from .store import PointStore
+from .voxel import VoxelGrid
+
+__all__ = ['LAYER_KINDS', 'Layer', 'LayerSet']
+
+LAYER_KINDS = ('file', 'id')
+
+
+@dataclass
+class Layer:
+  name: str                         # file name or class id
+  rows: slice | np.ndarray          # rows of the store (a slice for files, sorted rows for ids)
+  color: tuple[float, float, float] # flat color of the layer
+  visible: bool = True              # part of the scene
+  flat: bool = False                # painted with its flat color instead of the colors of its points
+  shown: bool = False               # added to the visualizer
+  pc: geometry.PointCloud = field(default_factory=geometry.PointCloud)
+  buffer: RenderBuffer = None       # arrays backing the geometry
+
+  def __len__(self) -> int:
+    return 0 if self.buffer is None else len(self.buffer)
+
+
+class LayerSet:
+
+  def __init__(self,
+               store: PointStore,
+               kind: str = 'file',
+               names: list[str] = None,
+               workers: int = None) -> None:
+    """
+    one geometry per file (span of the store) or per class id, over rows of a shared store\\
+    layers are reduced and colored independently, in parallel, so that one of them can be hidden,
+    recolored or singled out without touching the others
+
+    ## Parameters
+    ```py
+    >>> store : PointStore
+    ```
+    points of every layer
+    ```py
+    >>> kind : str, (optional)
+    ```
+    `file` (one layer per span) or `id` (one layer per class id)
+    ```py
+    >>> names : list[str], (optional)
+    ```
+    names of the files, one per span (default: their index)
+    ```py
+    >>> workers : int, (optional)
+    ```
+    threads building the layers (default: one per cpu)
+
+    ## Raises
+    ```py
+    ValueError : if the kind is unknown
+    ```
+    """
+    if kind not in LAYER_KINDS:
+      raise ValueError(f'unknown layer kind {kind!r} (should be one of {", ".join(LAYER_KINDS)})')
+    self.store = store
+    self.kind = kind
+    self.workers = workers or os.cpu_count() or 1
+    self.selected = 0
+    self.layers: list[Layer] = []
+    self.__colors: np.ndarray = None  # colors of the store, for the last build
+    self.__voxel_size: float = None
+    self.__sampled: np.ndarray = None # sampled rows of the store, for the last build
+    if kind == 'file':
+      names = names or [f'file #{i}' for i in range(len(store.spans))]
+      for i, (name, (start, stop)) in enumerate(zip(names, store.spans)):
+        self.layers.append(Layer(name, slice(start, stop), Point.srcg(i + 1)))
+    else:
+      order = np.argsort(store.ids, kind='stable')
+      ids, counts = np.unique(store.ids[order], return_counts=True)
+      for cid, rows in zip(ids.tolist(), np.split(order, np.cumsum(counts)[:-1])):
+        self.layers.append(Layer(f'id {cid:g}', rows, Point.srcg(cid)))
+
+  def __len__(self) -> int:
+    return len(self.layers)
+
+  def __getitem__(self, index: int) -> Layer:
+    return self.layers[index]
+
+  def build(self, frac: float = None, voxel_size: float = None, cbid: bool = False) -> None:
+    """
+    (re)build the arrays of every layer, in parallel
+
+    ## Parameters
+    ```py
+    >>> frac : float, (optional)
+    ```
+    random fraction of points to keep (the same points as for the whole store)
+    ```py
+    >>> voxel_size : float, (optional)
+    ```
+    voxel size for downsampling, per layer
+    ```py
+    >>> cbid : bool, (optional)
+    ```
+    force color by id
+    """
+    # shared arrays are computed once, before the threads read them
+    self.__colors = self.store.colors(cbid)
+    self.__voxel_size = voxel_size
+    self.__sampled = None
+    if frac and frac < 1 and not voxel_size:
+      self.__sampled = np.zeros(len(self.store), dtype=bool)
+      self.__sampled[self.store.sample(frac)] = True
+    with ThreadPoolExecutor(max_workers=self.workers) as pool:
+      arrays = list(pool.map(self.__arrays, self.layers))
+    for layer, (xyz, rgb) in zip(self.layers, arrays):
+      self.__write(layer, xyz, rgb)
+
+  def __arrays(self, layer: Layer) -> tuple[np.ndarray, np.ndarray]:
+    # coordinates and colors of a layer with the reduction of the last build
+    rows = layer.rows
+    if self.__sampled is not None and isinstance(rows, slice):
+      rows = rows.start + np.flatnonzero(self.__sampled[rows])
+    elif self.__sampled is not None:
+      rows = rows[self.__sampled[rows]]
+    xyz, rgb = self.store.xyz[rows], self.__colors[rows]
+    if self.__voxel_size:
+      grid = VoxelGrid.from_xyz(xyz, self.__voxel_size)
+      xyz, rgb = grid.xyz, grid.reduce(rgb)
+    if layer.flat:
+      rgb = np.broadcast_to(layer.color, xyz.shape)
+    return xyz, rgb
+
+  def __write(self, layer: Layer, xyz: np.ndarray, rgb: np.ndarray) -> None:
+    if layer.buffer is None:
+      layer.buffer = RenderBuffer(xyz, rgb)
+      layer.buffer.attach(layer.pc)
+    else:
+      layer.buffer.update(layer.pc, xyz, rgb)
+
+  def select(self, step: int) -> Layer:
+    """ select the next (or previous) layer """
+    self.selected = (self.selected + step) % len(self)
+    return self.layers[self.selected]
+
+  def recolor(self, layer: Layer) -> None:
+    """ switch a layer between its flat color and the colors of its points (the other layers are untouched) """
+    layer.flat = not layer.flat
+    self.__write(layer, *self.__arrays(layer))
+
+  def solo(self, layer: Layer) -> list[Layer]:
+    """
+    show only one layer, or every layer again if it is the only one shown
+
+    ## Returns
+    ```py
+    list[Layer] : layers whose visibility changed
+    ```
+    """
+    alone = layer.visible and not any(other.visible for other in self.layers if other is not layer)
+    changed = [other for other in self.layers if other.visible != (alone or other is layer)]
+    for other in changed:
+      other.visible = not other.visible
+    return changed
+
+  def to_array(self) -> np.ndarray:
+    """ (N, 6) points of every visible layer (x, y, z, r, g, b), as saved in .npy files """
+    arrays = [layer.buffer.to_array() for layer in self.layers if layer.visible and layer.buffer is not None]
+    return np.concatenate(arrays) if arrays else np.empty((0, 6))
@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+import os
+import math
+import logging
+from collections.abc import Iterator
+from typing import Any
+
+import numpy as np
+import pyjson5
+
+from .config import Config
+from .point import PointFactory
+from .rowindex import RowIndex
+
+__all__ = ['read_config_file', 'select_configs', 'iter_chunks', 'load_file', 'load_rows']
+
+
+def read_config_file(path: str) -> tuple[list[Config], dict[str, Any]]:
+  """
+  load a json config file and create the configs
+
+  ## Parameters
+  ```py
+  >>> path : str
+  ```
+  path to the json config file
+
+  ## Returns
+  ```py
+  tuple[list[Config], dict[str, Any]] : configs and the whole decoded document
+  ```
+
+  ## Raises
+  ```py
+  ValueError : if the file could not be parsed
+  ```
+  """
+  raw_data = None
+  with open(path, 'r', encoding='utf-8') as f:
+    try:
+      raw_data = pyjson5.decode_io(f, 4, some=False)         # pylint: disable=no-member
+    except pyjson5.Json5DecoderException as e:               # pylint: disable=no-member
+      raise ValueError('Failed to parse json config file : '
+                       f'maximum nesting level could be reached, please check your file\n{e}') from e
+  if not raw_data:
+    raise ValueError(f'Failed to parse {path} : empty file')
+  try:
+    default: dict[str, Any] = raw_data['default']
+    configs: list[dict[str, Any]] = raw_data['configs']
+  except KeyError as e:
+    raise ValueError(f'Failed to parse {path} : {e}') from e
+  cfgs: list[Config] = []
+  try:
+    for cfg in configs:
+      cfgs.append(Config.from_json(json=cfg, **default))
+  except (TypeError, ValueError) as e:
+    raise ValueError(f'Failed to parse config n°{len(cfgs)} : {e}') from e
+  return cfgs, raw_data
+
+
+def select_configs(cfgs: list[Config], only: set[int] | None) -> tuple[list[Config], list[int]]:
+  """
+  apply a `--only` selection to a list of configs
+
+  ## Parameters
+  ```py
+  >>> cfgs : list[Config]
+  ```
+  configs, in file order
+  ```py
+  >>> only : set[int] | None
+  ```
+  1-based indices of the configs to keep, `None` to keep them all
+
+  ## Returns
+  ```py
+  tuple[list[Config], list[int]] : selected configs and omitted (out of range) indices
+  ```
+  """
+  if not only:
+    return cfgs, []
+  fset = sorted(filter(lambda x: x > len(cfgs), only))
+  return [cfgs[i - 1] for i in sorted(set(only) - set(fset))], fset
+
+
+def iter_chunks(cfg: Config,
+                rows: int = 65_536,
+                start: int = 0,
+                stop: int = None,
+                index: RowIndex = None) -> Iterator[np.ndarray]:
+  """
+  parse the lines of a file into arrays of at most `rows` points, with the config offset applied
+
+  ## Parameters
+  ```py
+  >>> cfg : Config
+  ```
+  config of the file
+  ```py
+  >>> rows : int, (optional)
+  ```
+  maximum number of points per array
+  ```py
+  >>> start : int, (optional)
+  ```
+  first row to parse (the file is entered at the closest indexed offset)
+  ```py
+  >>> stop : int, (optional)
+  ```
+  row after the last one to parse (default: until the end of the file)
+  ```py
+  >>> index : RowIndex, (optional)
+  ```
+  row index of the file, when starting after the first row (default: `RowIndex.get`)
+
+  ## Yields
+  ```py
+  np.ndarray : (n, 9) float64 array of points (x, y, z, r, g, b, id, t, i)
+  ```
+
+  ## Raises
+  ```py
+  FileNotFoundError : if the file does not exist
+  ValueError : if a line could not be parsed
+  ```
+  """
+
+  def to_array(points: list) -> np.ndarray:
+    data = np.asarray(points, dtype=np.float64).reshape(-1, 9)
+    data[:, :3] += cfg.source_xyz
+    return data
+
+  points, first, skip = [], 1, int(cfg.skip_first_line)
+  with open(cfg.file_path, 'r', encoding='utf-8') as f:
+    if start > 0:
+      index = index or RowIndex.get(cfg)
+      if start >= len(index):
+        return
+      offset, skip = index.locate(start)
+      # byte offsets are valid positions of utf-8 text files
+      f.seek(offset)
+      first = start - skip + 1 + int(cfg.skip_first_line)
+    left = math.inf if stop is None else stop - start
+    factory = PointFactory(cfg.pattern) # just so that the fmt is not being parsed at every line
+    for n, line in enumerate(f, start=first):
+      if skip > 0:
+        skip -= 1
+        continue
+      if left <= 0:
+        break
+      left -= 1
+      try:
+        points.append(factory(line))
+      except Exception as e:
+        raise ValueError(f'Failed to parse line: {line} ({cfg.file_path}:{n})\n{e}') from e
+      if len(points) == rows:
+        yield to_array(points)
+        points = []
+  if points:
+    yield to_array(points)
+
+
+def load_file(cfg: Config) -> np.ndarray:
+  """
+  parse every line of a file into points, with the config offset applied
+
+  ## Parameters
+  ```py
+  >>> cfg : Config
+  ```
+  config of the file
+
+  ## Returns
+  ```py
+  np.ndarray : (N, 9) float64 array of points (x, y, z, r, g, b, id, t, i)
+  ```
+
+  ## Raises
+  ```py
+  FileNotFoundError : if the file does not exist
+  ValueError : if a line could not be parsed
+  ```
+  """
+  log = logging.getLogger('loader')
+  log.debug('Loading file: …/%s', os.path.basename(cfg.file_path))
+  log.debug('Offset: %s', cfg.source_xyz)
+  chunks = list(iter_chunks(cfg))
+  data = np.concatenate(chunks) if chunks else np.empty((0, 9))
+  log.debug('Loaded %s points from file: …/%s', format(len(data), '_'), os.path.basename(cfg.file_path))
+  return data
+
+
+def load_rows(cfg: Config, start: int, stop: int, index: RowIndex = None) -> np.ndarray:
+  """
+  parse some rows of a file (random access through the row index of the file)
+
+  ## Parameters
+  ```py
+  >>> cfg : Config
+  ```
+  config of the file
+  ```py
+  >>> start : int
+  ```
+  first row
+  ```py
+  >>> stop : int
+  ```
+  row after the last one
+  ```py
+  >>> index : RowIndex, (optional)
+  ```
+  row index of the file (default: `RowIndex.get`)
+
+  ## Returns
+  ```py
+  np.ndarray : (stop - start, 9) float64 array of points (less at the end of the file)
+  ```
+  """
+  chunks = list(iter_chunks(cfg, start=start, stop=stop, index=index))
+  return np.concatenate(chunks) if chunks else np.empty((0, 9))
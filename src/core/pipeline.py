@@ -0,0 +1,385 @@
+from __future__ import annotations
+
+import abc
+import json
+import math
+import numbers
+import time
+import hashlib
+import logging
+from dataclasses import dataclass, asdict
+from typing import Any, ClassVar
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from .cache import DownsampleCache
+from .cluster import cluster_points
+from .curve import BITS, CURVES, CurveIndex
+from .dedup import POLICIES, deduplicate
+from .spatial import TileGrid, run_tiled
+from .store import PointStore
+
+__all__ = [
+  'Pipeline', 'Deduplication', 'Reorder', 'StatisticalOutlierRemoval', 'RadiusOutlierRemoval',
+  'NormalEstimation', 'Clustering'
+]
+
+
+def knn_halo(xyz: np.ndarray, k: int) -> float:
+  """
+  halo width that should hold the k nearest neighbours of most points\\
+  (estimated from the mean xy density, points that need more are evaluated globally anyway)
+  """
+  if len(xyz) == 0:
+    return 1.
+  extent = xyz[:, :2].max(axis=0) - xyz[:, :2].min(axis=0)
+  spacing = math.sqrt(max(float(extent[0] * extent[1]), 1e-12) / len(xyz))
+  return 2 * spacing * math.sqrt(k + 1)
+
+
+def check_count(stage: str, param: str, value: Any) -> None:
+  """ raise a ValueError unless the parameter of a stage is an integer >= 1 """
+  if isinstance(value, bool) or not isinstance(value, numbers.Integral) or value < 1:
+    raise ValueError(f'{stage} {param} must be an integer >= 1 (got {value!r})')
+
+
+def check_length(stage: str, param: str, value: Any, optional: bool = False) -> None:
+  """ raise a ValueError unless the parameter of a stage is a finite number > 0 (or None if optional) """
+  if value is None and optional:
+    return
+  if isinstance(value, bool) or not isinstance(value, numbers.Real) or not 0 < value < math.inf:
+    raise ValueError(f'{stage} {param} must be a number > 0 (got {value!r})')
+
+
+@dataclass
+class Stage(abc.ABC):
+  name: ClassVar[str] = ''
+
+  @abc.abstractmethod
+  def compute(self, store: PointStore, tiles: TileGrid, workers: int | None) -> dict[str, np.ndarray]:
+    """
+    compute the stage outputs (cacheable arrays)
+
+    ## Parameters
+    ```py
+    >>> store : PointStore
+    ```
+    input points
+    ```py
+    >>> tiles : TileGrid
+    ```
+    tiling of the points
+    ```py
+    >>> workers : int | None
+    ```
+    number of threads
+
+    ## Returns
+    ```py
+    dict[str, np.ndarray] : named outputs
+    ```
+    """
+
+  def apply(self, store: PointStore, outputs: dict[str, np.ndarray]) -> PointStore:
+    """ new store from the stage outputs (filter stages keep the rows flagged in `keep`) """
+    return store.take(np.unpackbits(outputs['keep'], count=len(store)).astype(bool))
+
+  def describe(self, before: PointStore, after: PointStore) -> str:
+    return f'removed {format(len(before) - len(after), "_")} points'
+
+  def params(self) -> dict[str, Any]:
+    return {'stage': self.name, **asdict(self)}
+
+
+@dataclass
+class Deduplication(Stage):
+  name: ClassVar[str] = 'dedup'
+  tolerance: float = .001 # points in the same cell of this side are duplicates
+  policy: str = 'first'   # first (file wins), max_id or avg_color
+
+  def __post_init__(self):
+    if self.tolerance <= 0:
+      raise ValueError(f'dedup tolerance must be > 0 (got {self.tolerance})')
+    if self.policy not in POLICIES:
+      raise ValueError(f'unknown dedup policy {self.policy!r} (expected one of {list(POLICIES)})')
+
+  def compute(self, store: PointStore, tiles: TileGrid, workers: int | None) -> dict[str, np.ndarray]:
+    # cells are hash partitioned over processes, the tiles are not needed
+    keep, rgb = deduplicate(store.xyz, store.ids, store.rgb, self.tolerance, self.policy, workers)
+    outputs = {'keep': np.packbits(keep)}
+    if rgb is not None:
+      outputs['rgb'] = rgb[keep]
+    return outputs
+
+  def apply(self, store: PointStore, outputs: dict[str, np.ndarray]) -> PointStore:
+    store = super().apply(store, outputs)
+    return store.with_columns(rgb=outputs['rgb']) if 'rgb' in outputs else store
+
+  def describe(self, before: PointStore, after: PointStore) -> str:
+    lost = [(b1-b0) - (a1-a0) for (b0, b1), (a0, a1) in zip(before.spans, after.spans)]
+    files = ', '.join(f'#{i}: {format(n, "_")}' for i, n in enumerate(lost))
+    return f'removed {format(len(before) - len(after), "_")} duplicates (per file {files})'
+
+
+@dataclass
+class Reorder(Stage):
+  name: ClassVar[str] = 'reorder'
+  curve: str = 'morton' # morton or hilbert
+  bits: int = BITS      # bits per coordinate
+  block: int = 4096     # rows per block of the index
+
+  def __post_init__(self):
+    if self.curve not in CURVES:
+      raise ValueError(f'unknown curve {self.curve!r} (expected one of {list(CURVES)})')
+    if self.block <= 0:
+      raise ValueError(f'reorder block must be > 0 (got {self.block})')
+
+  def compute(self, store: PointStore, tiles: TileGrid, workers: int | None) -> dict[str, np.ndarray]:
+    order, index = CurveIndex.sort(store.xyz, store.spans, self.curve, self.bits, self.block, workers)
+    return {'order': order, **index.to_arrays()}
+
+  def apply(self, store: PointStore, outputs: dict[str, np.ndarray]) -> PointStore:
+    # rows move within their file, the spans do not change
+    order = outputs['order']
+    fields = {k: v[order] for k, v in store.fields.items()}
+    sorted_store = PointStore(store.xyz[order], store.rgb[order], store.ids[order], store.spans, fields)
+    sorted_store.curve = CurveIndex.from_arrays(outputs)
+    return sorted_store
+
+  def describe(self, before: PointStore, after: PointStore) -> str:
+    return f'sorted {format(len(after), "_")} points along a {self.curve} curve ({len(after.curve)} blocks)'
+
+
+@dataclass
+class StatisticalOutlierRemoval(Stage):
+  name: ClassVar[str] = 'statistical_outlier'
+  nb_neighbors: int = 20 # neighbours used for the mean distance of each point
+  std_ratio: float = 2.  # points farther than mean + std_ratio * std are removed
+  halo: float | None = None
+
+  def __post_init__(self):
+    check_count(self.name, 'nb_neighbors', self.nb_neighbors)
+    if isinstance(self.std_ratio, bool) or not isinstance(self.std_ratio, numbers.Real):
+      raise ValueError(f'{self.name} std_ratio must be a number (got {self.std_ratio!r})')
+    check_length(self.name, 'halo', self.halo, optional=True)
+
+  def compute(self, store: PointStore, tiles: TileGrid, workers: int | None) -> dict[str, np.ndarray]:
+    if len(store) <= self.nb_neighbors:
+      return {'keep': np.packbits(np.ones(len(store), dtype=bool))}
+
+    def func(tree: cKDTree, query: np.ndarray) -> tuple[dict[str, np.ndarray], np.ndarray]:
+      d, _ = tree.query(query, k=self.nb_neighbors + 1) # the point itself comes first
+      return {'mean': d[:, 1:].mean(axis=1)}, d[:, -1]
+
+    mean = run_tiled(store.xyz, func, self.halo or knn_halo(store.xyz, self.nb_neighbors), tiles,
+                     workers)['mean']
+    return {'keep': np.packbits(mean <= mean.mean() + self.std_ratio * mean.std(ddof=1))}
+
+
+@dataclass
+class RadiusOutlierRemoval(Stage):
+  name: ClassVar[str] = 'radius_outlier'
+  nb_points: int = 16 # points with less neighbours (themselves included) within radius are removed
+  radius: float = 1.
+
+  def __post_init__(self):
+    check_count(self.name, 'nb_points', self.nb_points)
+    check_length(self.name, 'radius', self.radius)
+
+  def compute(self, store: PointStore, tiles: TileGrid, workers: int | None) -> dict[str, np.ndarray]:
+    if len(store) == 0:
+      return {'keep': np.packbits(np.ones(0, dtype=bool))}
+
+    def func(tree: cKDTree, query: np.ndarray) -> tuple[dict[str, np.ndarray], np.ndarray]:
+      counts = tree.query_ball_point(query, self.radius, return_length=True)
+      return {'counts': counts}, np.full(len(query), self.radius)
+
+    counts = run_tiled(store.xyz, func, self.radius * (1+1e-9), tiles, workers)['counts']
+    return {'keep': np.packbits(counts >= self.nb_points)}
+
+
+@dataclass
+class NormalEstimation(Stage):
+  name: ClassVar[str] = 'normals'
+  knn: int = 30               # neighbours used to fit a plane
+  radius: float | None = None # optional maximum distance of the neighbours
+  halo: float | None = None
+
+  def __post_init__(self):
+    check_count(self.name, 'knn', self.knn)
+    check_length(self.name, 'radius', self.radius, optional=True)
+    check_length(self.name, 'halo', self.halo, optional=True)
+
+  def compute(self, store: PointStore, tiles: TileGrid, workers: int | None) -> dict[str, np.ndarray]:
+    if (k := min(self.knn, len(store))) < 3:
+      return {'normals': np.tile([0., 0., 1.], (len(store), 1))}
+
+    def func(tree: cKDTree, query: np.ndarray) -> tuple[dict[str, np.ndarray], np.ndarray]:
+      d, idx = tree.query(query, k=k)
+      pts = tree.data[np.minimum(idx, tree.n - 1)]
+      w = np.isfinite(d) & (d <= self.radius if self.radius else True)
+      w[:, 0] = True
+      w = w[:, :, None].astype(np.float64)
+      centered = pts - (w * pts).sum(axis=1, keepdims=True) / w.sum(axis=1, keepdims=True)
+      cov = np.einsum('nki,nkj->nij', w * centered, centered)
+      _, vecs = np.linalg.eigh(cov)
+      normals = vecs[:, :, 0]                         # eigenvector of the smallest eigenvalue
+      normals[normals[:, 2] < 0] *= -1                # consistently oriented upwards
+      normals[w.sum(axis=1)[:, 0] < 3] = (0., 0., 1.) # not enough neighbours for a plane
+      reach = d[:, -1] if not self.radius else np.minimum(d[:, -1], self.radius)
+      return {'normals': normals}, reach
+
+    halo = self.radius * (1+1e-9) if self.radius else self.halo or knn_halo(store.xyz, k)
+    return run_tiled(store.xyz, func, halo, tiles, workers)
+
+  def apply(self, store: PointStore, outputs: dict[str, np.ndarray]) -> PointStore:
+    return store.with_columns(fields={'normals': outputs['normals']})
+
+  def describe(self, before: PointStore, after: PointStore) -> str:
+    return f'estimated {format(len(after), "_")} normals'
+
+
+@dataclass
+class Clustering(Stage):
+  name: ClassVar[str] = 'cluster'
+  voxel_size: float = .5 # points in touching voxels of this side are in the same cluster
+  min_points: int = 1    # sparser voxels are noise (no cluster)
+  min_size: int = 10     # points of smaller clusters get no id
+
+  def __post_init__(self):
+    if self.voxel_size <= 0:
+      raise ValueError(f'cluster voxel size must be > 0 (got {self.voxel_size})')
+    if self.min_points < 1 or self.min_size < 1:
+      raise ValueError(
+        f'cluster min_points and min_size must be >= 1 (got {self.min_points}, {self.min_size})')
+
+  def compute(self, store: PointStore, tiles: TileGrid, workers: int | None) -> dict[str, np.ndarray]:
+    # voxels are tiled on their own, with the side of the tiles of the points
+    ids = cluster_points(store.xyz, self.voxel_size, self.min_points, self.min_size, tiles.size, workers)
+    return {'ids': ids}
+
+  def apply(self, store: PointStore, outputs: dict[str, np.ndarray]) -> PointStore:
+    # generated ids replace the ones of the files, and color the points without rgb (or all with --cbid)
+    return store.with_columns(ids=outputs['ids'].astype(np.float64))
+
+  def describe(self, before: PointStore, after: PointStore) -> str:
+    noise = int(np.count_nonzero(after.ids < 0))
+    clusters = int(after.ids.max()) if len(after) else 0
+    return f'found {format(max(clusters, 0), "_")} clusters ({format(noise, "_")} points in none)'
+
+
+STAGES: dict[str, type[Stage]] = {
+  s.name: s for s in (Deduplication, Reorder, StatisticalOutlierRemoval, RadiusOutlierRemoval,
+                      NormalEstimation, Clustering)
+}
+
+
+class Pipeline:
+
+  def __init__(self, stages: list[Stage], tile_size: float = None, workers: int = None) -> None:
+    """
+    processing stages run in order between parsing and rendering
+
+    ## Parameters
+    ```py
+    >>> stages : list[Stage]
+    ```
+    stages to run
+    ```py
+    >>> tile_size : float, (optional)
+    ```
+    side of the xy tiles processed in parallel (default: about 200k points per tile)
+    ```py
+    >>> workers : int, (optional)
+    ```
+    number of threads, or of processes for `dedup` (default: number of cores)
+    """
+    self.log = logging.getLogger('pipeline')
+    self.stages = stages
+    self.tile_size = tile_size
+    self.workers = workers
+
+  def __len__(self) -> int:
+    return len(self.stages)
+
+  @classmethod
+  def from_json(cls, json: list[dict[str, Any]] | dict[str, Any]) -> 'Pipeline': # pylint: disable=redefined-outer-name
+    """
+    create a Pipeline from the `pipeline` entry of a config file
+
+    ## Parameters
+    ```py
+    >>> json : list[dict[str, Any]] | dict[str, Any]
+    ```
+    either a list of stages, or `{"stages": [...], "tile_size": ..., "workers": ...}`\\
+    each stage is `{"stage": <name>, <parameters>...}` with name in
+    `dedup`, `reorder`, `statistical_outlier`, `radius_outlier`, `normals` and `cluster`
+
+    ## Returns
+    ```py
+    Pipeline : new pipeline
+    ```
+
+    ## Raises
+    ```py
+    ValueError : unknown stage or invalid parameters
+    ```
+    """
+    opts = {'stages': json} if isinstance(json, list) else dict(json)
+    stages: list[Stage] = []
+    for entry in opts.pop('stages', []):
+      entry = dict(entry)
+      if (name := entry.pop('stage', None)) not in STAGES:
+        raise ValueError(f'unknown pipeline stage {name!r} (expected one of {sorted(STAGES)})')
+      try:
+        stages.append(STAGES[name](**entry))
+      except TypeError as e:
+        raise ValueError(f'invalid parameters for pipeline stage {name!r} : {e}') from e
+    try:
+      return cls(stages, **opts)
+    except TypeError as e:
+      raise ValueError(f'invalid pipeline options : {e}') from e
+
+  def run(self,
+          store: PointStore,
+          cache: DownsampleCache = None,
+          key: str = None) -> tuple[PointStore, str | None]:
+    """
+    run every stage, reusing cached stage outputs when possible
+
+    ## Parameters
+    ```py
+    >>> store : PointStore
+    ```
+    input points
+    ```py
+    >>> cache : DownsampleCache, (optional)
+    ```
+    on-disk cache for the stage outputs
+    ```py
+    >>> key : str, (optional)
+    ```
+    fingerprint of the inputs
+
+    ## Returns
+    ```py
+    tuple[PointStore, str | None] : processed points and the fingerprint of the processed points
+    ```
+    """
+    for stage in self.stages:
+      start = time.perf_counter()
+      if key is not None:
+        key = hashlib.sha1(json.dumps([key, stage.params()], sort_keys=True).encode('utf-8')).hexdigest()[:20]
+      outputs = cache.get(key, 'stage') if cache and key else None
+      cached = outputs is not None
+      if outputs is None:
+        tiles = TileGrid(store.xyz, self.tile_size) if self.tile_size else TileGrid.auto(store.xyz)
+        outputs = stage.compute(store, tiles, self.workers)
+        if cache and key:
+          cache.put(key, 'stage', outputs)
+      processed = stage.apply(store, outputs)
+      self.log.info('Stage %s : %s in %.3f s%s', stage.name, stage.describe(store, processed),
+                    time.perf_counter() - start, ' (cached)' if cached else '')
+      store = processed
+    return store, key
@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import os
+from collections.abc import Callable
+
+import numpy as np
+
+from .batch import atomic_write
+
+from ..version import __version__
+
+__all__ = ['ply_dtype', 'ply_header', 'write_ply']
+
+CHUNK = 1 << 20         # rows converted and written at once
+BUFFER = 1 << 24        # bytes buffered by the writer
+INT16 = (-2**15, 2**15) # ids written as shorts
+
+
+def ply_dtype(ids: np.ndarray = None, scalar: np.ndarray = None) -> np.dtype:
+  """
+  little-endian layout of a vertex\\
+  coordinates stay float64 (georeferenced coordinates do not fit a float32), colors are bytes,
+  ids are int16 when they fit (int32 otherwise) and the scalar field is float32
+
+  ## Parameters
+  ```py
+  >>> ids : np.ndarray, (optional)
+  ```
+  (N,) class ids, to write an `id` property
+  ```py
+  >>> scalar : np.ndarray, (optional)
+  ```
+  (N,) scalar field, to write a `scalar` property
+
+  ## Returns
+  ```py
+  np.dtype : structured dtype of a vertex
+  ```
+  """
+  fields = [('x', '<f8'), ('y', '<f8'), ('z', '<f8'), ('red', 'u1'), ('green', 'u1'), ('blue', 'u1')]
+  if ids is not None:
+    small = len(ids) == 0 or INT16[0] <= ids.min() and ids.max() < INT16[1]
+    fields.append(('id', '<i2' if small else '<i4'))
+  if scalar is not None:
+    fields.append(('scalar', '<f4'))
+  return np.dtype(fields)
+
+
+def ply_header(dtype: np.dtype, n: int) -> bytes:
+  """ header of a binary little-endian ply file of `n` vertices of `dtype` """
+  names = {'<f8': 'double', '<f4': 'float', '|u1': 'uchar', '<i2': 'short', '<i4': 'int'}
+  lines = [
+    'ply', 'format binary_little_endian 1.0', f'comment written by pcv {__version__}', f'element vertex {n}'
+  ]
+  lines += [f'property {names[dtype[name].str]} {name}' for name in dtype.names]
+  return ('\n'.join(lines + ['end_header']) + '\n').encode('ascii')
+
+
+# pylint: disable-next=too-many-positional-arguments
+def write_ply(path: str,
+              xyz: np.ndarray,
+              colors: np.ndarray | Callable[[int, int], np.ndarray],
+              ids: np.ndarray = None,
+              scalar: np.ndarray = None,
+              rows: int = CHUNK) -> int:
+  """
+  save points to a binary little-endian .ply file, streamed chunk by chunk\\
+  the header is written from the number of points, then every chunk of rows is converted into a
+  reused vertex buffer and written, so that no full-size array is ever built ; the file is written
+  next to the target then renamed, so that a failure never leaves a truncated file
+
+  ## Parameters
+  ```py
+  >>> path : str
+  ```
+  .ply output path (parent directories are created)
+  ```py
+  >>> xyz : np.ndarray
+  ```
+  (N, 3) coordinates
+  ```py
+  >>> colors : np.ndarray | Callable[[int, int], np.ndarray]
+  ```
+  (N, 3) colors in [0, 1], or a function of `(start, stop)` returning the colors of these rows
+  ```py
+  >>> ids : np.ndarray, (optional)
+  ```
+  (N,) class ids, written as an `id` property
+  ```py
+  >>> scalar : np.ndarray, (optional)
+  ```
+  (N,) scalar field, written as a `scalar` property
+  ```py
+  >>> rows : int, (optional)
+  ```
+  rows per chunk
+
+  ## Returns
+  ```py
+  int : size of the written file
+  ```
+  """
+  dtype = ply_dtype(ids, scalar)
+  chunk_colors = colors if callable(colors) else lambda start, stop: colors[start:stop]
+  with atomic_write(path, buffering=BUFFER) as f:
+    f.write(ply_header(dtype, len(xyz)))
+    vertices = np.empty(min(rows, len(xyz)), dtype=dtype)
+    for start in range(0, len(xyz), rows):
+      stop = min(start + rows, len(xyz))
+      chunk = vertices[:stop - start]
+      for k, axis in enumerate('xyz'):
+        chunk[axis] = xyz[start:stop, k]
+      rgb = np.rint(np.clip(chunk_colors(start, stop), 0, 1) * 255)
+      for k, channel in enumerate(('red', 'green', 'blue')):
+        chunk[channel] = rgb[:, k]
+      if ids is not None:
+        chunk['id'] = ids[start:stop]
+      if scalar is not None:
+        chunk['scalar'] = scalar[start:stop]
+      f.write(chunk.data)
+  return os.path.getsize(path)
@@ -7,7 +7,7 @@ from functools import lru_cache
 import logging
 import numpy as np
 
-__all__ = ['Point', 'PointFactory']
+__all__ = ['Point', 'PointFactory', 'get_colors']
 
 
 class SomewhatRandomColorGenerator:
@@ -57,10 +57,13 @@ class Point(np.ndarray):
     g: int = None,
     b: int = None,
     cid: int = None,
+    t: float = None,
+    i: float = None,
   ):
     """
     create a new point\\
     inherits from `np.ndarray`\\
+    (x, y, z, r, g, b, id, t, i) with -1 for missing colors and id, and nan for a missing time or scalar\\
 
     ## Caution
     When doing arithmetic operations, please make sure that `r`, `g`, `b` and `cid` of one of the points are `0`\\
@@ -76,7 +79,9 @@ class Point(np.ndarray):
     g = -1 if g is None else g
     b = -1 if b is None else b
     cid = -1 if cid is None else cid
-    obj = np.array([x, y, z, r, g, b, cid], dtype=float).view(cls)
+    t = np.nan if t is None else t
+    i = np.nan if i is None else i
+    obj = np.array([x, y, z, r, g, b, cid, t, i], dtype=float).view(cls)
     return obj
 
   @property
@@ -125,6 +130,14 @@ class Point(np.ndarray):
   def id(self) -> int:
     return self[6]
 
+  @property
+  def t(self) -> float:
+    return self[7]
+
+  @property
+  def i(self) -> float:
+    return self[8]
+
   def __repr__(self):
     return f'Point({self.x}, {self.y}, {self.z}) @ {self.id} | {self.r}, {self.g}, {self.b}'
 
@@ -168,6 +181,8 @@ class Point(np.ndarray):
     g: int = None
     b: int = None
     cid: int = None
+    t: float = None
+    i: float = None
     sx: float = None # if one is specified, all must be
     sy: float = None
     sz: float = None
@@ -200,6 +215,16 @@ class Point(np.ndarray):
     except IndexError:
       pass
 
+    try:
+      t = float(match.group('t'))
+    except IndexError:
+      pass
+
+    try:
+      i = float(match.group('i'))
+    except IndexError:
+      pass
+
     try:
       sx = float(match.group('X'))
       sy = float(match.group('Y'))
@@ -217,7 +242,7 @@ class Point(np.ndarray):
       y += sy
       z += sz
 
-    return cls(x, y, z, r, g, b, cid)
+    return cls(x, y, z, r, g, b, cid, t, i)
 
   def get_color(self, cbid: bool = False) -> tuple[float, float, float]:
     """
@@ -238,7 +263,7 @@ class Point(np.ndarray):
     """
     if cbid or all(self[3:6] < 0):
       return self.srcg(self.id)
-    r, g, b = get_maybe_rgb_color(self.r, self.g, self.b)
+    r, g, b = get_maybe_rgb_color(*(c if c >= 0 else None for c in self[3:6]))
     return r / 255., g / 255., b / 255.
 
   def get_xyz(self) -> np.ndarray:
@@ -253,6 +278,56 @@ class Point(np.ndarray):
     return self[:3]
 
 
+def get_colors(rgb: np.ndarray, ids: np.ndarray, cbid: bool = False) -> np.ndarray:
+  """
+  vectorized version of `Point.get_color` over many points at once\\
+  ids are handed to the color generator in order of first appearance,
+  so that the palette is the same as when calling `Point.get_color` point by point
+
+  ## Parameters
+  ```py
+  >>> rgb : np.ndarray
+  ```
+  (N, 3) color components as stored in points (0..=255, negative if missing)
+  ```py
+  >>> ids : np.ndarray
+  ```
+  (N,) class ids
+  ```py
+  >>> cbid : bool, (optional)
+  ```
+  if `True`, the color will be based on the id of the points
+
+  ## Returns
+  ```py
+  np.ndarray : (N, 3) contiguous float64 array of colors in range [0, 1]
+  ```
+  """
+  rgb = np.asarray(rgb, dtype=np.float64).reshape(-1, 3)
+  ids = np.asarray(ids, dtype=np.float64).ravel()
+  colors = np.empty((len(rgb), 3), dtype=np.float64)
+  has = rgb >= 0
+  by_id = np.ones(len(rgb), dtype=bool) if cbid else ~has.any(axis=1)
+
+  if by_id.any():
+    ids = ids[by_id]
+    ids = np.where(ids == 0, -1, ids) # same as `cid or -1` in the generator
+    uniq, first, inverse = np.unique(ids, return_index=True, return_inverse=True)
+    for cid in uniq[np.argsort(first)]:
+      Point.srcg(cid)
+    colors[by_id] = np.array([Point.srcg(cid) for cid in uniq])[inverse.ravel()]
+
+  if not by_id.all():
+    r, g, b = rgb[~by_id].T
+    hr, hg, hb = has[~by_id].T
+    # fill missing components the same way `get_maybe_rgb_color` does
+    colors[~by_id, 0] = np.where(hr, r, np.where(hb, b, g))
+    colors[~by_id, 1] = np.where(hg, g, np.where(hr, r, b))
+    colors[~by_id, 2] = np.where(hb, b, np.where(hg, g, r))
+    colors[~by_id] /= 255.
+  return colors
+
+
 class PointFactory:
 
   def __init__(self, fmt: str) -> None:
@@ -269,6 +344,8 @@ class PointFactory:
     - `{g}`: green value (int between 0 and 255)
     - `{b}`: blue value (int between 0 and 255)
     - `{id}`: unique identifier (int)
+    - `{t}`: time of the point, eg. gps time (float, exponent allowed)
+    - `{i}`: scalar field, eg. intensity or reflectance (float, exponent allowed)
     - `{X}`: the x coordinate of the source point (float)
     - `{Y}`: the y coordinate of the source point (float)
     - `{Z}`: the z coordinate of the source point (float)
@@ -291,6 +368,9 @@ class PointFactory:
 
     self.__fmt = self.__fmt.replace('{id}', r'(?P<id>[-+]?[0-9]+)')
 
+    self.__fmt = self.__fmt.replace('{t}', r'(?P<t>[-+]?[0-9]*\.?[0-9]+(?:[eE][-+]?[0-9]+)?)')
+    self.__fmt = self.__fmt.replace('{i}', r'(?P<i>[-+]?[0-9]*\.?[0-9]+(?:[eE][-+]?[0-9]+)?)')
+
     self.__fmt = self.__fmt.replace('{X}', r'(?P<X>[-+]?[0-9]*\.?[0-9]+)')
     self.__fmt = self.__fmt.replace('{Y}', r'(?P<Y>[-+]?[0-9]*\.?[0-9]+)')
     self.__fmt = self.__fmt.replace('{Z}', r'(?P<Z>[-+]?[0-9]*\.?[0-9]+)')
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import os
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+from .config import Config
+from .point import PointFactory
+
+__all__ = ['PreviewStats', 'preview_file']
+
+READ_SIZE = 4 << 10 # first read of every window, doubled until the window holds enough lines
+
+
+@dataclass
+class PreviewStats:
+  file_size: int  # size of the file
+  bytes_read: int # bytes actually read (resynchronization included)
+  windows: int    # windows read
+  points: int     # points parsed
+  seconds: float  # wall time
+
+  @property
+  def ratio(self) -> float:
+    """ fraction of the file that was read """
+    return self.bytes_read / self.file_size if self.file_size else 1.
+
+
+def window_offsets(size: int, windows: int, stratified: bool, rng: np.random.Generator) -> np.ndarray:
+  """ sorted byte offsets, one random offset in each of `windows` equal strata or uniformly random """
+  if stratified:
+    offsets = (np.arange(windows) + rng.random(windows)) * size / windows
+  else:
+    offsets = np.sort(rng.random(windows) * size)
+  return offsets.astype(np.int64)
+
+
+def read_window(f, offset: int, lines: int) -> tuple[int, list[bytes], int]:
+  """
+  complete lines starting at the first line boundary at or after `offset`
+
+  ## Returns
+  ```py
+  tuple[int, list[bytes], int] : position of the first line, at most `lines` lines, bytes read
+  ```
+  """
+  # starting one byte early finds a boundary exactly at `offset`
+  pos = max(offset - 1, 0)
+  f.seek(pos)
+  buf, size, total, eof = b'', READ_SIZE, 0, False
+  while not eof:
+    data = f.read(size)
+    total += len(data)
+    eof = len(data) < size
+    buf += data
+    size *= 2
+    if buf.count(b'\n') > lines + (offset > 0):
+      break
+  if offset > 0:
+    if (cut := buf.find(b'\n')) < 0:
+      return pos + len(buf), [], total
+    buf, pos = buf[cut + 1:], pos + cut + 1
+  parts = buf.split(b'\n')
+  complete = parts[:-1] + ([parts[-1]] if eof and parts[-1] else []) # the last line may lack a newline
+  return pos, complete[:lines], total
+
+
+def preview_file(cfg: Config,
+                 windows: int = 64,
+                 lines: int = 32,
+                 stratified: bool = True,
+                 seed: int = 0) -> tuple[np.ndarray, PreviewStats]:
+  """
+  parse short runs of lines at byte offsets spread over a file, with the config offset applied\\
+  each window seeks to an offset, skips to the next line boundary and parses a few lines,
+  so that the cost depends on the number of windows rather than on the size of the file
+
+  ## Parameters
+  ```py
+  >>> cfg : Config
+  ```
+  config of the file (the first line is skipped when the window starts at the beginning of the file)
+  ```py
+  >>> windows : int, (optional)
+  ```
+  number of windows
+  ```py
+  >>> lines : int, (optional)
+  ```
+  lines parsed per window
+  ```py
+  >>> stratified : bool, (optional)
+  ```
+  one random offset in each of `windows` equal parts of the file, or uniformly random offsets
+  ```py
+  >>> seed : int, (optional)
+  ```
+  seed of the offsets (the same preview is read again for an unchanged file)
+
+  ## Returns
+  ```py
+  tuple[np.ndarray, PreviewStats] : (n, 9) float64 array of points (x, y, z, r, g, b, id, t, i) and the I/O done
+  ```
+
+  ## Raises
+  ```py
+  FileNotFoundError : if the file does not exist
+  ValueError : if a line could not be parsed
+  ```
+  """
+  start = time.perf_counter()
+  size = os.path.getsize(cfg.file_path)
+  factory = PointFactory(cfg.pattern)
+  points, total, done = [], 0, 0 # `done` : end of the last window, windows never read a line twice
+  with open(cfg.file_path, 'rb') as f:
+    for offset in window_offsets(size, windows, stratified, np.random.default_rng(seed)).tolist():
+      pos, chunk, n = read_window(f, max(offset, done), lines)
+      total += n
+      if pos == 0 and cfg.skip_first_line and chunk:
+        pos, chunk = len(chunk[0]) + 1, chunk[1:]
+      for line in chunk:
+        text = line.decode('utf-8')
+        try:
+          points.append(factory(text))
+        except Exception as e:
+          raise ValueError(f'Failed to parse line: {text} ({cfg.file_path}, byte {pos})\n{e}') from e
+        pos += len(line) + 1
+      done = max(done, pos)
+  data = np.asarray(points, dtype=np.float64).reshape(-1, 9)
+  data[:, :3] += cfg.source_xyz
+  return data, PreviewStats(size, total, windows, len(data), time.perf_counter() - start)
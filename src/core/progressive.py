@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import os
+import math
+import time
+import queue
+import logging
+import threading
+from dataclasses import dataclass
+from collections.abc import Iterator
+
+import numpy as np
+
+from .config import Config
+from .loader import iter_chunks
+
+__all__ = ['Chunk', 'ChunkLoader', 'Throttle']
+
+
+@dataclass
+class Chunk:
+  index: int              # index of the file in the configs
+  data: np.ndarray | None # (n, 9) points, None once the file is done (or failed)
+  error: Exception | None = None
+
+
+class ChunkLoader:
+
+  def __init__(self,
+               cfgs: list[Config],
+               rows: int = 65_536,
+               maxsize: int = 8,
+               starts: list[int | None] = None) -> None:
+    """
+    parse files in a background thread and publish the points through a bounded queue\\
+    the loader blocks when the queue is full, so that a slow consumer bounds the memory in flight
+
+    ## Parameters
+    ```py
+    >>> cfgs : list[Config]
+    ```
+    configs of the files to parse, in order
+    ```py
+    >>> rows : int, (optional)
+    ```
+    maximum number of points per published chunk
+    ```py
+    >>> maxsize : int, (optional)
+    ```
+    maximum number of chunks waiting in the queue
+    ```py
+    >>> starts : list[int | None], (optional)
+    ```
+    first row to parse of each file, None for a file that is already parsed (default: every row)
+    """
+    self.log = logging.getLogger('loader')
+    self.cfgs = cfgs
+    self.rows = rows
+    self.starts = starts or [0] * len(cfgs)
+    self.queue: queue.Queue[Chunk] = queue.Queue(maxsize)
+    self.done = not cfgs # every chunk was consumed
+    self.__cancel = threading.Event()
+    self.__thread = threading.Thread(target=self.__run, name='pcv-loader', daemon=True)
+
+  def start(self) -> 'ChunkLoader':
+    self.__thread.start()
+    return self
+
+  def cancel(self) -> None:
+    """ stop parsing as soon as possible (chunks already queued are dropped) """
+    self.__cancel.set()
+    while self.__thread.is_alive() or not self.queue.empty():
+      try:
+        self.queue.get(timeout=.1) # unblocks a pending put, which then sees the cancellation
+      except queue.Empty:
+        pass
+
+  def __put(self, chunk: Chunk) -> bool:
+    # wait for room in the queue, but give up when cancelled
+    while not self.__cancel.is_set():
+      try:
+        self.queue.put(chunk, timeout=.1)
+        return True
+      except queue.Full:
+        continue
+    return False
+
+  def __run(self) -> None:
+    for index, (cfg, start) in enumerate(zip(self.cfgs, self.starts)):
+      error, count = None, 0
+      try:
+        for data in iter_chunks(cfg, self.rows, start) if start is not None else ():
+          count += len(data)
+          if not self.__put(Chunk(index, data)):
+            return
+        self.log.debug('Loaded %s points from file: …/%s', format(count, '_'),
+                       os.path.basename(cfg.file_path))
+      except Exception as e: # pylint: disable=broad-except
+        error = e            # reported by the consumer (which may log critical and exit)
+      if not self.__put(Chunk(index, None, error)):
+        return
+
+  def poll(self, budget: float) -> Iterator[Chunk]:
+    """
+    chunks available now, without waiting
+
+    ## Parameters
+    ```py
+    >>> budget : float
+    ```
+    maximum time spent consuming chunks, in seconds (keeps the gui responsive)
+
+    ## Yields
+    ```py
+    Chunk : published chunks, in order
+    ```
+    """
+    deadline = time.perf_counter() + budget
+    while not self.done and time.perf_counter() < deadline:
+      try:
+        chunk = self.queue.get_nowait()
+      except queue.Empty:
+        return
+      if chunk.data is None and chunk.index == len(self.cfgs) - 1:
+        self.done = True
+      yield chunk
+
+
+class Throttle:
+
+  def __init__(self, hz: float) -> None:
+    """
+    rate limiter for an action done from a loop
+
+    ## Parameters
+    ```py
+    >>> hz : float
+    ```
+    maximum number of actions per second
+    """
+    self.period = 1 / hz
+    self.__last = -math.inf
+
+  def ready(self) -> bool:
+    """ whether the action can be done now (if so, the next one is delayed by a period) """
+    now = time.perf_counter()
+    if now - self.__last < self.period:
+      return False
+    self.__last = now
+    return True
@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass, field, fields
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any
+
+import numpy as np
+
+from .config import Config
+from .loader import iter_chunks
+from .rowindex import RowIndex, split_files
+
+from ..log.logger import worker_logging
+
+__all__ = ['BANDS', 'Raster', 'part_raster', 'collect_raster']
+
+BANDS = ('count', 'z_min', 'z_max', 'z_mean', 'id') # bands of the written grids
+LIMIT = 2**30                                       # cells of a row or column on each side of 0
+
+
+def cell_keys(xy: np.ndarray, cell: float) -> np.ndarray:
+  """ sortable int64 keys of the cells of side `cell` (aligned on 0) holding some (N, 2) coordinates """
+  ij = np.floor(xy / cell)
+  if len(ij) and np.abs(ij).max() >= LIMIT:
+    raise ValueError(f'cell size {cell} is too small for the extent of the points')
+  ij = ij.astype(np.int64) + LIMIT
+  return (ij[:, 0] << 32) | ij[:, 1]
+
+
+def empty(dtype: type) -> np.ndarray:
+  return np.zeros(0, dtype=dtype)
+
+
+@dataclass
+class Raster:
+  cell: float # side of the cells
+
+  # per occupied cell, sorted by key
+  keys: np.ndarray = field(default_factory=lambda: empty(np.int64))
+  count: np.ndarray = field(default_factory=lambda: empty(np.int64))
+  z_min: np.ndarray = field(default_factory=lambda: empty(np.float64))
+  z_max: np.ndarray = field(default_factory=lambda: empty(np.float64))
+  z_sum: np.ndarray = field(default_factory=lambda: empty(np.float64))
+
+  # per (cell, class id) pair, sorted by key then id
+  label_keys: np.ndarray = field(default_factory=lambda: empty(np.int64))
+  label_ids: np.ndarray = field(default_factory=lambda: empty(np.int64))
+  label_count: np.ndarray = field(default_factory=lambda: empty(np.int64))
+
+  def __len__(self) -> int:
+    return len(self.keys)
+
+  @property
+  def points(self) -> int:
+    return int(self.count.sum())
+
+  @classmethod
+  def of(cls, data: np.ndarray, cell: float) -> 'Raster':
+    """ cells of a chunk of (n, 9) points (x, y, z, r, g, b, id, t, i), vectorized """
+    keys = cell_keys(data[:, :2], cell)
+    ones = np.ones(len(data), dtype=np.int64)
+    z = np.ascontiguousarray(data[:, 2], dtype=np.float64)
+    raster = cls(cell, keys, ones, z, z, z, keys, data[:, 6].astype(np.int64), ones)
+    return cls.__reduced(raster)
+
+  def merge(self, *others: 'Raster') -> 'Raster':
+    """
+    cells of the union of the points of several rasters\\
+    exact and independent of the order of the merges : the cells and the (cell, id) pairs of every raster
+    are concatenated and reduced at once, so that merging many small rasters costs a single sort
+
+    ## Parameters
+    ```py
+    >>> others : Raster
+    ```
+    rasters of other points, with the same cell size
+
+    ## Returns
+    ```py
+    Raster : merged raster
+    ```
+
+    ## Raises
+    ```py
+    ValueError : if the cell sizes differ
+    ```
+    """
+    rasters = [self, *others]
+    if any(r.cell != self.cell for r in others):
+      raise ValueError(f'cannot merge rasters of different cell sizes ({sorted({r.cell for r in rasters})})')
+    rasters = [r for r in rasters if len(r)]
+    if len(rasters) <= 1:
+      return rasters[0] if rasters else Raster(self.cell)
+    arrays = {f.name: np.concatenate([getattr(r, f.name) for r in rasters]) for f in fields(Raster)[1:]}
+    return self.__reduced(Raster(self.cell, **arrays))
+
+  @staticmethod
+  def __reduced(raster: 'Raster') -> 'Raster':
+    # one row per cell and per (cell, id) pair, sorted
+    if len(raster.keys) == 0:
+      return raster
+    order = np.argsort(raster.keys, kind='stable')
+    keys = raster.keys[order]
+    starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+    reduced = Raster(raster.cell, keys[starts], np.add.reduceat(raster.count[order], starts),
+                     np.minimum.reduceat(raster.z_min[order], starts),
+                     np.maximum.reduceat(raster.z_max[order], starts),
+                     np.add.reduceat(raster.z_sum[order], starts))
+    order = np.lexsort((raster.label_ids, raster.label_keys))
+    keys, ids = raster.label_keys[order], raster.label_ids[order]
+    starts = np.flatnonzero(np.concatenate(([True], (keys[1:] != keys[:-1]) | (ids[1:] != ids[:-1]))))
+    reduced.label_keys, reduced.label_ids = keys[starts], ids[starts]
+    reduced.label_count = np.add.reduceat(raster.label_count[order], starts)
+    return reduced
+
+  def modes(self) -> np.ndarray:
+    """ (M,) most frequent class id of every cell (the smallest one on ties) """
+    if len(self) == 0:
+      return empty(np.int64)
+    order = np.lexsort((self.label_ids, -self.label_count, self.label_keys))
+    keys = self.label_keys[order]
+    first = np.concatenate(([True], keys[1:] != keys[:-1]))
+    return self.label_ids[order][first]
+
+  def to_grids(self) -> tuple[np.ndarray, dict[str, Any]]:
+    """
+    dense grids of the occupied extent, north up (the first row holds the largest y)
+
+    ## Returns
+    ```py
+    np.ndarray : (5, rows, cols) float64 bands in the order of `BANDS` (count 0, nan z and id -1 if empty)
+    dict[str, Any] : georeference of the grids (top left corner, cell size, shape and gdal geotransform)
+    ```
+    """
+    i = (self.keys >> 32) - LIMIT
+    j = (self.keys & 0xFFFFFFFF) - LIMIT
+    lo_i, hi_j = (int(i.min()), int(j.max())) if len(self) else (0, -1)
+    shape = (hi_j - int(j.min()) + 1, int(i.max()) - lo_i + 1) if len(self) else (0, 0)
+    grids = np.full((len(BANDS), *shape), np.nan)
+    grids[0], grids[4] = 0, -1
+    rows, cols = hi_j - j, i - lo_i
+    bands = (self.count, self.z_min, self.z_max, self.z_sum / np.maximum(self.count, 1), self.modes())
+    for b, values in enumerate(bands):
+      grids[b, rows, cols] = values
+    x0, y0 = lo_i * self.cell, (hi_j+1) * self.cell
+    georeference = {
+      'cell_size': self.cell,
+      'origin': [x0, y0],
+      'shape': list(shape),
+      'bands': list(BANDS),
+      'geotransform': [x0, self.cell, 0., y0, 0., -self.cell],
+      'points': self.points,
+    }
+    return grids, georeference
+
+
+def part_raster(part: tuple[Config, int, int, RowIndex, float]) -> Raster:
+  """ raster of some rows of a file, streamed chunk by chunk (runs in worker processes) """
+  cfg, start, stop, index, cell = part
+  raster, pending = Raster(cell), []
+  for chunk in iter_chunks(cfg, start=start, stop=stop, index=index):
+    pending.append(Raster.of(chunk, cell))
+    # chunks are merged once they hold as many cells as the raster, so that every point is sorted a few times
+    if sum(len(r) for r in pending) >= len(raster):
+      raster, pending = raster.merge(*pending), []
+  return raster.merge(*pending)
+
+
+def collect_raster(cfgs: list[Config], cell: float, workers: int = None) -> tuple[Raster, list[Config]]:
+  """
+  raster of the points of every file, in a single pass and without keeping the points\\
+  files are split on their row index so that every worker parses about as many rows,
+  and the rasters of the parts (sparse, one row per occupied cell) are merged
+
+  ## Parameters
+  ```py
+  >>> cfgs : list[Config]
+  ```
+  configs of the files
+  ```py
+  >>> cell : float
+  ```
+  side of the cells
+  ```py
+  >>> workers : int, (optional)
+  ```
+  parsing processes (default: one per cpu)
+
+  ## Returns
+  ```py
+  tuple[Raster, list[Config]] : raster of the points, and the configs of the unknown files
+  ```
+
+  ## Raises
+  ```py
+  ValueError : if a line could not be parsed, or if the cells are too small for the extent of the points
+  ```
+  """
+  workers = workers or os.cpu_count() or 1
+  parts, unknown = split_files(cfgs, workers)
+  with ProcessPoolExecutor(max_workers=workers, **worker_logging()) as pool:
+    rasters = list(pool.map(part_raster, [(*part, cell) for part in parts]))
+  return Raster(cell).merge(*rasters), unknown
@@ -0,0 +1,246 @@
+from __future__ import annotations
+
+import os
+import hashlib
+import logging
+
+import numpy as np
+
+from .cache import default_cache_dir
+from .config import Config
+
+__all__ = ['RowIndex', 'split_files']
+
+INDEX_VERSION = 1
+SUFFIX = '.pcvi'     # sidecar file next to the indexed file (or in the cache directory)
+SCAN_SIZE = 64 << 20 # bytes scanned at once for newlines
+
+
+class RowIndex:
+
+  def __init__(self, offsets: np.ndarray, rows: int, every: int, stamp: tuple[int, int],
+               skip_first_line: bool) -> None:
+    """
+    byte offsets of every `every` rows of a text file, for random access and even splits\\
+    rows are the lines holding points (the header is not a row)
+
+    ## Parameters
+    ```py
+    >>> offsets : np.ndarray
+    ```
+    (B,) byte offset of the rows 0, `every`, 2 * `every`... (the first row of each block)
+    ```py
+    >>> rows : int
+    ```
+    number of rows of the file
+    ```py
+    >>> every : int
+    ```
+    rows per block
+    ```py
+    >>> stamp : tuple[int, int]
+    ```
+    size and modification time (ns) of the indexed file
+    ```py
+    >>> skip_first_line : bool
+    ```
+    whether the first line of the file is a header
+    """
+    self.offsets = np.asarray(offsets, dtype=np.int64)
+    self.rows = int(rows)
+    self.every = int(every)
+    self.stamp = (int(stamp[0]), int(stamp[1]))
+    self.skip_first_line = bool(skip_first_line)
+
+  def __len__(self) -> int:
+    return self.rows
+
+  @staticmethod
+  def sidecars(path: str) -> list[str]:
+    """ paths of the sidecar of a file : next to it, then in the cache directory (see `default_cache_dir`) """
+    digest = hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()[:20]
+    name = f'{os.path.basename(path)}-{digest}{SUFFIX}'
+    return [path + SUFFIX, os.path.join(default_cache_dir(), 'rowindex', name)]
+
+  @staticmethod
+  def stamp_of(path: str) -> tuple[int, int]:
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns
+
+  @classmethod
+  def build(cls, path: str, skip_first_line: bool = True, every: int = 4096) -> 'RowIndex':
+    """
+    index a file with a vectorized scan for newlines (no line is decoded)
+
+    ## Parameters
+    ```py
+    >>> path : str
+    ```
+    path of the text file
+    ```py
+    >>> skip_first_line : bool, (optional)
+    ```
+    whether the first line of the file is a header
+    ```py
+    >>> every : int, (optional)
+    ```
+    rows per block
+
+    ## Returns
+    ```py
+    RowIndex : new index
+    ```
+
+    ## Raises
+    ```py
+    FileNotFoundError : if the file does not exist
+    ```
+    """
+    stamp = cls.stamp_of(path)
+    head = int(skip_first_line)
+    # the row after the i-th newline (0-based, over the whole file) is row i + 1 - head
+    offsets = [np.zeros(1 - head, dtype=np.int64)]
+    newlines, pos, last = 0, 0, b'\n'
+    with open(path, 'rb') as f:
+      while block := f.read(SCAN_SIZE):
+        nl = np.flatnonzero(np.frombuffer(block, dtype=np.uint8) == ord('\n'))
+        rows = newlines + np.arange(1, len(nl) + 1) - head
+        offsets.append(pos + nl[(rows >= 0) & (rows % every == 0)] + 1)
+        newlines, pos, last = newlines + len(nl), pos + len(block), block[-1:]
+    lines = newlines + (last != b'\n')
+    starts = np.concatenate(offsets)
+    return cls(starts[starts < pos], max(lines - head, 0), every, stamp, skip_first_line)
+
+  @classmethod
+  def load(cls, path: str, skip_first_line: bool = True, every: int = None) -> 'RowIndex | None':
+    """ the sidecar index of a file (next to it or in the cache directory), `None` if missing or stale """
+    for sidecar in cls.sidecars(path):
+      try:
+        with np.load(sidecar) as arrays:
+          if int(arrays['version']) != INDEX_VERSION or bool(arrays['skip_first_line']) != skip_first_line:
+            continue
+          if every is not None and int(arrays['every']) != every:
+            continue
+          index = cls(arrays['offsets'], int(arrays['rows']), int(arrays['every']), tuple(arrays['stamp']),
+                      skip_first_line)
+        if index.stamp == cls.stamp_of(path):
+          return index
+      except (OSError, KeyError, ValueError):
+        continue
+    return None
+
+  @classmethod
+  def get(cls, cfg: Config, every: int = 4096) -> 'RowIndex':
+    """
+    index of the file of a config, reused from its sidecar file when still valid\\
+    (built and written next to the file otherwise, or in the cache directory when its directory is read-only)
+
+    ## Parameters
+    ```py
+    >>> cfg : Config
+    ```
+    config of the file
+    ```py
+    >>> every : int, (optional)
+    ```
+    rows per block
+
+    ## Returns
+    ```py
+    RowIndex : index of the file
+    ```
+
+    ## Raises
+    ```py
+    FileNotFoundError : if the file does not exist
+    ```
+    """
+    log = logging.getLogger('loader')
+    if (index := cls.load(cfg.file_path, cfg.skip_first_line, every)) is not None:
+      return index
+    index = cls.build(cfg.file_path, cfg.skip_first_line, every)
+    log.debug('Indexed %s rows of file: …/%s', format(len(index), '_'), os.path.basename(cfg.file_path))
+    for sidecar in cls.sidecars(cfg.file_path):
+      try:
+        os.makedirs(os.path.dirname(sidecar) or '.', exist_ok=True)
+        index.save(sidecar)
+        break
+      except OSError as e:
+        log.debug('Could not write the row index of %s to %s : %s', cfg.file_path, sidecar, e)
+    return index
+
+  def save(self, path: str) -> None:
+    """ write the index (atomically, a concurrent reader never sees a partial file) """
+    tmp = f'{path}.{os.getpid()}.tmp'
+    try:
+      with open(tmp, 'wb') as f:
+        np.savez(f,
+                 version=INDEX_VERSION,
+                 offsets=self.offsets,
+                 rows=self.rows,
+                 every=self.every,
+                 stamp=np.array(self.stamp),
+                 skip_first_line=self.skip_first_line)
+      os.replace(tmp, path)
+    finally:
+      if os.path.exists(tmp):
+        os.remove(tmp)
+
+  def blocks(self) -> list[tuple[int, int, int, int]]:
+    """ (first row, row after the last one, first byte, byte after the last one) of every block """
+    rows = np.minimum(np.arange(len(self.offsets) + 1) * self.every, self.rows).tolist()
+    stops = self.offsets[1:].tolist() + [self.stamp[0]]
+    return list(zip(rows[:-1], rows[1:], self.offsets.tolist(), stops))
+
+  def locate(self, row: int) -> tuple[int, int]:
+    """
+    where a row starts
+
+    ## Returns
+    ```py
+    tuple[int, int] : byte offset of its block, and rows to skip from there
+    ```
+    """
+    if not 0 <= row < self.rows:
+      raise IndexError(f'row {row} out of range (the file has {self.rows} rows)')
+    return int(self.offsets[row // self.every]), row % self.every
+
+  def split(self, parts: int) -> list[tuple[int, int]]:
+    """ at most `parts` (start, stop) ranges of about as many rows, aligned on blocks """
+    blocks = len(self.offsets)
+    bounds = sorted({round(i * blocks / parts) * self.every for i in range(parts)} | {self.rows})
+    bounds = [min(b, self.rows) for b in bounds]
+    return [(a, b) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+
+def split_files(cfgs: list[Config],
+                parts: int) -> tuple[list[tuple[Config, int, int, RowIndex]], list[Config]]:
+  """
+  split every file on its row index into at most `parts` ranges of about as many rows\
+  (the indexes are built and written next to the files when missing, see `RowIndex.get`)
+
+  ## Parameters
+  ```py
+  >>> cfgs : list[Config]
+  ```
+  configs of the files
+  ```py
+  >>> parts : int
+  ```
+  maximum number of ranges per file
+
+  ## Returns
+  ```py
+  list[tuple[Config, int, int, RowIndex]] : (config, start, stop, index) of every range, file by file
+  list[Config] : configs of the unknown files
+  ```
+  """
+  ranges, unknown = [], []
+  for cfg in cfgs:
+    try:
+      index = RowIndex.get(cfg)
+    except FileNotFoundError:
+      unknown.append(cfg)
+      continue
+    ranges += [(cfg, start, stop, index) for start, stop in index.split(parts)]
+  return ranges, unknown
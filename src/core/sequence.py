@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import os
+import time
+import logging
+import threading
+from dataclasses import dataclass
+from collections.abc import Callable
+
+import numpy as np
+
+from .config import Config
+
+__all__ = ['Frame', 'FrameRing']
+
+
+@dataclass
+class Frame:
+  index: int                     # index of the config
+  xyz: np.ndarray | None         # (N, 3) coordinates to render, None if the file failed
+  rgb: np.ndarray | None         # (N, 3) colors in range [0, 1]
+  seconds: float                 # time spent decoding
+  error: Exception | None = None # reported by the consumer
+
+  @property
+  def nbytes(self) -> int:
+    return 0 if self.xyz is None else self.xyz.nbytes + self.rgb.nbytes
+
+
+class FrameRing:
+
+  def __init__(self,
+               cfgs: list[Config],
+               decode: Callable[[Config], tuple[np.ndarray, np.ndarray]],
+               ahead: int = 3,
+               behind: int = 1,
+               max_bytes: int = 1 << 30) -> None:
+    """
+    decode the frames of a sequence (one config per frame) in a background thread,
+    keeping only the frames around the current position\\
+    frames are decoded nearest first, those that leave the window are dropped,
+    and frames ahead are not decoded while the resident frames exceed `max_bytes`
+
+    ## Parameters
+    ```py
+    >>> cfgs : list[Config]
+    ```
+    configs of the frames, in order (the sequence loops)
+    ```py
+    >>> decode : Callable[[Config], tuple[np.ndarray, np.ndarray]]
+    ```
+    coordinates and colors to render for a config (runs in the background thread)
+    ```py
+    >>> ahead : int, (optional)
+    ```
+    frames kept after the current one
+    ```py
+    >>> behind : int, (optional)
+    ```
+    frames kept before the current one
+    ```py
+    >>> max_bytes : int, (optional)
+    ```
+    memory of the resident frames above which nothing more is prefetched (the current frame is always decoded)
+    """
+    self.log = logging.getLogger('loader')
+    self.cfgs = cfgs
+    self.ahead = ahead
+    self.behind = behind
+    self.max_bytes = max_bytes
+    self.position = 0
+    self.frames: dict[int, Frame] = {}
+    self.hits = 0       # frames requested once already decoded
+    self.misses = 0     # frames requested before being decoded
+    self.peak_bytes = 0 # highest memory of the resident frames
+    self.__decode = decode
+    self.__closed = False
+    self.__cond = threading.Condition()
+    self.__thread = threading.Thread(target=self.__run, name='pcv-frames', daemon=True)
+
+  def __len__(self) -> int:
+    return len(self.cfgs)
+
+  @property
+  def nbytes(self) -> int:
+    """ memory of the resident frames """
+    return sum(f.nbytes for f in self.frames.values())
+
+  def start(self) -> 'FrameRing':
+    self.__thread.start()
+    return self
+
+  def close(self) -> None:
+    """ stop the background thread (a frame being decoded is finished, then dropped) """
+    with self.__cond:
+      self.__closed = True
+      self.__cond.notify_all()
+    if self.__thread.is_alive():
+      self.__thread.join()
+    self.frames.clear()
+
+  def window(self, position: int) -> list[int]:
+    """ frames to keep around a position, nearest first """
+    if not self.cfgs:
+      return []
+    offsets = [0]
+    for d in range(1, max(self.ahead, self.behind) + 1):
+      offsets += ([d] if d <= self.ahead else []) + ([-d] if d <= self.behind else [])
+    return list(dict.fromkeys((position+o) % len(self) for o in offsets))
+
+  def seek(self, position: int) -> bool:
+    """
+    move the current position (frames out of the new window are dropped right away)
+
+    ## Parameters
+    ```py
+    >>> position : int
+    ```
+    index of the frame to show next
+
+    ## Returns
+    ```py
+    bool : whether the frame was already decoded
+    ```
+    """
+    with self.__cond:
+      self.position = position % len(self)
+      keep = set(self.window(self.position))
+      for index in [i for i in self.frames if i not in keep]:
+        del self.frames[index]
+      hit = self.position in self.frames
+      self.hits += hit
+      self.misses += not hit
+      self.__cond.notify_all()
+    return hit
+
+  def get(self, index: int, timeout: float = 0.) -> Frame | None:
+    """
+    a decoded frame
+
+    ## Parameters
+    ```py
+    >>> index : int
+    ```
+    index of the frame
+    ```py
+    >>> timeout : float, (optional)
+    ```
+    maximum time to wait for the frame, in seconds (`None` waits until it is decoded)
+
+    ## Returns
+    ```py
+    Frame | None : the frame, `None` if it is not decoded yet
+    ```
+    """
+    with self.__cond:
+      self.__cond.wait_for(lambda: index in self.frames or self.__closed, timeout)
+      return self.frames.get(index)
+
+  def __missing(self) -> int | None:
+    # next frame to decode, `None` if the window is full or the memory bound is reached
+    budget = self.max_bytes - self.nbytes
+    estimate = max((f.nbytes for f in self.frames.values()), default=0)
+    for rank, index in enumerate(self.window(self.position)):
+      if index in self.frames:
+        continue
+      if rank > 0 and budget < estimate:
+        return None
+      return index
+    return None
+
+  def __run(self) -> None:
+    while True:
+      with self.__cond:
+        self.__cond.wait_for(lambda: self.__closed or self.__missing() is not None)
+        if self.__closed:
+          return
+        index = self.__missing()
+      start = time.perf_counter()
+      try:
+        xyz, rgb = self.__decode(self.cfgs[index])
+        frame = Frame(index, xyz, rgb, time.perf_counter() - start)
+        self.log.debug('Decoded frame %d (%s points) from file: …/%s in %.3f s', index, format(len(xyz), '_'),
+                       os.path.basename(self.cfgs[index].file_path), frame.seconds)
+      except Exception as e:                    # pylint: disable=broad-except
+        frame = Frame(index, None, None, time.perf_counter() - start, e)
+      with self.__cond:
+        if index in self.window(self.position): # the position may have moved meanwhile
+          self.frames[index] = frame
+          self.peak_bytes = max(self.peak_bytes, self.nbytes)
+          self.__cond.notify_all()
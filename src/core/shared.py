@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any
+
+import numpy as np
+
+__all__ = ['SharedArray']
+
+
+class SharedArray:
+
+  def __init__(self, shm: SharedMemory, shape: tuple[int, ...], dtype: np.dtype, owner: bool) -> None:
+    """
+    numpy array living in a named shared memory segment\\
+    other processes attach to it from its `handle` without any copy
+
+    ## Parameters
+    ```py
+    >>> shm : SharedMemory
+    ```
+    shared memory segment
+    ```py
+    >>> shape : tuple[int, ...]
+    ```
+    shape of the array
+    ```py
+    >>> dtype : np.dtype
+    ```
+    type of the array
+    ```py
+    >>> owner : bool
+    ```
+    whether this process created the segment (and should unlink it)
+    """
+    self.shm = shm
+    self.owner = owner
+    self.array: np.ndarray = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+  @classmethod
+  def create(cls, shape: tuple[int, ...], dtype: Any = np.float64) -> 'SharedArray':
+    """ new uninitialized shared array """
+    dtype = np.dtype(dtype)
+    nbytes = int(np.prod(shape)) * dtype.itemsize
+    return cls(SharedMemory(create=True, size=max(nbytes, 1)), tuple(shape), dtype, True)
+
+  @classmethod
+  def from_array(cls, array: np.ndarray) -> 'SharedArray':
+    """ new shared array holding a copy of `array` """
+    shared = cls.create(array.shape, array.dtype)
+    shared.array[...] = array
+    return shared
+
+  @classmethod
+  def attach(cls, handle: dict[str, Any], writable: bool = False, inherited: bool = False) -> 'SharedArray':
+    """
+    attach to a shared array created by another process
+
+    ## Parameters
+    ```py
+    >>> handle : dict[str, Any]
+    ```
+    `handle` of the shared array
+    ```py
+    >>> writable : bool, (optional)
+    ```
+    whether this process may write into the array (read-only by default)
+    ```py
+    >>> inherited : bool, (optional)
+    ```
+    whether the array was created by a parent process (e.g. for pool workers),
+    which shares the resource tracker of this process
+
+    ## Returns
+    ```py
+    SharedArray : view on the same memory
+    ```
+    """
+    shm = SharedMemory(name=handle['name'])
+    if not inherited:
+      # the creator owns the segment, do not let the resource tracker of this process unlink it at exit
+      resource_tracker.unregister(shm._name, 'shared_memory')
+    shared = cls(shm, tuple(handle['shape']), np.dtype(handle['dtype']), False)
+    shared.array.flags.writeable = writable
+    return shared
+
+  @property
+  def handle(self) -> dict[str, Any]:
+    """ json description of the array for other processes """
+    return {'name': self.shm.name, 'shape': list(self.array.shape), 'dtype': self.array.dtype.str}
+
+  @property
+  def nbytes(self) -> int:
+    return self.array.nbytes
+
+  def close(self) -> None:
+    """ detach from the segment (and destroy it if this process created it) """
+    self.array = None
+    try:
+      self.shm.close()
+    except BufferError: # views on the array are still alive, the mapping goes away with them
+      pass
+    if self.owner:
+      self.shm.unlink()
@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import math
+from typing import Any
+
+import numpy as np
+
+__all__ = ['QuantileSketch']
+
+ALPHA = .01       # relative accuracy of the quantiles
+MIN_VALUE = 1e-12 # values closer to zero are counted as zeros
+
+
+class QuantileSketch:
+
+  def __init__(self, alpha: float = ALPHA) -> None:
+    """
+    streaming quantiles of a scalar column, within a relative accuracy (a DDSketch)\\
+    values are counted in logarithmic buckets : `|v|` falls in bucket `ceil(log(|v|) / log(gamma))`
+    with `gamma = (1 + alpha) / (1 - alpha)`, so that the middle of a bucket is within `alpha` of every
+    value in it ; buckets only depend on `alpha`, so that merging two sketches is an exact sum of counts,
+    and a few thousand buckets cover any range of floats
+
+    ## Parameters
+    ```py
+    >>> alpha : float, (optional)
+    ```
+    relative accuracy of the quantiles
+    """
+    if not 0 < alpha < 1:
+      raise ValueError(f'relative accuracy must be in (0, 1) (got {alpha})')
+    self.alpha = alpha
+    self.gamma = (1+alpha) / (1-alpha)
+    self.count = 0      # values added (nan are ignored)
+    self.zeros = 0      # values counted as zeros
+    self.lo = math.inf  # exact minimum
+    self.hi = -math.inf # exact maximum
+
+    # (index of the first bucket, counts) of the positive values and of the absolute negative values
+    self.positive: tuple[int, np.ndarray] = (0, np.zeros(0, dtype=np.int64))
+    self.negative: tuple[int, np.ndarray] = (0, np.zeros(0, dtype=np.int64))
+
+  def __len__(self) -> int:
+    return self.count
+
+  @staticmethod
+  def __sum(a: tuple[int, np.ndarray], b: tuple[int, np.ndarray]) -> tuple[int, np.ndarray]:
+    if len(a[1]) == 0:
+      return b
+    if len(b[1]) == 0:
+      return a
+    first = min(a[0], b[0])
+    counts = np.zeros(max(a[0] + len(a[1]), b[0] + len(b[1])) - first, dtype=np.int64)
+    counts[a[0] - first:a[0] - first + len(a[1])] += a[1]
+    counts[b[0] - first:b[0] - first + len(b[1])] += b[1]
+    return first, counts
+
+  def __buckets(self, magnitudes: np.ndarray) -> tuple[int, np.ndarray]:
+    if len(magnitudes) == 0:
+      return 0, np.zeros(0, dtype=np.int64)
+    index = np.ceil(np.log(magnitudes) / math.log(self.gamma)).astype(np.int64)
+    first = int(index.min())
+    return first, np.bincount(index - first)
+
+  def add(self, values: np.ndarray) -> 'QuantileSketch':
+    """
+    count more values, vectorized (in place)
+
+    ## Parameters
+    ```py
+    >>> values : np.ndarray
+    ```
+    (n,) values, nan for missing ones
+
+    ## Returns
+    ```py
+    QuantileSketch : this sketch
+    ```
+    """
+    values = np.asarray(values, dtype=np.float64).ravel()
+    values = values[~np.isnan(values)]
+    if len(values) == 0:
+      return self
+    self.count += len(values)
+    self.lo, self.hi = min(self.lo, float(values.min())), max(self.hi, float(values.max()))
+    small = np.abs(values) < MIN_VALUE
+    self.zeros += int(np.count_nonzero(small))
+    self.positive = self.__sum(self.positive, self.__buckets(values[~small & (values > 0)]))
+    self.negative = self.__sum(self.negative, self.__buckets(-values[~small & (values < 0)]))
+    return self
+
+  def merge(self, other: 'QuantileSketch') -> 'QuantileSketch':
+    """
+    sketch of the values of two sketches (exact, whatever the order of the merges)
+
+    ## Parameters
+    ```py
+    >>> other : QuantileSketch
+    ```
+    sketch with the same relative accuracy
+
+    ## Returns
+    ```py
+    QuantileSketch : merged sketch
+    ```
+
+    ## Raises
+    ```py
+    ValueError : if the relative accuracies differ
+    ```
+    """
+    if other.alpha != self.alpha:
+      raise ValueError(f'cannot merge sketches of different accuracies ({self.alpha} and {other.alpha})')
+    merged = QuantileSketch(self.alpha)
+    merged.count, merged.zeros = self.count + other.count, self.zeros + other.zeros
+    merged.lo, merged.hi = min(self.lo, other.lo), max(self.hi, other.hi)
+    merged.positive = self.__sum(self.positive, other.positive)
+    merged.negative = self.__sum(self.negative, other.negative)
+    return merged
+
+  def quantiles(self, q: np.ndarray | list[float]) -> np.ndarray:
+    """
+    approximate quantiles of the values, within the relative accuracy (vectorized)
+
+    ## Parameters
+    ```py
+    >>> q : np.ndarray | list[float]
+    ```
+    quantiles in [0, 1]
+
+    ## Returns
+    ```py
+    np.ndarray : values of the quantiles, exact for 0 and 1 (nan if the sketch is empty)
+    ```
+    """
+    q = np.asarray(q, dtype=np.float64)
+    if not self.count:
+      return np.full(q.shape, np.nan)
+    # bucket middles from the lowest value to the highest one : negatives, zeros, then positives
+
+    def middle(first: int, counts: np.ndarray) -> np.ndarray:
+      return 2 * self.gamma**(first + np.arange(len(counts))) / (self.gamma + 1)
+
+    values = np.concatenate((-middle(*self.negative)[::-1], [0.], middle(*self.positive)))
+    counts = np.concatenate((self.negative[1][::-1], [self.zeros], self.positive[1]))
+    rank = np.clip(q, 0, 1) * (self.count - 1)
+    found = np.clip(values[np.searchsorted(np.cumsum(counts), rank, side='right')], self.lo, self.hi)
+    return np.where(q <= 0, self.lo, np.where(q >= 1, self.hi, found)) # the ends are known exactly
+
+  def to_json(self) -> dict[str, Any]:
+    percentiles = (0, 1, 2, 5, 25, 50, 75, 95, 98, 99, 100)
+    values = self.quantiles(np.array(percentiles) / 100)
+    return {'count': self.count, 'percentiles': {str(p): float(v) for p, v in zip(percentiles, values)}}
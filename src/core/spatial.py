@@ -0,0 +1,246 @@
+from __future__ import annotations
+
+import os
+import math
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from .voxel import group_keys, pack_keys
+
+__all__ = ['TileGrid', 'run_tiled']
+
+# compute(tree, query) -> (per query results, reach of every query)
+TileFunc = Callable[[cKDTree, np.ndarray], 'tuple[dict[str, np.ndarray], np.ndarray]']
+
+
+class TileGrid:
+
+  def __init__(self, xyz: np.ndarray, tile_size: float) -> None:
+    """
+    partition of the points into square xy tiles (full height columns)
+
+    ## Parameters
+    ```py
+    >>> xyz : np.ndarray
+    ```
+    (N, 3) coordinates
+    ```py
+    >>> tile_size : float
+    ```
+    side of the tiles
+    """
+    if tile_size <= 0:
+      raise ValueError(f'tile size must be > 0 (got {tile_size})')
+    self.xyz = xyz
+    self.size = tile_size
+    ij = np.floor(xyz[:, :2] / tile_size).astype(np.int64)
+    first, inverse = group_keys(pack_keys(np.column_stack((ij, np.zeros(len(ij), dtype=np.int64)))))
+    self.ij = ij[first]
+    self.__order = np.argsort(inverse, kind='stable')
+    self.__bounds = np.concatenate(([0], np.cumsum(np.bincount(inverse, minlength=len(first)))))
+    self.__lookup = {(int(i), int(j)): t for t, (i, j) in enumerate(self.ij)}
+
+  def __len__(self) -> int:
+    return len(self.ij)
+
+  @classmethod
+  def auto(cls, xyz: np.ndarray, points_per_tile: int = 200_000) -> 'TileGrid':
+    """
+    grid with tiles holding about `points_per_tile` points on average
+
+    ## Parameters
+    ```py
+    >>> xyz : np.ndarray
+    ```
+    (N, 3) coordinates
+    ```py
+    >>> points_per_tile : int, (optional)
+    ```
+    target number of points per tile
+
+    ## Returns
+    ```py
+    TileGrid : new grid
+    ```
+    """
+    extent = xyz[:, :2].max(axis=0) - xyz[:, :2].min(axis=0) if len(xyz) else np.ones(2)
+    area = max(float(extent[0]) * float(extent[1]), float(max(extent.max(), 1e-9))**2 * 1e-6)
+    return cls(xyz, math.sqrt(area * points_per_tile / max(len(xyz), 1)) or 1.)
+
+  def core(self, t: int) -> np.ndarray:
+    """ indices of the points of tile `t` """
+    return self.__order[self.__bounds[t]:self.__bounds[t + 1]]
+
+  def box(self, t: int) -> tuple[np.ndarray, np.ndarray]:
+    """ xy lower and upper corners of tile `t` """
+    lo = self.ij[t] * self.size
+    return lo, lo + self.size
+
+  def halo(self, t: int, width: float) -> np.ndarray:
+    """
+    indices of the points of the other tiles lying within `width` of tile `t`
+
+    ## Parameters
+    ```py
+    >>> t : int
+    ```
+    tile index
+    ```py
+    >>> width : float
+    ```
+    width of the halo around the tile
+
+    ## Returns
+    ```py
+    np.ndarray : indices of the halo points
+    ```
+    """
+    return self.__near(self.ij[t], width, own=False)
+
+  def around(self, ij: np.ndarray, width: float) -> np.ndarray:
+    """
+    indices of the points lying in the tile at `ij` or within `width` of it\
+    `ij` comes from a grid of the same tile size over other points (tiles are aligned on the origin)
+
+    ## Parameters
+    ```py
+    >>> ij : np.ndarray
+    ```
+    (2,) xy position of the tile, in tiles
+    ```py
+    >>> width : float
+    ```
+    width of the halo around the tile
+
+    ## Returns
+    ```py
+    np.ndarray : indices of the points
+    ```
+    """
+    return self.__near(ij, width, own=True)
+
+  def __near(self, ij: np.ndarray, width: float, own: bool) -> np.ndarray:
+    rings = math.ceil(width / self.size)
+    i0, j0 = (int(v) for v in ij)
+    lo = np.array([i0, j0]) * self.size
+    hi = lo + self.size
+    parts = []
+    for di in range(-rings, rings + 1):
+      for dj in range(-rings, rings + 1):
+        if (own or di or dj) and (n := self.__lookup.get((i0 + di, j0 + dj))) is not None:
+          idx = self.core(n)
+          if di or dj:
+            xy = self.xyz[idx, :2]
+            idx = idx[np.all((xy >= lo - width) & (xy < hi + width), axis=1)]
+          parts.append(idx)
+    return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+
+# pylint: disable-next=too-many-positional-arguments
+def run_tiled(
+  xyz: np.ndarray,
+  func: TileFunc,
+  halo: float,
+  tiles: TileGrid = None,
+  workers: int = None,
+  batch: int = 32_768,
+  reference: np.ndarray = None,
+) -> dict[str, np.ndarray]:
+  """
+  evaluate a neighbourhood function for every point, tile by tile in parallel\\
+  each tile builds a k-d tree over its points plus a halo of the neighbouring tiles ;
+  a point whose neighbourhood (`reach`) does not fit in the halo is evaluated again against
+  a k-d tree of the whole cloud, so that the results are the same as a global computation\\
+  with a `reference` cloud, the trees are built over the reference points of the tile and its halo instead
+
+  ## Parameters
+  ```py
+  >>> xyz : np.ndarray
+  ```
+  (N, 3) coordinates
+  ```py
+  >>> func : TileFunc
+  ```
+  `func(tree, query)` returns results for the `query` points (arrays with one row per query point)
+  and the distance up to which each query looked at the tree
+  ```py
+  >>> halo : float
+  ```
+  width of the halo around each tile
+  ```py
+  >>> tiles : TileGrid, (optional)
+  ```
+  tiling of the points (see `TileGrid.auto`)
+  ```py
+  >>> workers : int, (optional)
+  ```
+  number of threads (k-d tree queries release the GIL), defaults to the number of cores
+  ```py
+  >>> batch : int, (optional)
+  ```
+  maximum number of points queried at once, to bound the memory of each thread
+  ```py
+  >>> reference : np.ndarray, (optional)
+  ```
+  (M, 3) coordinates the neighbourhoods are looked for in (default: `xyz` itself)
+
+  ## Returns
+  ```py
+  dict[str, np.ndarray] : results for every point
+  ```
+  """
+  log = logging.getLogger('spatial')
+  tiles = tiles or TileGrid.auto(xyz)
+  # reference tiles of the same size are aligned with the query tiles
+  ref, ref_tiles = (xyz, tiles) if reference is None else (reference, TileGrid(reference, tiles.size))
+  results: dict[str, np.ndarray] = {}
+  redo: list[np.ndarray] = []
+  lock = threading.Lock()
+
+  def store(idx: np.ndarray, res: dict[str, np.ndarray]) -> None:
+    with lock:
+      for k, v in res.items():
+        if k not in results:
+          results[k] = np.empty((len(xyz),) + v.shape[1:], dtype=v.dtype)
+    for k, v in res.items():
+      results[k][idx] = v # tiles write disjoint rows
+
+  def evaluate(tree: cKDTree, query: np.ndarray) -> tuple[dict[str, np.ndarray], np.ndarray]:
+    parts = [func(tree, query[i:i + batch]) for i in range(0, len(query), batch)]
+    res = {k: np.concatenate([p[0][k] for p in parts]) for k in parts[0][0]}
+    return res, np.concatenate([p[1] for p in parts])
+
+  def process(t: int) -> None:
+    core = tiles.core(t)
+    if reference is None:
+      local = np.concatenate((core, tiles.halo(t, halo)))
+    else:
+      local = ref_tiles.around(tiles.ij[t], halo)
+    if len(local) == 0: # nothing to look for around the tile
+      redo.append(core)
+      return
+    res, reach = evaluate(cKDTree(ref[local]), xyz[core])
+    lo, hi = tiles.box(t)
+    xy = xyz[core, :2]
+    margin = np.minimum(xy - (lo-halo), (hi+halo) - xy).min(axis=1)
+    store(core, res)
+    if len(bad := core[reach >= margin]) > 0:
+      redo.append(bad)
+
+  with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+    list(pool.map(process, range(len(tiles))))
+
+  if redo:
+    bad = np.concatenate(redo)
+    log.debug('Evaluating %s points against the whole cloud (neighbourhood larger than the halo)',
+              format(len(bad), '_'))
+    res, _ = evaluate(cKDTree(ref), xyz[bad])
+    store(bad, res)
+  log.debug('Evaluated %s points over %d tiles (%s fallbacks)', format(len(xyz), '_'), len(tiles),
+            format(sum(len(r) for r in redo), '_'))
+  return results
@@ -0,0 +1,265 @@
+from __future__ import annotations
+
+import os
+import math
+from dataclasses import dataclass, field
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any
+
+import numpy as np
+
+from .config import Config
+from .loader import iter_chunks
+from .rowindex import RowIndex, split_files
+from .sketch import QuantileSketch
+
+from ..log.logger import worker_logging
+
+__all__ = ['Histogram', 'Stats', 'part_stats', 'collect_stats', 'format_table']
+
+BINS = 64            # maximum bins of a coordinate histogram
+MIN_WIDTH = 2.0**-20 # finest bin width
+SPARKS = ' ▁▂▃▄▅▆▇█'
+
+
+def fit_width(lo: float, hi: float, bins: int = BINS) -> float:
+  """ finest power of two bin width whose bins (aligned on 0) cover [lo, hi] with at most `bins` bins """
+  width = max(2.0**math.ceil(math.log2(max(hi - lo, MIN_WIDTH) / bins)), MIN_WIDTH)
+  while math.floor(hi / width) - math.floor(lo / width) >= bins:
+    width *= 2
+  while width / 2 >= MIN_WIDTH and math.floor(hi / width * 2) - math.floor(lo / width * 2) < bins:
+    width /= 2
+  return width
+
+
+@dataclass
+class Histogram:
+  width: float = 0. # bin width (a power of two)
+  first: int = 0    # index of the first bin (x // width)
+  counts: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int64))
+
+  @property
+  def edges(self) -> np.ndarray:
+    return (self.first + np.arange(len(self.counts) + 1)) * self.width
+
+  def coarsen(self, width: float) -> 'Histogram':
+    """ the same counts in bins of a larger power of two width (bins aligned on 0 nest exactly) """
+    if len(self.counts) == 0 or width == self.width:
+      return Histogram(width, self.first, self.counts)
+    shift = round(math.log2(width / self.width))
+    index = (self.first + np.arange(len(self.counts))) >> shift
+    return Histogram(width, int(index[0]),
+                     np.bincount(index - index[0], weights=self.counts).astype(np.int64))
+
+  def add(self, other: 'Histogram', width: float) -> 'Histogram':
+    """ sum of two histograms, in bins of `width` (at least as large as both widths) """
+    a, b = self.coarsen(width), other.coarsen(width)
+    if len(a.counts) == 0:
+      return b
+    if len(b.counts) == 0:
+      return a
+    first = min(a.first, b.first)
+    counts = np.zeros(max(a.first + len(a.counts), b.first + len(b.counts)) - first, dtype=np.int64)
+    counts[a.first - first:a.first - first + len(a.counts)] += a.counts
+    counts[b.first - first:b.first - first + len(b.counts)] += b.counts
+    return Histogram(width, first, counts)
+
+  @classmethod
+  def of(cls, values: np.ndarray, width: float) -> 'Histogram':
+    index = np.floor(values / width).astype(np.int64)
+    first = int(index.min())
+    return cls(width, first, np.bincount(index - first))
+
+
+@dataclass
+class Stats:
+  points: int = 0                    # parsed rows
+  colored: int = 0                   # rows with a color (no channel missing)
+  timed: int = 0                     # rows with a time
+  lo: np.ndarray = None              # x, y, z and t minimums
+  hi: np.ndarray = None              # x, y, z and t maximums
+  ids: dict[int, int] = None         # rows per class id (-1: no id)
+  histograms: list[Histogram] = None # x, y and z histograms
+  scalar: QuantileSketch = None      # quantiles of the {i} field
+
+  def __post_init__(self):
+    self.lo = np.full(4, np.inf) if self.lo is None else self.lo
+    self.hi = np.full(4, -np.inf) if self.hi is None else self.hi
+    self.ids = {} if self.ids is None else self.ids
+    self.histograms = [Histogram() for _ in range(3)] if self.histograms is None else self.histograms
+    self.scalar = QuantileSketch() if self.scalar is None else self.scalar
+
+  @classmethod
+  def of(cls, data: np.ndarray) -> 'Stats':
+    """ statistics of a chunk of (n, 9) points (x, y, z, r, g, b, id, t, i), vectorized """
+    stats = cls()
+    if len(data) == 0:
+      return stats
+    stats.points = len(data)
+    stats.colored = int(np.count_nonzero((data[:, 3:6] >= 0).all(axis=1)))
+    t = data[:, 7][~np.isnan(data[:, 7])]
+    stats.timed = len(t)
+    stats.lo[:3], stats.hi[:3] = data[:, :3].min(axis=0), data[:, :3].max(axis=0)
+    if len(t):
+      stats.lo[3], stats.hi[3] = t.min(), t.max()
+    ids, counts = np.unique(data[:, 6], return_counts=True)
+    stats.ids = dict(zip(ids.astype(np.int64).tolist(), counts.tolist()))
+    for k in range(3):
+      stats.histograms[k] = Histogram.of(data[:, k], fit_width(stats.lo[k], stats.hi[k]))
+    stats.scalar.add(data[:, 8])
+    return stats
+
+  def merge(self, other: 'Stats') -> 'Stats':
+    """
+    statistics of the union of the rows of two accumulators\\
+    exact and independent of the order of the merges : counts add up, and histograms are brought to the
+    bin width of the merged bounds, which only depends on the bounds
+
+    ## Parameters
+    ```py
+    >>> other : Stats
+    ```
+    accumulator of other rows
+
+    ## Returns
+    ```py
+    Stats : merged accumulator
+    ```
+    """
+    merged = Stats(self.points + other.points, self.colored + other.colored, self.timed + other.timed,
+                   np.minimum(self.lo, other.lo), np.maximum(self.hi, other.hi), dict(self.ids))
+    for cid, count in other.ids.items():
+      merged.ids[cid] = merged.ids.get(cid, 0) + count
+    merged.scalar = self.scalar.merge(other.scalar)
+    if merged.points:
+      for k in range(3):
+        width = fit_width(merged.lo[k], merged.hi[k])
+        merged.histograms[k] = self.histograms[k].add(other.histograms[k], width)
+    return merged
+
+  def to_json(self) -> dict[str, Any]:
+    bounds = {
+      axis: [float(self.lo[k]), float(self.hi[k])] for k, axis in enumerate('xyzt') if self.hi[k] >= self.lo[k]
+    }
+    histograms = {
+      axis: {
+        'edges': h.edges.tolist(),
+        'counts': h.counts.tolist()
+      } for axis, h in zip('xyz', self.histograms)
+    }
+    ids = {str(cid): count for cid, count in sorted(self.ids.items())}
+    return {
+      'points': self.points,
+      'colored': self.colored,
+      'timed': self.timed,
+      'bounds': bounds,
+      'ids': ids,
+      'histograms': histograms,
+      'scalar': self.scalar.to_json() if self.scalar.count else None,
+    }
+
+
+def part_stats(part: tuple[Config, int, int, RowIndex]) -> Stats:
+  """ statistics of some rows of a file, streamed chunk by chunk (runs in worker processes) """
+  cfg, start, stop, index = part
+  stats = Stats()
+  for chunk in iter_chunks(cfg, start=start, stop=stop, index=index):
+    stats = stats.merge(Stats.of(chunk))
+  return stats
+
+
+def collect_stats(cfgs: list[Config], workers: int = None) -> list[Stats | None]:
+  """
+  statistics of every file, in a single pass and without keeping the points\\
+  files are split on their row index so that every worker parses about as many rows,
+  and the statistics of the parts are merged per file
+
+  ## Parameters
+  ```py
+  >>> cfgs : list[Config]
+  ```
+  configs of the files
+  ```py
+  >>> workers : int, (optional)
+  ```
+  parsing processes (default: one per cpu)
+
+  ## Returns
+  ```py
+  list[Stats | None] : statistics of each file, None for unknown files
+  ```
+
+  ## Raises
+  ```py
+  ValueError : if a line could not be parsed
+  ```
+  """
+  workers = workers or os.cpu_count() or 1
+  ranges, unknown = split_files(cfgs, workers)
+  with ProcessPoolExecutor(max_workers=workers, **worker_logging()) as pool:
+    results = list(pool.map(part_stats, ranges))
+  merged = {id(cfg): Stats() for cfg in cfgs}
+  for (cfg, *_), part in zip(ranges, results):
+    merged[id(cfg)] = merged[id(cfg)].merge(part)
+  missing = {id(cfg) for cfg in unknown}
+  return [None if id(cfg) in missing else merged[id(cfg)] for cfg in cfgs]
+
+
+def format_table(names: list[str], stats: list[Stats | None], total: Stats) -> str:
+  """
+  per-file and total statistics as a text table, followed by the class ids and coordinate histograms
+
+  ## Parameters
+  ```py
+  >>> names : list[str]
+  ```
+  names of the files
+  ```py
+  >>> stats : list[Stats | None]
+  ```
+  statistics of each file (None for unknown files)
+  ```py
+  >>> total : Stats
+  ```
+  merged statistics
+
+  ## Returns
+  ```py
+  str : table
+  ```
+  """
+
+  def span(s: Stats, k: int) -> str:
+    return f'{s.lo[k]:.3f} .. {s.hi[k]:.3f}' if s.hi[k] >= s.lo[k] else '-'
+
+  header = ('file', 'points', 'colored', 'ids', 'x', 'y', 'z', 't')
+  rows = []
+  for name, s in list(zip(names, stats)) + [('total', total)]:
+    if s is None:
+      rows.append((name, 'unknown file', '', '', '', '', '', ''))
+      continue
+    rows.append((name, format(s.points, '_'), f'{100 * s.colored / max(s.points, 1):.1f}%', str(len(s.ids)),
+                 span(s, 0), span(s, 1), span(s, 2), span(s, 3)))
+  widths = [max(len(r[i]) for r in rows + [header]) for i in range(len(header))]
+
+  def line(r: tuple[str, ...]) -> str:
+    return '  '.join(c.ljust(w) if i == 0 else c.rjust(w) for i, (c, w) in enumerate(zip(r, widths)))
+
+  lines = [line(header), '  '.join('-' * w for w in widths)] + [line(r) for r in rows]
+
+  lines += ['', 'class ids :']
+  for cid, count in sorted(total.ids.items()):
+    lines.append(f'  {cid:>6}  {format(count, "_"):>14}  {100 * count / max(total.points, 1):6.2f}%')
+  lines += ['', 'coordinates :']
+  for axis, h in zip('xyz', total.histograms):
+    if len(h.counts):
+      levels = np.ceil(h.counts / h.counts.max() * (len(SPARKS) - 1)).astype(int)
+      lines.append(f'  {axis}  {h.edges[0]:>12.3f} {"".join(SPARKS[i] for i in levels)} {h.edges[-1]:.3f}'
+                   f'  ({h.width:g} per bin)')
+  if total.scalar.count:
+    p = dict(zip((0, 2, 50, 98, 100), total.scalar.quantiles([0, .02, .5, .98, 1])))
+    lines += [
+      '', f'scalar field ({format(total.scalar.count, "_")} values) :',
+      f'  min {p[0]:.6g}  2% {p[2]:.6g}  median {p[50]:.6g}  98% {p[98]:.6g}  max {p[100]:.6g}'
+    ]
+  return '\n'.join(lines)
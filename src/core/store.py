@@ -0,0 +1,415 @@
+from __future__ import annotations
+
+import numpy as np
+
+from .cache import DownsampleCache
+from .curve import CurveIndex
+from .point import Point, get_colors
+from .timeline import TimeIndex
+from .voxel import VoxelGrid, nesting_ratio
+
+__all__ = ['PointStore']
+
+
+class PointStore:
+
+  def __init__(
+    self,
+    xyz: np.ndarray,
+    rgb: np.ndarray,
+    ids: np.ndarray,
+    spans: list[tuple[int, int]] = None,
+    fields: dict[str, np.ndarray] = None,
+  ) -> None:
+    """
+    columnar storage of every loaded point\\
+    derived arrays (colors, random permutation, voxel grids) are computed once and cached,
+    so that changing the sampling or the coloring does not touch the files again
+
+    ## Parameters
+    ```py
+    >>> xyz : np.ndarray
+    ```
+    (N, 3) float64 coordinates (offsets already applied)
+    ```py
+    >>> rgb : np.ndarray
+    ```
+    (N, 3) float64 color components (0..=255, negative if missing)
+    ```py
+    >>> ids : np.ndarray
+    ```
+    (N,) float64 class ids (-1 if missing)
+    ```py
+    >>> spans : list[tuple[int, int]], (optional)
+    ```
+    (start, stop) rows of each loaded file
+    ```py
+    >>> fields : dict[str, np.ndarray], (optional)
+    ```
+    other named per-point columns (e.g. normals, `time` and `scalar` when the files have `{t}` and `{i}` fields)
+    """
+    self.xyz = np.ascontiguousarray(xyz, dtype=np.float64).reshape(-1, 3)
+    self.rgb = np.ascontiguousarray(rgb, dtype=np.float64).reshape(-1, 3)
+    self.ids = np.ascontiguousarray(ids, dtype=np.float64).ravel()
+    self.spans = spans if spans is not None else [(0, len(self.xyz))]
+    self.fields = fields if fields is not None else {}
+
+    self.__colors: dict[bool, np.ndarray] = {}
+    self.__permutation: np.ndarray = None
+    self.__grids: dict[float, VoxelGrid] = {}
+    self.__time: TimeIndex = None
+    self.cache: DownsampleCache = None
+    self.fingerprint: str = None
+    self.curve: CurveIndex = None # blocks of rows sorted along a space-filling curve (see the reorder stage)
+
+  def __len__(self) -> int:
+    return len(self.xyz)
+
+  @classmethod
+  def from_array(cls, data: np.ndarray, spans: list[tuple[int, int]] = None) -> 'PointStore':
+    """
+    create a PointStore from an (N, 9) array of points
+
+    ## Parameters
+    ```py
+    >>> data : np.ndarray
+    ```
+    (N, 9) array of points (x, y, z, r, g, b, id, t, i)
+    ```py
+    >>> spans : list[tuple[int, int]], (optional)
+    ```
+    (start, stop) rows of each loaded file
+
+    ## Returns
+    ```py
+    PointStore : new store
+    ```
+    """
+    data = np.asarray(data, dtype=np.float64).reshape(-1, 9)
+    # the time and scalar columns are only kept when at least one file has them
+    fields = {name: np.ascontiguousarray(data[:, k]) for name, k in (('time', 7), ('scalar', 8))}
+    fields = {name: v for name, v in fields.items() if not np.isnan(v).all()}
+    return cls(data[:, :3], data[:, 3:6], data[:, 6], spans, fields)
+
+  @classmethod
+  def from_points(cls, points: list[Point], spans: list[tuple[int, int]] = None) -> 'PointStore':
+    """
+    create a PointStore from a list of points
+
+    ## Parameters
+    ```py
+    >>> points : list[Point]
+    ```
+    list of points
+    ```py
+    >>> spans : list[tuple[int, int]], (optional)
+    ```
+    (start, stop) rows of each loaded file
+
+    ## Returns
+    ```py
+    PointStore : new store
+    ```
+    """
+    return cls.from_array(np.asarray(points, dtype=np.float64), spans)
+
+  @classmethod
+  def from_chunks(cls, chunks: list[np.ndarray]) -> 'PointStore':
+    """
+    create a PointStore from the arrays of each loaded file
+
+    ## Parameters
+    ```py
+    >>> chunks : list[np.ndarray]
+    ```
+    (N_i, 9) arrays of points, one per file
+
+    ## Returns
+    ```py
+    PointStore : new store, with one span per chunk
+    ```
+    """
+    bounds = np.cumsum([0] + [len(c) for c in chunks]).tolist()
+    data = np.concatenate(chunks) if chunks else np.empty((0, 9))
+    return cls.from_array(data, list(zip(bounds[:-1], bounds[1:])))
+
+  def take(self, rows: np.ndarray) -> 'PointStore':
+    """
+    new store with a subset of the points (spans and fields follow)
+
+    ## Parameters
+    ```py
+    >>> rows : np.ndarray
+    ```
+    boolean mask or sorted indices of the rows to keep
+
+    ## Returns
+    ```py
+    PointStore : new store, without any of the cached arrays
+    ```
+    """
+    rows = np.flatnonzero(rows) if rows.dtype == bool else rows
+    bounds = np.searchsorted(rows, [start for start, _ in self.spans] + [len(self)])
+    spans = list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+    fields = {k: v[rows] for k, v in self.fields.items()}
+    store = PointStore(self.xyz[rows], self.rgb[rows], self.ids[rows], spans, fields)
+    store.curve = self.curve.take(rows) if self.curve else None
+    return store
+
+  def with_columns(self,
+                   rgb: np.ndarray = None,
+                   fields: dict[str, np.ndarray] = None,
+                   ids: np.ndarray = None) -> 'PointStore':
+    """
+    new store over the same rows with some columns replaced
+
+    ## Parameters
+    ```py
+    >>> rgb : np.ndarray, (optional)
+    ```
+    (N, 3) new color components
+    ```py
+    >>> fields : dict[str, np.ndarray], (optional)
+    ```
+    new or replaced named columns
+    ```py
+    >>> ids : np.ndarray, (optional)
+    ```
+    (N,) new class ids
+
+    ## Returns
+    ```py
+    PointStore : new store, without any of the cached arrays
+    ```
+    """
+    rgb = self.rgb if rgb is None else rgb
+    ids = self.ids if ids is None else ids
+    store = PointStore(self.xyz, rgb, ids, self.spans, {**self.fields, **(fields or {})})
+    store.curve = self.curve
+    return store
+
+  def crop(self, lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+    """
+    rows of the points within a box (only the candidate slices of the curve index are scanned)
+
+    ## Parameters
+    ```py
+    >>> lo : np.ndarray
+    ```
+    (3,) lowest corner (-inf for unbounded)
+    ```py
+    >>> hi : np.ndarray
+    ```
+    (3,) highest corner (inf for unbounded)
+
+    ## Returns
+    ```py
+    np.ndarray : sorted rows
+    ```
+    """
+    slices = self.curve.box(lo, hi) if self.curve else [slice(0, len(self))]
+    rows = [
+      s.start + np.flatnonzero(np.all((self.xyz[s] >= lo) & (self.xyz[s] <= hi), axis=1)) for s in slices
+    ]
+    return np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+
+  def colors(self, cbid: bool = False) -> np.ndarray:
+    """
+    colors of every point (cached)
+
+    ## Parameters
+    ```py
+    >>> cbid : bool, (optional)
+    ```
+    force color by id
+
+    ## Returns
+    ```py
+    np.ndarray : (N, 3) colors in range [0, 1]
+    ```
+    """
+    if cbid not in self.__colors:
+      self.__colors[cbid] = get_colors(self.rgb, self.ids, cbid)
+    return self.__colors[cbid]
+
+  def use_cache(self, cache: DownsampleCache, key: str) -> None:
+    """
+    memoize reductions on disk
+
+    ## Parameters
+    ```py
+    >>> cache : DownsampleCache
+    ```
+    on-disk cache
+    ```py
+    >>> key : str
+    ```
+    fingerprint of the inputs the store was loaded from
+    """
+    self.cache = cache
+    self.fingerprint = key
+
+  def time_index(self) -> TimeIndex | None:
+    """
+    index of the points by time (cached, `None` if the points have no time)
+
+    ## Returns
+    ```py
+    TimeIndex | None : rows in time order
+    ```
+    """
+    if self.__time is None and (t := self.fields.get('time')) is not None:
+      if self.cache and (arrays := self.cache.get(self.fingerprint, 'time')) is not None:
+        self.__time = TimeIndex.from_arrays(t, arrays)
+      else:
+        self.__time = TimeIndex.from_times(t)
+        if self.cache and self.__time.order is not None:
+          self.cache.put(self.fingerprint, 'time', self.__time.to_arrays())
+    return self.__time
+
+  def time_window(self, start: float, end: float) -> 'PointStore':
+    """
+    new store with the points of a time window (binary searches in the time index, no scan)
+
+    ## Parameters
+    ```py
+    >>> start : float
+    ```
+    first time of the window (included)
+    ```py
+    >>> end : float
+    ```
+    end of the window (excluded)
+
+    ## Returns
+    ```py
+    PointStore : new store, without any of the cached arrays
+    ```
+
+    ## Raises
+    ```py
+    ValueError : if the points have no time
+    ```
+    """
+    if (index := self.time_index()) is None:
+      raise ValueError('the points have no time, add a {t} field to the pattern of the config file')
+    return self.take(index.window(start, end))
+
+  def sample(self, frac: float, seed: int = None) -> np.ndarray:
+    """
+    indices of a random fraction of the points\\
+    samples are prefixes of one cached random permutation,
+    so that a smaller fraction is always a subset of a larger one
+
+    ## Parameters
+    ```py
+    >>> frac : float
+    ```
+    fraction of points to keep, in ]0, 1]
+    ```py
+    >>> seed : int, (optional)
+    ```
+    seed of the permutation (only used the first time)
+
+    ## Returns
+    ```py
+    np.ndarray : indices of the sampled points
+    ```
+    """
+    if self.__permutation is None and self.cache:
+      if (arrays := self.cache.get(self.fingerprint, 'sample')) is not None:
+        self.__permutation = arrays['permutation']
+    if self.__permutation is None:
+      dtype = np.int32 if len(self) < 2**31 else np.int64
+      self.__permutation = np.random.default_rng(seed).permutation(len(self)).astype(dtype)
+      if self.cache:
+        self.cache.put(self.fingerprint, 'sample', {'permutation': self.__permutation})
+    return self.__permutation[:int(len(self) * frac)]
+
+  def voxel_grid(self, size: float) -> VoxelGrid:
+    """
+    voxel grid of the given size\\
+    looked up in memory, then in the on-disk cache, then derived from a finer grid
+    whose size divides this one, and only computed from the points as a last resort
+
+    ## Parameters
+    ```py
+    >>> size : float
+    ```
+    voxel size
+
+    ## Returns
+    ```py
+    VoxelGrid : grid over all the points
+    ```
+    """
+    if size in self.__grids:
+      return self.__grids[size]
+    name = f'voxel-{float(size).hex()}'
+    grid: VoxelGrid = None
+    if self.cache and (arrays := self.cache.get(self.fingerprint, name)) is not None:
+      grid = VoxelGrid.from_arrays(size, arrays)
+    if grid is None and (finer := self.__finer_grid(size)) is not None:
+      grid = finer.coarsen(size)
+      if self.cache:
+        self.cache.record('derived')
+        self.cache.log.debug('Derived voxel size %g from %g', size, finer.size)
+        self.cache.put(self.fingerprint, name, grid.to_arrays())
+    if grid is None:
+      grid = VoxelGrid.from_xyz(self.xyz, size)
+    self.__grids[size] = grid
+    return grid
+
+  def __finer_grid(self, size: float) -> VoxelGrid | None:
+    # coarsest known grid that nests into `size`, in memory first then on disk
+    if sizes := [s for s in self.__grids if nesting_ratio(s, size)]:
+      return self.__grids[max(sizes)]
+    if not self.cache:
+      return None
+    sizes = [float.fromhex(n[len('voxel-'):]) for n in self.cache.names(self.fingerprint, 'voxel-')]
+    for s in sorted(filter(lambda s: nesting_ratio(s, size), sizes), reverse=True):
+      if (arrays := self.cache.get(self.fingerprint, f'voxel-{s.hex()}')) is not None:
+        return self.__grids.setdefault(s, VoxelGrid.from_arrays(s, arrays))
+    return None
+
+  def view(self,
+           frac: float = None,
+           voxel_size: float = None,
+           cbid: bool = False) -> tuple[np.ndarray, np.ndarray]:
+    """
+    coordinates and colors to render for a given reduction
+
+    ## Parameters
+    ```py
+    >>> frac : float, (optional)
+    ```
+    random fraction of points to keep
+    ```py
+    >>> voxel_size : float, (optional)
+    ```
+    voxel size for downsampling (colors are averaged over each voxel)
+    ```py
+    >>> cbid : bool, (optional)
+    ```
+    force color by id
+
+    ## Returns
+    ```py
+    tuple[np.ndarray, np.ndarray] : (N, 3) coordinates and (N, 3) colors
+    ```
+    """
+    if voxel_size:
+      grid = self.voxel_grid(voxel_size)
+      if (name := 'rgb_id' if cbid else 'rgb') not in grid.values:
+        if grid.inverse is None: # loaded or derived without the point mapping, bin the points again
+          grid = VoxelGrid.from_xyz(self.xyz, voxel_size)
+          grid.values.update(self.__grids[voxel_size].values)
+          self.__grids[voxel_size] = grid
+        grid.values[name] = grid.reduce(self.colors(cbid))
+        if self.cache:
+          self.cache.put(self.fingerprint, f'voxel-{float(voxel_size).hex()}', grid.to_arrays())
+      return grid.xyz, grid.values[name]
+    if frac and frac < 1:
+      idx = self.sample(frac)
+      return self.xyz[idx], self.colors(cbid)[idx]
+    return self.xyz, self.colors(cbid)
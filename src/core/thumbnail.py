@@ -0,0 +1,245 @@
+from __future__ import annotations
+
+import os
+import math
+import zlib
+import struct
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+__all__ = ['Camera', 'VIEWS', 'PointRenderer', 'write_png', 'write_thumbnails']
+
+EMPTY = np.iinfo(np.uint64).max # z-buffer of a pixel without points
+DEPTH_BITS = 32                 # depth in the high bits of the z-buffer keys, the packed color in the low 24 bits
+CHUNK = 1 << 20                 # points projected at once by a thread
+MAX_POINTS = 1 << 22            # points drawn (16 per pixel of a 512 x 512 thumbnail)
+
+
+@dataclass
+class Camera:
+  azimuth: float = 0.      # degrees, around the z axis (0: looking towards +y)
+  elevation: float = 90.   # degrees above the horizon (90: looking down)
+  fov: float | None = None # vertical field of view in degrees, None for an orthographic camera
+
+  def axes(self) -> np.ndarray:
+    """ (3, 3) right, up and forward unit vectors of the camera (forward points away from the viewer) """
+    az, el = math.radians(self.azimuth), math.radians(self.elevation)
+    forward = np.array([-math.cos(el) * math.sin(az), math.cos(el) * math.cos(az), -math.sin(el)])
+    right = np.array([math.cos(az), math.sin(az), 0.])
+    return np.stack((right, np.cross(right, forward), forward))
+
+
+VIEWS = {
+  'top': Camera(0, 90),
+  'side': Camera(0, 0),
+  'iso': Camera(45, math.degrees(math.atan(1 / math.sqrt(2)))),
+}
+
+
+class PointRenderer:
+
+  def __init__(self,
+               xyz: np.ndarray,
+               rgb: np.ndarray,
+               max_points: int = MAX_POINTS,
+               workers: int = None) -> None:
+    """
+    software rendering of points, one pixel each, without any gpu\\
+    points are centered, converted to float32 and their colors packed in 24 bits once for every view ;
+    a view is projected in chunks by a pool of threads, each one keeping its own z-buffer of packed
+    (depth, color) keys updated with a scatter-min, so that the nearest point of a pixel wins whatever
+    the order of the points, and the z-buffers are merged with a per-pixel minimum
+
+    ## Parameters
+    ```py
+    >>> xyz : np.ndarray
+    ```
+    (N, 3) coordinates
+    ```py
+    >>> rgb : np.ndarray
+    ```
+    (N, 3) colors in [0, 1]
+    ```py
+    >>> max_points : int, (optional)
+    ```
+    points drawn, evenly strided over larger clouds
+    ```py
+    >>> workers : int, (optional)
+    ```
+    threads projecting the points (default: one per cpu)
+    """
+    step = max(-(-len(xyz) // max_points), 1)
+    xyz, rgb = xyz[::step], rgb[::step]
+    self.workers = workers or os.cpu_count() or 1
+    self.xyz = np.empty((len(xyz), 3), dtype=np.float32)
+    self.colors = np.empty(len(xyz), dtype=np.uint64)
+    self.lo, self.hi = np.zeros(3), np.zeros(3)
+
+    def convert(rows: slice) -> None:
+      self.xyz[rows] = xyz[rows] - self.center
+      c = (np.clip(rgb[rows], 0, 1) * 255 + .5).astype(np.uint64)
+      self.colors[rows] = c[:, 0] << np.uint64(16) | c[:, 1] << np.uint64(8) | c[:, 2]
+
+    with ThreadPoolExecutor(max_workers=self.workers) as pool:
+      if len(xyz):
+        bounds = list(pool.map(lambda rows: (xyz[rows].min(axis=0), xyz[rows].max(axis=0)), self.__chunks()))
+        self.lo, self.hi = np.min([lo for lo, _ in bounds], axis=0), np.max([hi for _, hi in bounds], axis=0)
+      self.center = (self.lo + self.hi) / 2
+      self.radius = max(float(np.linalg.norm(self.hi - self.lo)) / 2, 1e-9)
+      list(pool.map(convert, self.__chunks()))
+
+  def __chunks(self) -> list[slice]:
+    return [slice(i, i + CHUNK) for i in range(0, len(self.xyz), CHUNK)]
+
+  def __len__(self) -> int:
+    return len(self.xyz)
+
+  def render(self,
+             camera: Camera,
+             width: int = 512,
+             height: int = 512,
+             background: tuple[int, int, int] = (255, 255, 255)) -> np.ndarray:
+    """
+    image of the points from a point of view, framing the whole cloud
+
+    ## Parameters
+    ```py
+    >>> camera : Camera
+    ```
+    point of view
+    ```py
+    >>> width, height : int, (optional)
+    ```
+    size of the image in pixels
+    ```py
+    >>> background : tuple[int, int, int], (optional)
+    ```
+    color of the pixels without points
+
+    ## Returns
+    ```py
+    np.ndarray : (height, width, 3) uint8 image
+    ```
+    """
+    image = np.empty((height, width, 3), dtype=np.uint8)
+    image[:] = background
+    if len(self) == 0:
+      return image
+    axes, distance = camera.axes(), 0.
+    if camera.fov is None:
+      # frame the projected bounding box, with the aspect ratio of the image
+      corners = np.array(np.meshgrid(*zip(self.lo, self.hi))).T.reshape(-1, 3) - self.center
+      uv = corners @ axes[:2].T
+      scale = .95 * min(width / max(np.ptp(uv[:, 0]), 1e-9), height / max(np.ptp(uv[:, 1]), 1e-9))
+      offset = (uv.min(axis=0) + uv.max(axis=0)) / 2
+      near, far = -self.radius, self.radius
+    else:
+      # the bounding sphere fits the vertical field of view
+      distance = self.radius / math.sin(math.radians(camera.fov) / 2)
+      scale, offset = height / 2 / math.tan(math.radians(camera.fov) / 2), np.zeros(2)
+      near, far = distance - self.radius, distance + self.radius
+    axes = axes.T.astype(np.float32)
+    shift = np.float32(width/2 - offset[0] * scale), np.float32(height/2 + offset[1] * scale)
+
+    def project(rows: slice) -> tuple[np.ndarray, np.ndarray]:
+      p = self.xyz[rows] @ axes
+      u, v, depth = p[:, 0], p[:, 1], p[:, 2]
+      if camera.fov is None:
+        ix, iy = u * np.float32(scale) + shift[0], shift[1] - v * np.float32(scale)
+        ok = (ix >= 0) & (ix < width) & (iy >= 0) & (iy < height)
+      else: # perspective division by the distance to the camera
+        depth += np.float32(distance)
+        ix = u / depth * np.float32(scale) + np.float32(width / 2)
+        iy = np.float32(height / 2) - v / depth * np.float32(scale)
+        ok = (ix >= 0) & (ix < width) & (iy >= 0) & (iy < height) & (depth > 0)
+      dq = np.clip((depth[ok] - near) * ((1 << DEPTH_BITS) - 1) / (far-near), 0, (1 << DEPTH_BITS) - 1)
+      keys = dq.astype(np.uint64) << np.uint64(24) | self.colors[rows][ok]
+      return iy[ok].astype(np.int64) * width + ix[ok].astype(np.int64), keys
+
+    def zbuffer(chunks: list[slice]) -> np.ndarray:
+      buffer = np.full(width * height, EMPTY, dtype=np.uint64)
+      for rows in chunks:
+        pixels, keys = project(rows)
+        np.minimum.at(buffer, pixels, keys)
+      return buffer
+
+    chunks = self.__chunks()
+    shares = [chunks[k::self.workers] for k in range(min(self.workers, len(chunks)))]
+    with ThreadPoolExecutor(max_workers=len(shares)) as pool:
+      buffer = np.minimum.reduce(list(pool.map(zbuffer, shares)))
+
+    hit = buffer != EMPTY
+    packed = buffer[hit]
+    colors = np.stack((packed >> np.uint64(16), packed >> np.uint64(8), packed), axis=1) & np.uint64(0xff)
+    image.reshape(-1, 3)[hit] = colors.astype(np.uint8)
+    return image
+
+
+def write_png(path: str, image: np.ndarray) -> None:
+  """
+  write an (h, w, 3) uint8 image as a png file, with zlib only\\
+  written next to the target then renamed, so that a failure never leaves a truncated file (see `atomic_write`)
+  """
+  # batch imports the thumbnails of this module
+  from .batch import atomic_write # pylint: disable=import-outside-toplevel
+
+  def chunk(tag: bytes, data: bytes) -> bytes:
+    return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data))
+
+  h, w, _ = image.shape
+  # filter type 0 (none) in front of every row
+  rows = np.concatenate((np.zeros((h, 1), dtype=np.uint8), image.reshape(h, -1)), axis=1)
+  png = b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', w, h, 8, 2, 0, 0, 0)) \
+      + chunk(b'IDAT', zlib.compress(rows.tobytes(), 6)) + chunk(b'IEND', b'')
+  with atomic_write(path) as f:
+    f.write(png)
+
+
+# pylint: disable-next=too-many-positional-arguments
+def write_thumbnails(prefix: str,
+                     xyz: np.ndarray,
+                     rgb: np.ndarray,
+                     size: int = 512,
+                     views: dict[str, Camera] = None,
+                     workers: int = None) -> list[str]:
+  """
+  write a png preview of the points from every view, as `<prefix>.<view>.png`
+
+  ## Parameters
+  ```py
+  >>> prefix : str
+  ```
+  path of the previews without extension (e.g. the output without .npy)
+  ```py
+  >>> xyz : np.ndarray
+  ```
+  (N, 3) coordinates
+  ```py
+  >>> rgb : np.ndarray
+  ```
+  (N, 3) colors in [0, 1]
+  ```py
+  >>> size : int, (optional)
+  ```
+  width and height of the previews
+  ```py
+  >>> views : dict[str, Camera], (optional)
+  ```
+  named points of view (default: top, side and iso)
+  ```py
+  >>> workers : int, (optional)
+  ```
+  threads projecting the points (default: one per cpu)
+
+  ## Returns
+  ```py
+  list[str] : written paths
+  ```
+  """
+  renderer, paths = PointRenderer(xyz, rgb, workers=workers), []
+  for name, camera in (views or VIEWS).items():
+    paths.append(f'{prefix}.{name}.png')
+    write_png(paths[-1], renderer.render(camera, size, size))
+  return paths
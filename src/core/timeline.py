@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import numpy as np
+
+__all__ = ['TimeIndex']
+
+
+class TimeIndex:
+
+  def __init__(self, times: np.ndarray, order: np.ndarray = None) -> None:
+    """
+    rows of a store sorted by time, so that a time window is two binary searches\\
+    points without a time (nan) sort last and are never part of a window
+
+    ## Parameters
+    ```py
+    >>> times : np.ndarray
+    ```
+    (N,) sorted times
+    ```py
+    >>> order : np.ndarray, (optional)
+    ```
+    (N,) rows of the store in time order (`None` when the store is already in time order)
+    """
+    self.times = times
+    self.order = order
+    self.count = int(np.searchsorted(times, np.inf, side='right')) # rows with a time
+
+  def __len__(self) -> int:
+    return len(self.times)
+
+  @classmethod
+  def from_times(cls, t: np.ndarray) -> 'TimeIndex':
+    """
+    index a time column (a column already in time order, as most acquisitions are, is not copied)
+
+    ## Parameters
+    ```py
+    >>> t : np.ndarray
+    ```
+    (N,) float64 times, nan if missing
+
+    ## Returns
+    ```py
+    TimeIndex : new index
+    ```
+    """
+    t = np.asarray(t, dtype=np.float64).ravel()
+    valid = ~np.isnan(t)
+    # in order : non decreasing times, then only missing ones
+    n = int(valid.sum())
+    if valid[:n].all() and np.all(t[1:n] >= t[:n - 1]):
+      return cls(t)
+    dtype = np.int32 if len(t) < 2**31 else np.int64
+    order = np.argsort(t, kind='stable').astype(dtype)
+    return cls(t[order], order)
+
+  @classmethod
+  def from_arrays(cls, t: np.ndarray, arrays: dict[str, np.ndarray]) -> 'TimeIndex':
+    """ index of a time column from the arrays of `to_arrays` """
+    order = arrays['order']
+    return cls(t, None) if order.size == 0 else cls(t[order], order)
+
+  def to_arrays(self) -> dict[str, np.ndarray]:
+    """ arrays to cache (the sorted times are derived from the time column again) """
+    return {'order': np.empty(0, dtype=np.int32) if self.order is None else self.order}
+
+  @property
+  def span(self) -> tuple[float, float]:
+    """ first and last time (nan if no point has a time) """
+    if self.count == 0:
+      return np.nan, np.nan
+    return float(self.times[0]), float(self.times[self.count - 1])
+
+  def bounds(self, start: float, end: float) -> tuple[int, int]:
+    """ positions of the points with `start <= t < end` in time order """
+    a, b = np.searchsorted(self.times[:self.count], [start, end], side='left').tolist()
+    return a, max(a, b)
+
+  def window(self, start: float, end: float) -> np.ndarray:
+    """
+    rows of the points within a time window
+
+    ## Parameters
+    ```py
+    >>> start : float
+    ```
+    first time of the window (included)
+    ```py
+    >>> end : float
+    ```
+    end of the window (excluded, so that consecutive windows never share a point)
+
+    ## Returns
+    ```py
+    np.ndarray : sorted rows
+    ```
+    """
+    a, b = self.bounds(start, end)
+    if self.order is None:
+      return np.arange(a, b)
+    return np.sort(self.order[a:b])
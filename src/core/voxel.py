@@ -0,0 +1,285 @@
+from __future__ import annotations
+
+import numpy as np
+
+__all__ = ['VoxelGrid']
+
+
+def pack_keys(ijk: np.ndarray) -> np.ndarray:
+  """
+  pack integer voxel coordinates into a single int64 key per row\\
+  falls back to a structured view when the extent is too large for a mixed radix
+
+  ## Parameters
+  ```py
+  >>> ijk : np.ndarray
+  ```
+  (N, 3) int64 voxel coordinates
+
+  ## Returns
+  ```py
+  np.ndarray : (N,) keys, equal keys if and only if equal coordinates
+  ```
+  """
+  if len(ijk) == 0:
+    return np.empty(0, dtype=np.int64)
+  lo = ijk.min(axis=0)
+  span = ijk.max(axis=0) - lo + 1
+  if int(span[0]) * int(span[1]) * int(span[2]) < 2**62:
+    rel = ijk - lo
+    return (rel[:, 0] * span[1] + rel[:, 1]) * span[2] + rel[:, 2]
+  return np.ascontiguousarray(ijk).view([('i', np.int64), ('j', np.int64), ('k', np.int64)]).ravel()
+
+
+def group_keys(keys: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+  """
+  group equal keys (same as `np.unique(..., return_index=True, return_inverse=True)` but faster)
+
+  ## Parameters
+  ```py
+  >>> keys : np.ndarray
+  ```
+  (N,) keys
+
+  ## Returns
+  ```py
+  tuple[np.ndarray, np.ndarray] : (M,) index of one row per group and (N,) group of every row
+  ```
+  """
+  order = np.argsort(keys)
+  keys = keys[order]
+  starts = np.empty(len(keys), dtype=bool)
+  starts[:1] = True
+  starts[1:] = keys[1:] != keys[:-1]
+  first = order[starts]
+  inverse = np.empty(len(keys), dtype=np.int32 if len(first) < 2**31 else np.int64)
+  inverse[order] = np.cumsum(starts) - 1
+  return first, inverse
+
+
+def group_sums(inverse: np.ndarray, values: np.ndarray, m: int, weights: np.ndarray = None) -> np.ndarray:
+  """
+  per group sums of (weighted) values
+
+  ## Parameters
+  ```py
+  >>> inverse : np.ndarray
+  ```
+  (N,) group of every row
+  ```py
+  >>> values : np.ndarray
+  ```
+  (N,) or (N, C) values
+  ```py
+  >>> m : int
+  ```
+  number of groups
+  ```py
+  >>> weights : np.ndarray, (optional)
+  ```
+  (N,) weight of every row
+
+  ## Returns
+  ```py
+  np.ndarray : (M,) or (M, C) sums
+  ```
+  """
+  if values.ndim == 1:
+    return np.bincount(inverse, weights=values if weights is None else values * weights, minlength=m)
+  out = np.empty((m, values.shape[1]), dtype=np.float64)
+  for c in range(values.shape[1]):
+    out[:, c] = group_sums(inverse, values[:, c], m, weights)
+  return out
+
+
+def nesting_ratio(fine: float, coarse: float) -> int | None:
+  """
+  integer ratio between two voxel sizes, if any
+
+  ## Parameters
+  ```py
+  >>> fine : float
+  ```
+  size of the finer grid
+  ```py
+  >>> coarse : float
+  ```
+  size of the coarser grid
+
+  ## Returns
+  ```py
+  int | None : k >= 2 such that coarse == k * fine, `None` if the grids do not nest
+  ```
+  """
+  ratio = coarse / fine
+  k = round(ratio)
+  return k if k >= 2 and abs(ratio - k) <= 1e-9 * ratio else None
+
+
+class VoxelGrid:
+
+  # pylint: disable-next=too-many-positional-arguments
+  def __init__(
+    self,
+    size: float,
+    ijk: np.ndarray,
+    counts: np.ndarray,
+    xyz: np.ndarray,
+    inverse: np.ndarray = None,
+    values: dict[str, np.ndarray] = None,
+  ) -> None:
+    """
+    points reduced to the mean of each occupied voxel\\
+    voxels are aligned on multiples of `size` (origin at 0), so that grids of different sizes nest
+
+    ## Parameters
+    ```py
+    >>> size : float
+    ```
+    voxel size
+    ```py
+    >>> ijk : np.ndarray
+    ```
+    (M, 3) int64 coordinates of the occupied voxels
+    ```py
+    >>> counts : np.ndarray
+    ```
+    (M,) number of points in each voxel
+    ```py
+    >>> xyz : np.ndarray
+    ```
+    (M, 3) mean coordinates of each voxel
+    ```py
+    >>> inverse : np.ndarray, (optional)
+    ```
+    (N,) voxel index of every source point, unknown for grids loaded from a cache
+    ```py
+    >>> values : dict[str, np.ndarray], (optional)
+    ```
+    named per-voxel means of other attributes (e.g. colors)
+    """
+    self.size = size
+    self.ijk = ijk
+    self.counts = counts
+    self.xyz = xyz
+    self.inverse = inverse
+    self.values = values if values is not None else {}
+
+  def __len__(self) -> int:
+    return len(self.ijk)
+
+  @classmethod
+  def from_xyz(cls, xyz: np.ndarray, size: float) -> 'VoxelGrid':
+    """
+    bin points into voxels of a given size
+
+    ## Parameters
+    ```py
+    >>> xyz : np.ndarray
+    ```
+    (N, 3) coordinates
+    ```py
+    >>> size : float
+    ```
+    voxel size (> 0)
+
+    ## Returns
+    ```py
+    VoxelGrid : new grid
+    ```
+    """
+    if size <= 0:
+      raise ValueError(f'voxel size must be > 0 (got {size})')
+    ijk = np.floor(xyz / size).astype(np.int64)
+    first, inverse = group_keys(pack_keys(ijk))
+    counts = np.bincount(inverse, minlength=len(first))
+    grid = cls(size, ijk[first], counts, np.empty((len(first), 3)), inverse)
+    grid.xyz = grid.reduce(xyz)
+    return grid
+
+  @classmethod
+  def from_arrays(cls, size: float, arrays: dict[str, np.ndarray]) -> 'VoxelGrid':
+    """
+    rebuild a grid from the arrays given by `to_arrays`
+
+    ## Parameters
+    ```py
+    >>> size : float
+    ```
+    voxel size
+    ```py
+    >>> arrays : dict[str, np.ndarray]
+    ```
+    named arrays
+
+    ## Returns
+    ```py
+    VoxelGrid : grid without `inverse`
+    ```
+    """
+    values = {k[len('value_'):]: v for k, v in arrays.items() if k.startswith('value_')}
+    return cls(size, arrays['ijk'], arrays['counts'], arrays['xyz'], values=values)
+
+  def to_arrays(self) -> dict[str, np.ndarray]:
+    """
+    arrays describing the grid, without the per-point `inverse`
+
+    ## Returns
+    ```py
+    dict[str, np.ndarray] : named arrays
+    ```
+    """
+    arrays = {'ijk': self.ijk, 'counts': self.counts, 'xyz': self.xyz}
+    arrays.update({f'value_{k}': v for k, v in self.values.items()})
+    return arrays
+
+  def reduce(self, values: np.ndarray) -> np.ndarray:
+    """
+    average per-point values over each voxel
+
+    ## Parameters
+    ```py
+    >>> values : np.ndarray
+    ```
+    (N,) or (N, C) values, one row per source point
+
+    ## Returns
+    ```py
+    np.ndarray : (M,) or (M, C) mean value of each voxel
+    ```
+    """
+    if self.inverse is None:
+      raise RuntimeError('cannot reduce per-point values without the point to voxel mapping')
+    sums = group_sums(self.inverse, values, len(self))
+    return sums / (self.counts if values.ndim == 1 else self.counts[:, None])
+
+  def coarsen(self, size: float) -> 'VoxelGrid':
+    """
+    derive a coarser grid from this one, without going back to the points\\
+    voxel means are weighted by the voxel counts so that the result is the same as binning the points
+    (up to floating point rounding of points lying exactly on voxel boundaries)
+
+    ## Parameters
+    ```py
+    >>> size : float
+    ```
+    voxel size of the coarser grid, an integer multiple of `self.size`
+
+    ## Returns
+    ```py
+    VoxelGrid : coarser grid (`inverse` is carried over if known)
+    ```
+    """
+    if (k := nesting_ratio(self.size, size)) is None:
+      raise ValueError(f'voxel size {size} is not an integer multiple of {self.size}')
+    ijk = np.floor_divide(self.ijk, k)
+    first, inverse = group_keys(pack_keys(ijk))
+    m = len(first)
+    counts = np.bincount(inverse, weights=self.counts, minlength=m).astype(self.counts.dtype)
+    xyz = group_sums(inverse, self.xyz, m, self.counts) / counts[:, None]
+    values = {
+      name: group_sums(inverse, v, m, self.counts) / (counts if v.ndim == 1 else counts[:, None])
+      for name, v in self.values.items()
+    }
+    return VoxelGrid(size, ijk[first], counts, xyz, None if self.inverse is None else inverse[self.inverse],
+                     values)
@@ -1,13 +1,17 @@
 from __future__ import annotations
 
+import os
 import sys
+import queue
+import threading
 
 import logging
+from logging.handlers import QueueHandler, QueueListener
 from typing import Any
 from typing_extensions import override
 from termcolor import colored
 
-__all__ = ['UsefulFormatter', 'UselessHandler']
+__all__ = ['UsefulFormatter', 'UselessHandler', 'RepeatFilter', 'AsyncHandler']
 
 
 def formatter(
@@ -26,30 +30,152 @@ class UsefulFormatter(logging.Formatter):
 
   name_width = 4
   dt_fmt = r'%Y-%m-%d %H:%M:%S'
+  colors = {
+    logging.DEBUG: ('green', None),
+    logging.INFO: ('blue', None),
+    logging.WARNING: ('yellow', None),
+    logging.ERROR: ('red', None),
+    logging.CRITICAL: ('red', ['bold']),
+  }
 
   def __init__(self, *args: Any, colored_output: bool = True, **kwargs: Any) -> None:
     super().__init__(*args, **kwargs)
     self.colored_output = colored_output
+    self.__formatters: dict[tuple[int, int], logging.Formatter] = {} # per level and name width
 
   @override
   def format(self, record: logging.LogRecord) -> str:
     self.name_width = max(len(record.name) + 1, self.name_width)
-    formats = {
-      logging.DEBUG: formatter('green', self.colored_output, self.name_width),
-      logging.INFO: formatter('blue', self.colored_output, self.name_width),
-      logging.WARNING: formatter('yellow', self.colored_output, self.name_width),
-      logging.ERROR: formatter('red', self.colored_output, self.name_width),
-      logging.CRITICAL: formatter('red', self.colored_output, self.name_width, ['bold']),
-    }
-    log_fmt = formats.get(record.levelno)
-    fmt = logging.Formatter(log_fmt, self.dt_fmt, style='%')
+    if (fmt := self.__formatters.get((record.levelno, self.name_width))) is None:
+      log_fmt = None
+      if record.levelno in self.colors:
+        c, attrs = self.colors[record.levelno]
+        log_fmt = formatter(c, self.colored_output, self.name_width, attrs)
+      fmt = logging.Formatter(log_fmt, self.dt_fmt, style='%')
+      self.__formatters[(record.levelno, self.name_width)] = fmt
     return fmt.format(record)
 
 
 class UselessHandler(logging.StreamHandler):
 
+  def __init__(self, *args: Any, exit_on_critical: bool = True, **kwargs: Any) -> None:
+    super().__init__(*args, **kwargs)
+    self.exit_on_critical = exit_on_critical
+
   @override
   def emit(self, record: logging.LogRecord) -> None:
     super().emit(record)
+    if record.levelno >= logging.CRITICAL and self.exit_on_critical: # exit on critical errors
+      sys.exit(1)
+
+
+class RepeatFilter(logging.Filter):
+
+  def __init__(self, burst: int = 10, period: float = 5.) -> None:
+    """
+    rate limiter for records repeated from a hot loop (e.g. one per bad line)\\
+    records are grouped by logger, level and unformatted message : the first `burst` ones of each
+    `period` go through, the others are only counted, and the count is appended to the next one that goes through
+
+    ## Parameters
+    ```py
+    >>> burst : int, (optional)
+    ```
+    records of a group let through per period
+    ```py
+    >>> period : float, (optional)
+    ```
+    length of a period, in seconds
+    """
+    super().__init__()
+    self.burst = burst
+    self.period = period
+    # group -> [start of the period, records let through, records dropped, last dropped record]
+    self.__groups: dict[tuple[str, int, str], list] = {}
+    self.__lock = threading.Lock()
+
+  @override
+  def filter(self, record: logging.LogRecord) -> bool:
+    if record.levelno >= logging.CRITICAL:
+      return True
+    key = (record.name, record.levelno, str(record.msg))
+    with self.__lock:
+      group = self.__groups.get(key)
+      if group is None or record.created - group[0] >= self.period:
+        dropped = group[2] if group else 0
+        self.__groups[key] = [record.created, 1, 0, None]
+        if dropped:
+          record.msg = f'{record.msg} (and {dropped:_} similar messages in the last {self.period:g} s)'
+        return True
+      if group[1] < self.burst:
+        group[1] += 1
+        return True
+      group[2] += 1
+      group[3] = record
+      return False
+
+  def pending(self) -> list[logging.LogRecord]:
+    """ one record per group with dropped records not reported yet (the last dropped one, with the count) """
+    records = []
+    with self.__lock:
+      for group in self.__groups.values():
+        if group[2]:
+          last = logging.makeLogRecord(group[3].__dict__)
+          last.msg, last.args = f'{last.getMessage()} (last of {group[2]:_} similar messages)', None
+          records.append(last)
+          group[2], group[3] = 0, None
+    return records
+
+
+class AsyncHandler(QueueHandler):
+
+  def __init__(self, target: logging.Handler) -> None:
+    """
+    hand the records over to a background thread that writes them with `target`,
+    so that logging from a hot loop never waits for the terminal\\
+    critical records are written synchronously, after every pending record, and exit the process ;
+    forked processes (which do not run the thread) write synchronously too
+
+    ## Parameters
+    ```py
+    >>> target : logging.Handler
+    ```
+    handler doing the actual writing (should not exit on critical records itself)
+    """
+    super().__init__(queue.SimpleQueue())
+    # only the message is merged here, the target formats the record (basicConfig keeps a set formatter)
+    self.setFormatter(logging.Formatter('%(message)s'))
+    self.target = target
+    self.listener = QueueListener(self.queue, target, respect_handler_level=True)
+    self.running = False
+    self.__pid = os.getpid()
+
+  def start(self) -> 'AsyncHandler':
+    self.listener.start()
+    self.running = True
+    return self
+
+  def stop(self) -> None:
+    """ write every pending record and stop the thread """
+    if self.running:
+      self.running = False
+      self.listener.stop()
+
+  @override
+  def flush(self) -> None:
+    """ write every pending record, before writing to the terminal directly (the thread keeps running) """
+    if self.running and os.getpid() == self.__pid:
+      self.listener.stop()
+      self.listener.start()
+    self.target.flush()
+
+  @override
+  def emit(self, record: logging.LogRecord) -> None:
+    if self.running and os.getpid() == self.__pid and record.levelno < logging.CRITICAL:
+      self.enqueue(self.prepare(record))   # message merged now, formatted by the thread
+      return
+    if record.levelno >= logging.CRITICAL and os.getpid() == self.__pid:
+      self.stop()                          # the records logged before are written first
+    self.target.handle(record)
     if record.levelno >= logging.CRITICAL: # exit on critical errors
       sys.exit(1)
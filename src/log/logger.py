@@ -1,10 +1,17 @@
 import sys
 import os
+import atexit
 import logging
+import multiprocessing
+import multiprocessing.util
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any
 
 from .fmt import *
 
-__all__ = ['init_logger']
+__all__ = [
+  'init_logger', 'skip_record_details', 'stop_logger', 'flush_logger', 'worker_logging', 'init_worker_logger'
+]
 
 try:
   import colorama # type: ignore
@@ -59,7 +66,21 @@ def supports_color():
   # yapf: enable
 
 
-def init_logger(log_lvl: int = logging.INFO) -> bool:
+def skip_record_details() -> None:
+  """
+  Stops filling the fields of the records that are never formatted
+  (caller, thread and process), the most expensive part of a record
+  """
+  logging._srcfile = None # pylint: disable=protected-access
+  logging.logThreads = logging.logProcesses = logging.logMultiprocessing = False
+  logging.logAsyncioTasks = False
+
+
+# asynchronous sink of the process, with the listener of the records sent by its workers
+_sink: dict[str, Any] = {}
+
+
+def init_logger(log_lvl: int = logging.INFO, asynchronous: bool = True) -> bool:
   """
   Initializes the logger for the application\\
   This sets the global configuration for the logger
@@ -68,20 +89,108 @@ def init_logger(log_lvl: int = logging.INFO) -> bool:
   - `log_lvl` - int, (optional)
   the logging level (see `logging` module for more info)
   defaults to `logging.INFO`
+  - `asynchronous` - bool, (optional)
+  write the records from a background thread (see `AsyncHandler`)
+  defaults to `True`
 
   ## Returns
   - bool - if supports color
   """
   color = supports_color()
+  if logging.getLogger().handlers: # already configured (as basicConfig does)
+    return color
+
+  skip_record_details()
 
   # create console handler with a higher log level
-  console_handler = UselessHandler()
+  console_handler = UselessHandler(exit_on_critical=not asynchronous)
   console_handler.setLevel(log_lvl)
   console_handler.setFormatter(UsefulFormatter(colored_output=color))
 
+  handler: logging.Handler = console_handler
+  if asynchronous:
+    handler = AsyncHandler(console_handler).start()
+    handler.setLevel(log_lvl)
+  repeats = RepeatFilter()
+  handler.addFilter(repeats)
+  _sink.update(handler=handler, repeats=repeats, level=log_lvl)
+  atexit.register(stop_logger)
+
   logging.basicConfig(
     level=log_lvl,
     style='%',
-    handlers=[console_handler],
+    handlers=[handler],
   )
   return color
+
+
+def stop_logger() -> None:
+  """
+  Writes every pending record (including the ones of the workers)
+  and the counts of the repeated records that were dropped
+  """
+  if (workers := _sink.pop('workers', None)) is not None:
+    workers.stop()
+  if (handler := _sink.get('handler')) is None:
+    return
+  if isinstance(handler, AsyncHandler):
+    handler.stop()
+  for record in _sink['repeats'].pending():
+    handler.emit(record) # past the filter that dropped them
+
+
+def flush_logger() -> None:
+  """
+  Writes every pending record (including the ones of the workers),
+  so that what is printed next does not interleave with them
+  """
+  if (workers := _sink.get('workers')) is not None:
+    workers.stop()
+    workers.start()
+  if (handler := _sink.get('handler')) is not None:
+    handler.flush()
+
+
+def worker_logging() -> dict[str, Any]:
+  """
+  Keyword arguments of a process pool whose workers send their records
+  to the asynchronous sink of this process (nothing if logging is synchronous)
+
+  ## Returns
+  - dict[str, Any] - `initializer` and `initargs` of the pool
+  """
+  if not isinstance(handler := _sink.get('handler'), AsyncHandler) or not handler.running:
+    return {}
+  if 'workers' not in _sink:
+    _sink['queue'] = multiprocessing.Queue()
+    _sink['workers'] = QueueListener(_sink['queue'], handler.target, respect_handler_level=True)
+    _sink['workers'].start()
+  return {'initializer': init_worker_logger, 'initargs': (_sink['queue'], _sink['level'])}
+
+
+def init_worker_logger(q: Any, log_lvl: int = logging.INFO) -> None:
+  """
+  Initializes the logger of a worker process\\
+  Its records are rate limited and sent to the process that owns the queue
+
+  ## Parameters
+  - `q` - multiprocessing.Queue
+  the queue of the parent process (see `worker_logging`)
+  - `log_lvl` - int, (optional)
+  the logging level
+  defaults to `logging.INFO`
+  """
+  root = logging.getLogger()
+  for handler in root.handlers[:]: # inherited from a forked parent
+    root.removeHandler(handler)
+  _sink.clear()
+  skip_record_details()
+  handler, repeats = QueueHandler(q), RepeatFilter()
+  handler.addFilter(repeats)
+  root.addHandler(handler)
+  root.setLevel(log_lvl)
+
+  # pool workers do not run atexit, but run the finalizers of multiprocessing
+  multiprocessing.util.Finalize(handler,
+                                lambda: [handler.emit(r) for r in repeats.pending()],
+                                exitpriority=10)
@@ -1,12 +1,13 @@
 from __future__ import annotations
 
+import re
 import sys
 from argparse import ArgumentParser
 from typing_extensions import override
 
 from ..version import __version__
 
-__all__ = ['parser']
+__all__ = ['parser', 'batch_parser', 'serve_parser']
 
 
 def parse_int_set(inputstr='') -> set[int]:
@@ -54,31 +55,70 @@ def parse_int_set(inputstr='') -> set[int]:
   return selection
 
 
-def parser() -> ArgumentParser:
+def parse_size(inputstr: str) -> int:
+  # sizes are a number of bytes with an optional binary suffix, eg. '512M', '1.5G' or '2GiB'
+  units = {'': 1, 'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30, 'T': 1 << 40}
+  if (match := re.fullmatch(r'\s*([0-9]*\.?[0-9]+)\s*([KMGT]?)(?:I?B)?\s*', inputstr.upper())) is None:
+    print(f'Invalid size: {inputstr}', file=sys.stderr)
+    raise ValueError
+  if (size := int(float(match.group(1)) * units[match.group(2)])) <= 0:
+    print(f'Invalid size: {inputstr} (should be > 0)', file=sys.stderr)
+    raise ValueError
+  return size
+
+
+def parse_time_window(inputstr: str) -> tuple[float, float]:
+  # a window is 'start,end' with start < end, times in the unit of the {t} field
+  try:
+    start, end = (float(x) for x in inputstr.split(','))
+  except ValueError:
+    print(f'Invalid time window: {inputstr} (should be start,end)', file=sys.stderr)
+    raise
+  if not start < end:
+    print(f'Invalid time window: {inputstr} (start should be < end)', file=sys.stderr)
+    raise ValueError
+  return start, end
+
+
+def parse_percentiles(inputstr: str) -> tuple[float, float]:
+  # a stretch is 'lo,hi' percentiles with 0 <= lo < hi <= 100
+  try:
+    lo, hi = (float(x) for x in inputstr.split(','))
+  except ValueError:
+    print(f'Invalid percentiles: {inputstr} (should be lo,hi)', file=sys.stderr)
+    raise
+  if not 0 <= lo < hi <= 100:
+    print(f'Invalid percentiles: {inputstr} (should be 0 <= lo < hi <= 100)', file=sys.stderr)
+    raise ValueError
+  return lo, hi
+
+
+class WeakArgsParser(ArgumentParser):
 
-  class WeakArgsParser(ArgumentParser):
+  @override
+  def add_argument(self, *args, **kwargs) -> 'WeakArgsParser':
+    super().add_argument(*args, **kwargs)
+    return self
 
-    @override
-    def add_argument(self, *args, **kwargs) -> 'WeakArgsParser':
-      super().add_argument(*args, **kwargs)
-      return self
+  def add_non_required_argument(self, *args, **kwargs) -> 'WeakArgsParser':
+    kwargs['required'] = False
+    return self.add_argument(*args, **kwargs)
 
-    def add_non_required_argument(self, *args, **kwargs) -> 'WeakArgsParser':
-      kwargs['required'] = False
-      return self.add_argument(*args, **kwargs)
+  def add_true_false_argument(self, *args, **kwargs) -> 'WeakArgsParser':
+    kwargs['action'] = 'store_true'
+    if 'default' not in kwargs:
+      kwargs['default'] = False
+    return self.add_non_required_argument(*args, **kwargs)
 
-    def add_true_false_argument(self, *args, **kwargs) -> 'WeakArgsParser':
-      kwargs['action'] = 'store_true'
-      if 'default' not in kwargs:
-        kwargs['default'] = False
-      return self.add_non_required_argument(*args, **kwargs)
+  def add_path_argument(self, *args, **kwargs) -> 'WeakArgsParser':
+    kwargs['type'] = str
+    kwargs['metavar'] = 'PATH'
+    if 'default' not in kwargs:
+      kwargs['default'] = None
+    return self.add_non_required_argument(*args, **kwargs)
 
-    def add_path_argument(self, *args, **kwargs) -> 'WeakArgsParser':
-      kwargs['type'] = str
-      kwargs['metavar'] = 'PATH'
-      if 'default' not in kwargs:
-        kwargs['default'] = None
-      return self.add_non_required_argument(*args, **kwargs)
+
+def parser() -> ArgumentParser:
 
   return WeakArgsParser(
     description=f'PCV - point cloud visualizer v{__version__}',
@@ -122,7 +162,8 @@ def parser() -> ArgumentParser:
   ).add_path_argument(
     '-s',
     '--save',
-    help='save the current scene to a .npy file (since 0.1.2) (default: do not save)',
+    help='save the current scene to a .npy file, or to a binary .ply file with the ids and the scalar field '
+    '(since 0.1.2) (default: do not save)',
   ).add_true_false_argument(
     '-p',
     '--make-parent',
@@ -137,4 +178,242 @@ def parser() -> ArgumentParser:
     default=None,
     help='only parse some registered files in the config file from \'(<=?N)|(N(-N)?)(,\\s*N(-N)?)*\', '
     'both \'-\' endpoints included (since 0.2.2) (default: parse all)',
+  ).add_path_argument(
+    '--cache-dir',
+    help='directory of the downsample cache shared across sessions (since 0.4.0) '
+    '(default: $PCV_CACHE_DIR or ~/.cache/pcv)',
+  ).add_non_required_argument(
+    '--cache-size',
+    type=parse_size,
+    metavar='SIZE',
+    default=2 << 30,
+    help='maximum size of the downsample cache, eg. 512M or 4G (since 0.4.0) (default: 2G)',
+  ).add_true_false_argument(
+    '--no-cache',
+    help='do not read nor write the downsample cache (since 0.4.0) (default: False)',
+  ).add_non_required_argument(
+    '--attach',
+    nargs='?',
+    const='',
+    metavar='SOCKET',
+    default=None,
+    help='show the points of a running `pcv.py serve` daemon instead of parsing files (since 0.4.0) '
+    '(default: do not attach, SOCKET defaults to $PCV_SOCKET or $XDG_RUNTIME_DIR/pcv-<uid>.sock)',
+  ).add_non_required_argument(
+    '--preview',
+    nargs='?',
+    const=64,
+    type=int,
+    metavar='N',
+    default=None,
+    help='quick look : only parse short runs of lines at N byte offsets spread over each file '
+    '(since 0.4.0) (default: parse everything, N defaults to 64)',
+  ).add_true_false_argument(
+    '--preview-random',
+    help='uniformly random offsets for --preview instead of one offset per stratum (since 0.4.0) '
+    '(default: False)',
+  ).add_non_required_argument(
+    '--time-window',
+    type=parse_time_window,
+    metavar='START,END',
+    default=None,
+    help='only show and save the points with START <= t < END, for files with a {t} field (since 0.4.0) '
+    '(default: all points, [ and ] step through windows of this length in the gui)',
+  ).add_non_required_argument(
+    '--sequence',
+    nargs='?',
+    const=2.,
+    type=float,
+    metavar='FPS',
+    default=None,
+    help='play the files as the frames of a sequence instead of merging them, P plays or pauses at FPS frames '
+    'per second (0: as fast as they are decoded), N and B show the next and previous frames (since 0.4.0) '
+    '(default: merge, FPS defaults to 2)',
+  ).add_non_required_argument(
+    '--sequence-memory',
+    type=parse_size,
+    metavar='SIZE',
+    default=1 << 30,
+    help='memory of the decoded frames kept around the current one with --sequence (since 0.4.0) '
+    '(default: 1G)',
+  ).add_non_required_argument(
+    '--layers',
+    nargs='?',
+    const='file',
+    choices=('file', 'id'),
+    default=None,
+    help='one geometry per file or per class id, shown, hidden and recolored on their own '
+    'with L, K, V, O and F (since 0.4.0) (default: a single geometry, by file if given without a value)',
+  ).add_non_required_argument(
+    '--max-points',
+    type=int,
+    metavar='N',
+    default=None,
+    help='choose the voxel size so that about N points are rendered, from voxel occupancy counts '
+    '(since 0.4.0) (default: no budget)',
+  ).add_non_required_argument(
+    '--max-memory',
+    type=parse_size,
+    metavar='SIZE',
+    default=None,
+    help='choose the voxel size so that the rendered points take about SIZE, eg. 256M (since 0.4.0) '
+    '(default: no budget)',
+  ).add_true_false_argument(
+    '--checkpoint',
+    help='checkpoint the parsed points of --save in <save>.parts, so that an interrupted run can be '
+    'continued with --resume (since 0.4.0) (default: False, implied by --resume)',
+  ).add_true_false_argument(
+    '--resume',
+    help='continue an interrupted --save from the points checkpointed in <save>.parts, '
+    'without parsing the finished files again (since 0.4.0) (default: start over)',
+  ).add_true_false_argument(
+    '--thumbnails',
+    help='write top, side and iso png previews next to --save, rendered without any gpu '
+    '(since 0.4.0) (default: False)',
+  ).add_non_required_argument(
+    '--stats',
+    nargs='?',
+    const='table',
+    choices=('table', 'json'),
+    default=None,
+    help='print per-file and total counts, bounds, class ids, color coverage and coordinate histograms '
+    'in a single pass over the files, without building any geometry (since 0.4.0) '
+    '(default: no statistics, a table if given without a value)',
+  ).add_path_argument(
+    '--compare',
+    help='json config file of a reference epoch : the points are colored by their distance to the nearest '
+    'reference point, and --save also writes the distances to <save>.distances.npy (since 0.4.0) '
+    '(default: no comparison)',
+  ).add_non_required_argument(
+    '--compare-max-distance',
+    type=float,
+    metavar='D',
+    default=None,
+    help='do not look for reference points farther than D with --compare, farther points get the last color '
+    '(since 0.4.0) (default: no limit, colors stretched to the 99th percentile)',
+  ).add_non_required_argument(
+    '--scalar',
+    nargs='?',
+    const='viridis',
+    choices=('viridis', 'jet', 'gray'),
+    default=None,
+    help='color the points by their {i} scalar field (eg. intensity) with a colormap (since 0.4.0) '
+    '(default: file colors, viridis if given without a value)',
+  ).add_non_required_argument(
+    '--stretch',
+    type=parse_percentiles,
+    metavar='LO,HI',
+    default=None,
+    help='percentiles of the scalar field mapped to the ends of the --scalar colormap, estimated while '
+    'parsing (since 0.4.0) (default: 2,98)',
+  ).add_non_required_argument(
+    '--raster',
+    type=float,
+    metavar='CELL',
+    default=None,
+    help='write count, min, max and mean z and most frequent id grids of CELL sized cells to --save instead of '
+    'the points, with a <save>.raster.json georeference, in a single pass over the files without '
+    'building any geometry (since 0.4.0) (default: save the points)',
+  )
+
+
+def batch_parser() -> ArgumentParser:
+  return WeakArgsParser(
+    prog='pcv.py batch',
+    description=f'PCV - point cloud visualizer v{__version__} - headless batch conversion to .npy files',
+    epilog='visit us on GitHub : https://github.com/ThomasByr/point-cloud-visualizer',
+  ).add_argument(
+    'cfgs',
+    nargs='*',
+    metavar='CFG',
+    help='json config files, each one is converted to <out-dir>/<name>.npy',
+  ).add_true_false_argument(
+    '-v',
+    '--verbose',
+    help='print debug messages',
+  ).add_path_argument(
+    '--jobs',
+    help='json5 job list : an array of {"cfg", "save", and optionally "only", "frac", "voxel_size", "cbid", '
+    '"thumbnails"} (since 0.4.0) (default: no job list)',
+  ).add_path_argument(
+    '-o',
+    '--out-dir',
+    default='.',
+    help='output directory of the files given as CFG (since 0.4.0) (default: current directory)',
+  ).add_non_required_argument(
+    '-j',
+    '--workers',
+    type=int,
+    metavar='N',
+    default=None,
+    help='number of parsing processes (since 0.4.0) (default: number of cores)',
+  ).add_path_argument(
+    '--summary',
+    help='per-job summary as json (since 0.4.0) (default: <out-dir>/batch-summary.json)',
+  ).add_true_false_argument(
+    '-i',
+    '--cbid',
+    help='force color by id for the files given as CFG (since 0.4.0) (default: False)',
+  ).add_non_required_argument(
+    '-f',
+    '--frac',
+    type=float,
+    metavar='F',
+    default=None,
+    help='random fraction of points to save for the files given as CFG (since 0.4.0) (default: all points)',
+  ).add_non_required_argument(
+    '-r',
+    '--voxel-size',
+    type=float,
+    metavar='S',
+    default=None,
+    help='voxel size for downsampling the files given as CFG (since 0.4.0) (default: all points)',
+  ).add_true_false_argument(
+    '--thumbnails',
+    help='write top, side and iso png previews next to the outputs of the files given as CFG '
+    '(since 0.4.0) (default: False)',
+  )
+
+
+def serve_parser() -> ArgumentParser:
+  return WeakArgsParser(
+    prog='pcv.py serve',
+    description=f'PCV - point cloud visualizer v{__version__} - resident daemon serving points over a socket',
+    epilog='visit us on GitHub : https://github.com/ThomasByr/point-cloud-visualizer',
+  ).add_argument(
+    'cfg',
+    metavar='CFG',
+    help='json config file of the points to serve',
+  ).add_true_false_argument(
+    '-v',
+    '--verbose',
+    help='print debug messages',
+  ).add_path_argument(
+    '--socket',
+    help='path of the unix socket (since 0.4.0) (default: $PCV_SOCKET or $XDG_RUNTIME_DIR/pcv-<uid>.sock)',
+  ).add_non_required_argument(
+    '--only',
+    type=parse_int_set,
+    metavar='N',
+    default=None,
+    help='only parse some registered files of the config, as in the gui (since 0.4.0) (default: all)',
+  ).add_non_required_argument(
+    '-j',
+    '--workers',
+    type=int,
+    metavar='N',
+    default=None,
+    help='number of parsing processes (since 0.4.0) (default: number of cores)',
+  ).add_path_argument(
+    '--cache-dir',
+    help='directory of the downsample cache (since 0.4.0) (default: $PCV_CACHE_DIR or ~/.cache/pcv)',
+  ).add_non_required_argument(
+    '--cache-size',
+    type=parse_size,
+    metavar='SIZE',
+    default=2 << 30,
+    help='maximum size of the downsample cache (since 0.4.0) (default: 2G)',
+  ).add_true_false_argument(
+    '--no-cache',
+    help='do not read nor write the downsample cache (since 0.4.0) (default: False)',
   )
@@ -0,0 +1,72 @@
+import os
+import sys
+import json
+import subprocess
+from argparse import Namespace
+
+import numpy as np
+import pytest
+
+from src.core.batch import Batch, Job, save_npy
+
+
+def write_site(tmp_path):
+  for k in range(3):
+    (tmp_path / f'f{k}.csv').write_text('x,y,z\n' + ''.join(f'{k},{i},{i * 2}\n' for i in range(10)))
+  for name, files in (('a', [0, 1]), ('b', [1, 2])):
+    (tmp_path / f'{name}.json').write_text(
+      json.dumps({
+        'default': {'pattern': '{x},{y},{z}', 'skip_first_line': True},
+        'configs': [{'file_path': str(tmp_path / f'f{k}.csv')} for k in files],
+      }))
+
+
+def test_job_from_json():
+  job = Job.from_json({'cfg': 'c.json', 'save': 'out/c.npy', 'only': '1-2', 'frac': .5})
+  assert job.name == '1:c' and job.only == {1, 2}
+
+
+def test_batch(tmp_path):
+  write_site(tmp_path)
+  (tmp_path / 'jobs.json').write_text(
+    json.dumps([{'cfg': str(tmp_path / 'a.json'), 'save': str(tmp_path / 'c.npy'), 'only': '2', 'voxel_size': 100,
+                 'thumbnails': True}]))
+  args = Namespace(cfgs=[str(tmp_path / 'a.json'), str(tmp_path / 'b.json')], verbose=False,
+                   jobs=str(tmp_path / 'jobs.json'), out_dir=str(tmp_path / 'out'), workers=2, summary=None,
+                   cbid=False, frac=None, voxel_size=None, thumbnails=False)
+  assert Batch(args).run() == 0
+
+  a = np.load(tmp_path / 'out' / 'a.npy')
+  assert a.shape == (20, 6) and np.array_equal(a[10:, :3], [[1, i, i * 2] for i in range(10)])
+  assert len(np.load(tmp_path / 'c.npy')) == 1
+  with open(tmp_path / 'out' / 'batch-summary.json', encoding='utf-8') as f:
+    summary = json.load(f)
+  jobs = {j['name']: j for j in summary['jobs']}
+  assert jobs['b']['points'] == 20 and jobs['b']['bytes'] == os.path.getsize(tmp_path / 'out' / 'b.npy')
+  assert jobs['a']['shared_files'] == [str(tmp_path / 'f1.csv')]
+  assert jobs['1:c']['thumbnails'] == [str(tmp_path / f'c.{view}.png') for view in ('top', 'side', 'iso')]
+  assert all(os.path.isfile(path) for path in jobs['1:c']['thumbnails']) and not jobs['a']['thumbnails']
+
+  args.workers = None
+  assert Batch(args).workers == (os.cpu_count() or 1)
+  args.workers = 0
+  with pytest.raises(RuntimeError, match='--workers : 0'):
+    Batch(args)
+
+
+def test_save_npy(tmp_path):
+  umask = os.umask(0o022)
+  try:
+    size = save_npy(str(tmp_path / 'x' / 'a.npy'), np.arange(10.))
+  finally:
+    os.umask(umask)
+  assert size == os.path.getsize(tmp_path / 'x' / 'a.npy') and np.array_equal(np.load(tmp_path / 'x' / 'a.npy'), np.arange(10.))
+  assert os.stat(tmp_path / 'x' / 'a.npy').st_mode & 0o777 == 0o644 and os.listdir(tmp_path / 'x') == ['a.npy']
+  with pytest.raises(ValueError):
+    save_npy(str(tmp_path / 'x' / 'a.npy'), np.array([object()]))
+  assert os.listdir(tmp_path / 'x') == ['a.npy'] and len(np.load(tmp_path / 'x' / 'a.npy')) == 10
+
+
+def test_headless():
+  code = 'import sys, src.core.batch; print("open3d" in sys.modules)'
+  assert subprocess.check_output([sys.executable, '-c', code], text=True).strip() == 'False'
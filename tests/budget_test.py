@@ -0,0 +1,26 @@
+import numpy as np
+
+from src.core.budget import choose_voxel_size, occupancy
+from src.core.voxel import VoxelGrid
+
+
+def test_occupancy():
+  rng = np.random.default_rng(0)
+  xyz = rng.random((20_000, 3)) * (100, 60, 3)
+  occ = occupancy(xyz, bits=10, workers=2)
+  assert len(occ.sizes) == 10 and np.allclose(occ.sizes[1:] / occ.sizes[:-1], 2)
+  for size, count in zip(occ.sizes, occ.counts): # the voxels of the rendered grids
+    assert count == len(VoxelGrid.from_xyz(xyz, size))
+  assert occ.counts[-1] == 1 and occupancy(xyz - 50, bits=10).counts[-1] == 4 and occ.estimate(occ.sizes[3]) == occ.counts[3]
+  assert occ.counts[4] >= occ.estimate(occ.sizes[3] * 3) >= occ.counts[5]
+
+
+def test_choose_voxel_size():
+  rng = np.random.default_rng(1)
+  xyz = rng.random((200_000, 3)) * (200, 200, 1) # a thick terrain
+  xyz[:, 2] += 5 * np.sin(xyz[:, 0] / 20)
+  assert choose_voxel_size(xyz, 200_000) == (None, 200_000)
+  for budget in (1000, 20_000, 100_000):
+    size, estimate = choose_voxel_size(xyz, budget)
+    assert estimate == budget
+    assert abs(len(VoxelGrid.from_xyz(xyz, size)) / budget - 1) < .1
@@ -0,0 +1,51 @@
+import numpy as np
+from open3d import geometry
+
+from src.core.buffer import RenderBuffer
+from src.core.point import *
+
+
+def test_get_colors():
+  points = [Point(0, 0, 0, 255, 0, 51), Point(1, 1, 1, cid=3), Point(2, 2, 2, r=51), Point(3, 3, 3, cid=0)]
+  data = np.asarray(points)
+  colors = get_colors(data[:, 3:6], data[:, 6])
+  for p, c in zip(points, colors):
+    assert np.allclose(p.get_color(), c)
+  assert np.allclose(colors[2], (.2, .2, .2))
+
+  colors = get_colors(data[:, 3:6], data[:, 6], cbid=True)
+  for p, c in zip(points, colors):
+    assert np.allclose(p.get_color(True), c)
+
+
+def test_from_points():
+  points = [Point(1, 2, 3, 255, 255, 255), Point(4, 5, 6, 0, 0, 0)]
+  buffer = RenderBuffer.from_points(points)
+  assert len(buffer) == 2
+  assert buffer.xyz.flags['C_CONTIGUOUS'] and buffer.xyz.dtype == np.float64
+  assert np.array_equal(buffer.to_array(), [[1, 2, 3, 1, 1, 1], [4, 5, 6, 0, 0, 0]])
+  assert len(RenderBuffer.from_points([])) == 0
+
+
+def test_update_in_place():
+  pc = geometry.PointCloud()
+  buffer = RenderBuffer(np.zeros((10, 3)), np.zeros((10, 3)))
+  buffer.attach(pc)
+
+  xyz = np.zeros((10, 3))
+  xyz[3:5] = 1
+  rows = buffer.update(pc, xyz, np.zeros((10, 3)))
+  assert rows == slice(3, 5)
+  assert np.array_equal(np.asarray(pc.points), xyz)
+
+  assert buffer.update(pc, np.ones((4, 3)), np.ones((4, 3))) is None
+  assert len(pc.points) == 4 and len(buffer) == 4
+
+
+def test_append():
+  pc = geometry.PointCloud()
+  buffer = RenderBuffer(np.zeros((2, 3)), np.zeros((2, 3)))
+  buffer.attach(pc)
+  buffer.append(pc, np.ones((3, 3)), np.full((3, 3), .5))
+  assert len(buffer) == len(pc.points) == len(pc.colors) == 5
+  assert np.array_equal(buffer.xyz, np.asarray(pc.points)) and np.allclose(buffer.rgb[2:], .5)
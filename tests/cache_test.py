@@ -0,0 +1,69 @@
+import os
+import json
+
+import numpy as np
+
+from src.core.cache import DownsampleCache, fingerprint
+from src.core.config import Config
+from src.core.voxel import VoxelGrid
+
+
+def test_put_get_evict(tmp_path):
+  cache = DownsampleCache(str(tmp_path), max_bytes=3000)
+  cache.put('abc', 'one', {'a': np.zeros(100)})
+  assert np.array_equal(cache.get('abc', 'one')['a'], np.zeros(100))
+  assert cache.get('abc', 'two') is None
+  assert cache.session == {'hits': 1, 'misses': 1, 'derived': 0}
+  assert not (tmp_path / 'stats.json').exists() # merged once at shutdown
+  cache.save_stats()
+  DownsampleCache(str(tmp_path)).save_stats() # nothing to merge
+  assert json.loads((tmp_path / 'stats.json').read_text()) == {'hits': 1, 'misses': 1, 'derived': 0}
+  cache.put('abc', 'two', {'a': np.zeros(300)})
+  cache.put('abc', 'three', {'a': np.zeros(300)})
+  assert len(cache.names('abc')) < 3 # evicted to stay under max_bytes
+
+
+def test_fingerprint(tmp_path):
+  f = tmp_path / 'a.csv'
+  f.write_text('1,2,3\n')
+  before = fingerprint([Config(file_path=str(f))])
+  assert before == fingerprint([Config(file_path=str(f))])
+  assert before != fingerprint([Config(file_path=str(f), skip_first_line=False)])
+  f.write_text('1,2,3\n4,5,6\n')
+  assert before != fingerprint([Config(file_path=str(f))])
+
+
+def test_coarsen():
+  xyz = np.random.default_rng(1).random((2000, 3)) * 10
+  fine = VoxelGrid.from_xyz(xyz, .5)
+  fine.values['v'] = fine.reduce(xyz[:, 0])
+  coarse, direct = fine.coarsen(2.), VoxelGrid.from_xyz(xyz, 2.)
+  assert len(coarse) == len(direct)
+  a, b = np.lexsort(coarse.ijk.T), np.lexsort(direct.ijk.T)
+  assert np.array_equal(coarse.counts[a], direct.counts[b])
+  assert np.allclose(coarse.xyz[a], direct.xyz[b])
+  assert np.allclose(coarse.values['v'][a], direct.xyz[b, 0])
+  assert np.array_equal(coarse.ijk[coarse.inverse], np.floor(xyz / 2.))
+
+
+def test_store_across_sessions(tmp_path, make_store):
+  store = make_store(cache=DownsampleCache(str(tmp_path)))
+  xyz, rgb = store.view(voxel_size=.5)
+
+  cache = DownsampleCache(str(tmp_path))
+  store = make_store(cache=cache)
+  xyz2, rgb2 = store.view(voxel_size=.5)
+  assert np.array_equal(xyz, xyz2) and np.array_equal(rgb, rgb2)
+  assert cache.session['hits'] == 1
+
+  # a hit does not write the grid again (a rewrite replaces the file)
+  path = next(tmp_path.rglob('*voxel-*.npz'))
+  inode = os.stat(path).st_ino
+  make_store(cache=DownsampleCache(str(tmp_path))).voxel_grid(.5)
+  assert os.stat(path).st_ino == inode
+
+  cache = DownsampleCache(str(tmp_path))
+  store = make_store(cache=cache)
+  xyz, _ = store.view(voxel_size=1.5)
+  assert cache.session['derived'] == 1
+  assert len(xyz) == len(VoxelGrid.from_xyz(store.xyz, 1.5))
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+from scipy.spatial import cKDTree
+
+from src.core.colormap import apply_colormap
+from src.core.compare import DistanceSummary, cloud_distances, load_xyz
+from src.core.config import Config
+from src.core.spatial import TileGrid
+
+
+def test_distances_are_exact():
+  rng = np.random.default_rng(0)
+  reference = rng.uniform(0, 10, (20_000, 3))
+  reference = reference[reference[:, 0] > 3] # nothing to match on a side of the compared points
+  xyz = rng.uniform(0, 10, (15_000, 3))
+  tree = cKDTree(reference)
+  tiles = TileGrid(xyz, .7)
+  d = cloud_distances(xyz, reference, tiles=tiles, workers=3)
+  assert np.allclose(d, tree.query(xyz)[0])
+  capped = cloud_distances(xyz, reference, max_distance=.3, tiles=tiles, workers=3)
+  assert np.array_equal(capped, tree.query(xyz, distance_upper_bound=.3)[0])
+  assert np.isinf(capped).sum() > 1000
+
+  summary = DistanceSummary.of(capped)
+  assert summary.points == 15_000 and summary.matched == np.isfinite(capped).sum() and summary.max <= .3
+  assert np.isinf(cloud_distances(xyz[:5], reference[:0])).all() and len(cloud_distances(xyz[:0], reference)) == 0
+
+
+def test_colormap():
+  colors = apply_colormap(np.array([-1., 0, .5, 1, 2, np.inf, np.nan]), 0, 1, 'gray')
+  assert np.allclose(colors[:, 0], [0, 0, .5, 1, 1, 1, .5]) and (colors[:, 0] == colors[:, 2]).all()
+  assert np.allclose(apply_colormap(np.zeros(2), 0, 1, 'jet'), [[0, 0, .5]] * 2)
+  with pytest.raises(ValueError, match='nope'):
+    apply_colormap(np.zeros(2), 0, 1, 'nope')
+
+
+def test_load_xyz(tmp_path):
+  (tmp_path / 'a.csv').write_text('x,y,z\n' + ''.join(f'{i},{-i},{i * 2}\n' for i in range(300)))
+  cfgs = [Config(str(tmp_path / 'a.csv'), pattern='{x},{y},{z}'), Config(str(tmp_path / 'b.csv'))]
+  xyz, unknown = load_xyz(cfgs, workers=2)
+  assert unknown == [cfgs[1]] and np.array_equal(xyz, np.c_[np.arange(300), -np.arange(300), 2 * np.arange(300)])
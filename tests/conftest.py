@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from src.core.config import Config
+from src.core.store import PointStore
+
+
+@pytest.fixture
+def make_store():
+  """
+  store of random (or given) points in [0, 10)³, with colors and ids 0 to 3 unless uncolored,
+  in `files` files of about as many rows unless spans are given, and cached as `abc` with a cache
+  """
+
+  def make(xyz=None, n=5000, spans=None, files=1, colored=True, cache=None):
+    rng = np.random.default_rng(0)
+    xyz = rng.random((n, 3)) * 10 if xyz is None else xyz
+    if spans is None:
+      bounds = np.linspace(0, len(xyz), files + 1).astype(int).tolist()
+      spans = list(zip(bounds[:-1], bounds[1:]))
+    if colored:
+      rgb, ids = rng.integers(0, 256, (len(xyz), 3)), rng.integers(0, 4, len(xyz))
+    else:
+      rgb, ids = -np.ones((len(xyz), 3)), -np.ones(len(xyz))
+    store = PointStore(xyz, rgb, ids, spans)
+    if cache is not None:
+      store.use_cache(cache, 'abc')
+    return store
+
+  return make
+
+
+@pytest.fixture
+def write_files():
+  """ write one csv file of (x, y, z) rows per size in a directory and return their configs """
+
+  def write(directory, sizes):
+    cfgs = []
+    for k, n in enumerate(sizes):
+      (directory / f'f{k}.csv').write_text('x,y,z\n' + ''.join(f'{k},{i},{i * 2}\n' for i in range(n)))
+      cfgs.append(Config(str(directory / f'f{k}.csv'), pattern='{x},{y},{z}'))
+    return cfgs
+
+  return write
+
+
+@pytest.fixture
+def write_file():
+  """ write a csv file of n (x, y, z, id) rows and return its config """
+
+  def write(path, n, header=True, newline=True):
+    rows = '\n'.join(f'{i},{i % 97},{-i},{i % 5}' for i in range(n))
+    path.write_text(('x,y,z,id\n' if header else '') + rows + ('\n' if newline and n else ''))
+    return Config(str(path), (10, 0, 0), '{x},{y},{z},{id}', header)
+
+  return write
+
+
+@pytest.fixture
+def make_points():
+  """ (n, 9) random points (x, y, z, r, g, b, id, t, i), half of them colored, some with a time or a scalar """
+
+  def make(n, seed=0):
+    rng = np.random.default_rng(seed)
+    data = np.full((n, 9), -1.)
+    data[:, :3] = rng.uniform(-5, 7, (n, 3))
+    data[:n // 2, 3:6] = rng.random((n // 2, 3))
+    data[:, 6] = rng.integers(0, 4, n)
+    data[:, 7] = np.where(rng.random(n) < .3, rng.random(n), np.nan)
+    data[:, 8] = np.where(rng.random(n) < .6, rng.gamma(2, 50, n), np.nan)
+    return data
+
+  return make
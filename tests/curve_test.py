@@ -0,0 +1,70 @@
+import numpy as np
+
+from src.core import curve
+from src.core.cache import DownsampleCache
+from src.core.curve import CurveIndex, hilbert_keys, morton_keys, sort_keys
+from src.core.pipeline import Pipeline, Reorder
+from src.core.store import PointStore
+
+
+def cube(bits: int) -> np.ndarray:
+  side = np.arange(1 << bits, dtype=np.uint64)
+  return np.stack(np.meshgrid(side, side, side, indexing='ij'), axis=-1).reshape(-1, 3)
+
+
+def test_morton_keys():
+  cells = np.array([[1, 0, 0], [0, 1, 0], [0, 0, 1], [3, 0, 0], [2**21 - 1] * 3], dtype=np.uint64)
+  assert morton_keys(cells).tolist() == [1, 2, 4, 9, 2**63 - 1]
+  assert len(np.unique(morton_keys(cube(3)))) == 512
+
+
+def test_hilbert_keys():
+  cells = cube(3)
+  keys = hilbert_keys(cells, 3)
+  assert np.array_equal(np.sort(keys), np.arange(512))
+  path = cells[np.argsort(keys)].astype(np.int64)
+  assert np.all(np.abs(np.diff(path, axis=0)).sum(axis=1) == 1) # consecutive cells are neighbours
+
+
+def test_sort_keys(monkeypatch):
+  keys = np.random.default_rng(0).integers(0, 2**40, 50_000).astype(np.uint64)
+  keys[::7] = keys[0]
+  monkeypatch.setattr(curve, 'PARALLEL_MIN_KEYS', 0)
+  assert np.array_equal(sort_keys(keys, 4), np.argsort(keys, kind='stable'))
+
+
+def test_reorder_and_crop():
+  rng = np.random.default_rng(1)
+  xyz = rng.random((20_000, 3)) * (100, 50, 10)
+  spans = [(0, 12_000), (12_000, 20_000)]
+  store = PointStore(xyz, rng.random((20_000, 3)) * 255, np.repeat([0., 1.], [12_000, 8_000]), spans)
+  store.fields['normals'] = xyz.copy()
+  for name in ('morton', 'hilbert'):
+    stage = Reorder(curve=name, block=256)
+    out = stage.apply(store, stage.compute(store, None, 2))
+    assert out.spans == spans and np.array_equal(out.xyz, out.fields['normals'])
+    assert (out.ids[:12_000] == 0).all() and (out.ids[12_000:] == 1).all() # rows stay in their file
+    keys = out.curve.keys(out.xyz)
+    assert all(np.all(np.diff(keys[a:b].astype(np.float64)) >= 0) for a, b in spans)
+
+    lo, hi = np.array([10., 5, 2]), np.array([20., 15, 4])
+    expected = np.flatnonzero(np.all((out.xyz >= lo) & (out.xyz <= hi), axis=1))
+    assert np.array_equal(out.crop(lo, hi), expected)
+    subset = out.take(np.arange(0, len(out), 3))
+    inside = np.all((subset.xyz >= lo) & (subset.xyz <= hi), axis=1)
+    assert np.array_equal(subset.crop(lo, hi), np.flatnonzero(inside))
+    if name == 'morton': # only a few blocks are scanned
+      assert sum(s.stop - s.start for s in out.curve.box(lo, hi)) < len(store) // 4
+
+
+def test_reorder_cached_and_saved(tmp_path):
+  xyz = np.random.default_rng(2).random((5000, 3))
+  pipeline = Pipeline.from_json([{'stage': 'reorder', 'block': 100}, {'stage': 'radius_outlier', 'nb_points': 1}])
+  cache = DownsampleCache(str(tmp_path / 'cache'))
+  first, key = pipeline.run(PointStore(xyz, -np.ones((5000, 3)), -np.ones(5000)), cache, 'abc')
+  second, _ = pipeline.run(PointStore(xyz, -np.ones((5000, 3)), -np.ones(5000)), cache, 'abc')
+  assert np.array_equal(first.xyz, second.xyz) and len(second.curve) == 50
+  second.curve.save(str(tmp_path / 'points.curve.npz'))
+  with np.load(tmp_path / 'points.curve.npz') as arrays:
+    loaded = CurveIndex.from_arrays(dict(arrays))
+  assert loaded.curve == 'morton' and np.array_equal(loaded.ranges, second.curve.ranges)
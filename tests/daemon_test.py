@@ -0,0 +1,73 @@
+import os
+import json
+import time
+import threading
+from argparse import Namespace
+
+import numpy as np
+import pytest
+
+from src.core.daemon import Daemon, DaemonClient
+
+
+def start_daemon(tmp_path, workers=1):
+  for k in range(2):
+    (tmp_path / f'f{k}.csv').write_text('x,y,z,id\n' + ''.join(f'{k},{i},{i * 2},{i % 3}\n' for i in range(10)))
+  (tmp_path / 'cfg.json').write_text(
+    json.dumps({
+      'default': {'pattern': '{x},{y},{z},{id}', 'skip_first_line': True},
+      'configs': [{'file_path': str(tmp_path / f'f{k}.csv')} for k in range(2)],
+    }))
+  args = Namespace(cfg=str(tmp_path / 'cfg.json'), verbose=False, socket=str(tmp_path / 'pcv.sock'), only=None,
+                   workers=workers, cache_dir=None, cache_size=1 << 20, no_cache=True)
+  daemon = Daemon(args)
+  if workers is None:
+    assert daemon.workers == (os.cpu_count() or 1)
+  thread = threading.Thread(target=daemon.run)
+  thread.start()
+  for _ in range(500):
+    if os.path.exists(args.socket):
+      break
+    time.sleep(.01)
+  return thread, args.socket
+
+
+def test_daemon(tmp_path):
+  thread, path = start_daemon(tmp_path)
+  try:
+    with DaemonClient(path, timeout=10) as client:
+      stats = client.stats()
+      assert stats['points'] == 20 and stats['spans'] == [[0, 10], [10, 20]] and stats['ids'] == 3
+
+      store, key = client.store()
+      assert len(store) == 20 and key == stats['fingerprint']
+      assert not store.xyz.flags.writeable # view on the daemon memory
+
+      rows = client.bbox([1, None, None], [None, 4, None])
+      assert np.array_equal(rows, [10, 11, 12, 13, 14])
+      assert np.array_equal(client.ids([0]), np.flatnonzero(np.arange(20) % 10 % 3 == 0))
+
+      xyz, rgb = client.sample()
+      assert np.array_equal(xyz, store.xyz) and rgb.shape == (20, 3)
+      xyz, _ = client.sample(frac=.5)
+      assert len(xyz) == 10
+
+      out = client.export(str(tmp_path / 'out.npy'), voxel_size=100)
+      assert out['points'] == 1 and np.load(tmp_path / 'out.npy').shape == (1, 6)
+
+      with pytest.raises(RuntimeError, match='unknown operation'):
+        client.request('nope')
+      client.request('shutdown')
+  finally:
+    thread.join(timeout=10)
+  assert not thread.is_alive() and not os.path.exists(path)
+
+
+def test_daemon_default_workers(tmp_path):
+  thread, path = start_daemon(tmp_path, workers=None)
+  try:
+    with DaemonClient(path, timeout=10) as client:
+      assert client.stats()['points'] == 20
+      client.request('shutdown')
+  finally:
+    thread.join(timeout=10)
@@ -0,0 +1,68 @@
+import os
+import time
+
+import numpy as np
+import pytest
+
+from src.core.journal import Journal
+from src.core.loader import iter_chunks, load_file
+from src.core.progressive import ChunkLoader
+
+
+def test_checkpoint_and_resume(tmp_path, write_files):
+  cfgs = write_files(tmp_path, [25, 12])
+  save = str(tmp_path / 'out.npy')
+  journal = Journal.open(save, 'key', every=10)
+  for chunk in iter_chunks(cfgs[0], rows=4):
+    journal.add(0, chunk)
+  journal.finish(0)
+  for chunk in iter_chunks(cfgs[1], rows=4):
+    journal.add(1, chunk)
+    break
+  journal.flush() # cancelled after the first chunk of the second file
+  assert journal.start(0) is None and journal.start(1) == 4 and journal.rows() == 29
+
+  resumed = Journal.open(save, 'key', resume=True, every=10)
+  assert resumed.finished == {0} and resumed.start(1) == 4
+  assert [(start, stop) for start, stop, _ in resumed.parts[0]] == [(0, 12), (12, 24), (24, 25)]
+  assert np.array_equal(np.concatenate(resumed.load(0)), load_file(cfgs[0]), equal_nan=True)
+
+  loader = ChunkLoader(cfgs, rows=5, starts=[resumed.start(0), resumed.start(1)]).start()
+  rest = []
+  while not loader.done:
+    rest.extend(c.data for c in loader.poll(budget=.1) if c.data is not None)
+    time.sleep(.001)
+  assert sum(map(len, rest)) == 8 # only the rows left of the second file
+  data = np.concatenate(resumed.load(1) + rest)
+  assert np.array_equal(data, load_file(cfgs[1]), equal_nan=True)
+
+  resumed.remove()
+  assert not os.path.exists(resumed.directory)
+
+
+def test_damaged_journal(tmp_path, write_files):
+  cfg, = write_files(tmp_path, [30])
+  save = str(tmp_path / 'out.npy')
+  journal = Journal.open(save, 'key', every=10)
+  for chunk in iter_chunks(cfg, rows=10):
+    journal.add(0, chunk)
+  journal.finish(0)
+  with open(journal.path, 'a', encoding='utf-8') as f:
+    f.write('{"file": 1, "sta') # killed while writing an entry
+
+  assert Journal.open(save, 'key', resume=True).finished == {0}
+  os.remove(os.path.join(journal.directory, journal.parts[0][1][2]))
+  resumed = Journal.open(save, 'key', resume=True)
+  assert resumed.start(0) == 10 and not resumed.finished # parsed again after the missing part
+
+  with pytest.raises(ValueError, match='other input files'):
+    Journal.open(save, 'other', resume=True)
+  assert Journal.open(save, 'other').start(0) == 0 # without --resume, the checkpoints are discarded
+
+
+def test_foreign_directory(tmp_path):
+  (tmp_path / 'out.parts').mkdir()
+  (tmp_path / 'out.parts' / 'keep.txt').write_text('not a checkpoint')
+  with pytest.raises(ValueError, match='holds no journal'):
+    Journal.open(str(tmp_path / 'out.npy'), 'key')
+  assert (tmp_path / 'out.parts' / 'keep.txt').read_text() == 'not a checkpoint'
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from src.core.layers import LayerSet
+
+
+def test_file_layers(make_store):
+  store = make_store(n=3000, spans=[(0, 1000), (1000, 3000)])
+  layers = LayerSet(store, 'file', ['a.csv', 'b.csv'], workers=2)
+  layers.build()
+  assert [layer.name for layer in layers] == ['a.csv', 'b.csv'] and [len(layer) for layer in layers] == [1000, 2000]
+  assert np.array_equal(np.asarray(layers[1].pc.points), store.xyz[1000:])
+  assert np.allclose(np.asarray(layers[0].pc.colors), store.colors()[:1000])
+
+  layers.build(frac=.25)
+  points = np.concatenate([np.asarray(layer.pc.points) for layer in layers])
+  expected = store.xyz[np.sort(store.sample(.25))]
+  assert len(points) == 750 and np.array_equal(points, expected) # the same sample as the whole store
+
+  layers.build(voxel_size=5.)
+  assert all(len(layer) <= 8 for layer in layers)
+  assert len(layers.to_array()) == sum(map(len, layers))
+
+
+def test_id_layers_and_toggles(make_store):
+  store = make_store(n=3000, spans=[(0, 1000), (1000, 3000)])
+  layers = LayerSet(store, 'id')
+  layers.build()
+  assert [layer.name for layer in layers] == ['id 0', 'id 1', 'id 2', 'id 3']
+  for k, layer in enumerate(layers):
+    assert np.array_equal(np.asarray(layer.pc.points), store.xyz[store.ids == k])
+
+  others = [np.asarray(layer.pc.colors).copy() for layer in layers]
+  layers.recolor(layers[2])
+  assert np.allclose(np.asarray(layers[2].pc.colors), layers[2].color)
+  for k in (0, 1, 3): # untouched
+    assert np.array_equal(np.asarray(layers[k].pc.colors), others[k])
+  layers.recolor(layers[2])
+  assert np.allclose(np.asarray(layers[2].pc.colors), others[2])
+
+  assert layers.select(-1) is layers[3] and layers.select(1) is layers[0]
+  assert len(layers.solo(layers[1])) == 3 and [layer.visible for layer in layers] == [False, True, False, False]
+  assert len(layers.to_array()) == len(layers[1])
+  layers.solo(layers[1])
+  assert all(layer.visible for layer in layers)
+  with pytest.raises(ValueError, match='tile'):
+    LayerSet(store, 'tile')
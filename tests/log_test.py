@@ -0,0 +1,92 @@
+import io
+import logging
+import multiprocessing
+from logging.handlers import QueueListener
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from src.log.fmt import AsyncHandler, RepeatFilter, UsefulFormatter, UselessHandler
+from src.log.logger import init_worker_logger
+
+
+def make_logger(name, handler):
+  log = logging.getLogger(name)
+  log.handlers, log.propagate = [handler], False
+  log.setLevel(logging.DEBUG)
+  return log
+
+
+def log_from_worker(i):
+  logging.getLogger('worker').info('part %d', i)
+  return i
+
+
+def test_formatter_cache():
+  fmt = UsefulFormatter(colored_output=False)
+  record = logging.makeLogRecord({'name': 'core.App', 'levelno': logging.WARNING, 'levelname': 'WARNING', 'msg': 'a %d',
+                                  'args': (1,)})
+  first = fmt.format(record)
+  assert first.endswith(' WARNING  core.App a 1')
+  assert fmt.format(record) == first and len(fmt._UsefulFormatter__formatters) == 1
+  record.name = 'pipeline.Stage' # wider names widen the column of the next records
+  assert fmt.format(record).endswith(' pipeline.Stage a 1') and len(fmt._UsefulFormatter__formatters) == 2
+
+
+def test_repeat_filter():
+  stream = io.StringIO()
+  handler = UselessHandler(stream)
+  repeats = RepeatFilter(burst=3, period=60)
+  handler.addFilter(repeats)
+  log = make_logger('test.repeats', handler)
+  for i in range(1000):
+    log.warning('bad line %d', i)
+  log.info('other')
+  assert stream.getvalue().splitlines() == ['bad line 0', 'bad line 1', 'bad line 2', 'other']
+  [last] = repeats.pending()
+  assert last.getMessage() == 'bad line 999 (last of 997 similar messages)' and not repeats.pending()
+
+  for i in range(10):
+    log.warning('bad line %d', i)
+  repeats.period = 0 # a new period : the next record carries the count
+  log.warning('bad line %d', 10)
+  assert stream.getvalue().splitlines()[-1] == 'bad line 10 (and 10 similar messages in the last 0 s)'
+
+
+def test_async_handler():
+  stream = io.StringIO()
+  handler = AsyncHandler(UselessHandler(stream, exit_on_critical=False)).start()
+  log = make_logger('test.async', handler)
+  for i in range(10_000):
+    log.info('%d', i)
+  with pytest.raises(SystemExit): # after every pending record
+    log.critical('stop')
+  assert stream.getvalue().splitlines() == [str(i) for i in range(10_000)] + ['stop']
+  log.info('after') # written synchronously once stopped
+  assert stream.getvalue().endswith('after\n')
+
+
+def test_async_flush():
+  stream = io.StringIO()
+  handler = AsyncHandler(UselessHandler(stream, exit_on_critical=False)).start()
+  log = make_logger('test.flush', handler)
+  values = [0]
+  for i in range(1000):
+    log.info('%s', values) # merged when logged, not when written
+    values[0] = i + 1
+  handler.flush()
+  assert stream.getvalue().splitlines() == [f'[{i}]' for i in range(1000)]
+  log.info('still running')
+  handler.stop()
+  assert stream.getvalue().endswith('still running\n')
+
+
+def test_worker_logging():
+  stream = io.StringIO()
+  queue = multiprocessing.Queue()
+  listener = QueueListener(queue, UselessHandler(stream, exit_on_critical=False))
+  listener.start()
+  with ProcessPoolExecutor(max_workers=2, initializer=init_worker_logger, initargs=(queue, logging.INFO)) as pool:
+    assert list(pool.map(log_from_worker, range(4))) == list(range(4))
+  listener.stop()
+  assert sorted(stream.getvalue().splitlines()) == [f'part {i}' for i in range(4)]
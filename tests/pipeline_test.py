@@ -0,0 +1,166 @@
+import logging
+
+import numpy as np
+import pytest
+from scipy.spatial import cKDTree
+
+from src.core import dedup
+from src.core.cluster import cluster_points, union_find
+from src.core.cache import DownsampleCache
+from src.core.pipeline import Pipeline, Stage, Clustering, Deduplication, NormalEstimation, RadiusOutlierRemoval, StatisticalOutlierRemoval
+from src.core.spatial import TileGrid, run_tiled
+from src.core.store import PointStore
+
+
+def plane(n: int = 4000, seed: int = 0) -> np.ndarray:
+  rng = np.random.default_rng(seed)
+  xyz = rng.random((n, 3)) * (10, 10, 0)
+  xyz[:, 2] = .01 * rng.standard_normal(n)
+  return xyz
+
+
+def test_tiled_matches_global():
+  xyz = plane()
+  xyz[:10] += (0, 0, 50) # isolated points, their neighbours are out of the halo
+
+  def func(tree, query):
+    d, _ = tree.query(query, k=8)
+    return {'d': d}, d[:, -1]
+
+  tiles = TileGrid(xyz, 1.)
+  assert len(tiles) > 50
+  assert np.array_equal(np.sort(np.concatenate([tiles.core(t) for t in range(len(tiles))])), np.arange(len(xyz)))
+  tiled = run_tiled(xyz, func, .2, tiles, workers=4)['d']
+  expected, _ = cKDTree(xyz).query(xyz, k=8)
+  assert np.allclose(tiled, expected)
+
+
+def test_outlier_removal(make_store):
+  xyz = np.concatenate((plane(), [[5, 5, 20], [-30, 0, 0], [40, 40, 40]]))
+  store = make_store(xyz, files=2, colored=False)
+  tiles = TileGrid(xyz, 2.)
+  for stage in (StatisticalOutlierRemoval(), RadiusOutlierRemoval(nb_points=4, radius=.5)):
+    out = stage.apply(store, stage.compute(store, tiles, 2))
+    assert len(store) - 50 < len(out) <= len(store) - 3
+    assert not np.isin([20., 40.], out.xyz[:, 2]).any() and out.xyz[:, 0].min() >= 0
+    assert out.spans[0][0] == 0 and out.spans[0][1] == out.spans[1][0] and out.spans[1][1] == len(out)
+
+
+def test_normals(make_store):
+  store = make_store(plane(), files=2, colored=False)
+  stage = NormalEstimation(knn=16)
+  out = stage.apply(store, stage.compute(store, TileGrid(store.xyz, 2.), 2))
+  normals = out.fields['normals']
+  assert normals.shape == (len(store), 3)
+  assert np.all(normals[:, 2] > .95)
+  assert len(out.take(np.arange(10)).fields['normals']) == 10
+
+
+def test_pipeline_cache(tmp_path, caplog, make_store):
+  pipeline = Pipeline.from_json({'stages': [{'stage': 'radius_outlier', 'nb_points': 2, 'radius': .5},
+                                            {'stage': 'normals'}], 'tile_size': 2.})
+  cache = DownsampleCache(str(tmp_path))
+  xyz = np.concatenate((plane(), [[50, 50, 50]]))
+  first, key = pipeline.run(make_store(xyz, files=2, colored=False), cache, 'abc')
+  with caplog.at_level(logging.INFO, logger='pipeline'):
+    second, again = pipeline.run(make_store(xyz, files=2, colored=False), cache, 'abc')
+  assert key == again and key != 'abc'
+  assert len(first) == len(second) == len(xyz) - 1
+  assert np.array_equal(first.fields['normals'], second.fields['normals'])
+  assert sum('(cached)' in r.message for r in caplog.records) == 2
+
+
+def test_pipeline_from_json():
+  assert len(Pipeline.from_json([{'stage': 'normals', 'knn': 10}])) == 1
+  for bad in ([{'stage': 'nope'}], [{'stage': 'normals', 'nope': 1}], {'stages': [], 'nope': 1},
+              [{'stage': 'dedup', 'policy': 'nope'}], [{'stage': 'dedup', 'tolerance': 0}]):
+    with pytest.raises(ValueError):
+      Pipeline.from_json(bad)
+
+
+def test_stage_parameters():
+  bad = [(StatisticalOutlierRemoval, {'nb_neighbors': 0}), (StatisticalOutlierRemoval, {'std_ratio': 'a'}),
+         (StatisticalOutlierRemoval, {'halo': -1.}), (RadiusOutlierRemoval, {'nb_points': 1.5}),
+         (RadiusOutlierRemoval, {'radius': 0}), (NormalEstimation, {'knn': 'a'}),
+         (NormalEstimation, {'radius': float('nan')}), (NormalEstimation, {'halo': True})]
+  for stage, params in bad:
+    with pytest.raises(ValueError, match='must be'):
+      stage(**params)
+  assert NormalEstimation(knn=1, radius=.5).radius == .5
+  with pytest.raises(ValueError, match='knn must be an integer >= 1'):
+    Pipeline.from_json([{'stage': 'normals', 'knn': 'a'}])
+  with pytest.raises(TypeError):
+    Stage() # pylint: disable=abstract-class-instantiated
+
+
+def overlapping_tiles() -> PointStore:
+  # second file overlaps the first one on x in [5, 10], with slightly moved copies of the same points
+  first = np.round(plane(2000), 3) # on the centers of the cells
+  second = first[first[:, 0] >= 5] + 1e-4
+  xyz = np.concatenate((first, second, plane(500, seed=1) + (10, 0, 0)))
+  rgb = np.full((len(xyz), 3), -1.)
+  rgb[:len(first)] = 100
+  rgb[len(first):len(first) + len(second)] = 200
+  ids = np.concatenate((np.zeros(len(first)), np.ones(len(second)), np.zeros(500)))
+  spans = [(0, len(first)), (len(first), len(first) + len(second)), (len(first) + len(second), len(xyz))]
+  return PointStore(xyz, rgb, ids, spans)
+
+
+def test_dedup_policies(monkeypatch):
+  store = overlapping_tiles()
+  lost = store.spans[1][1] - store.spans[1][0]
+  stage = Deduplication(tolerance=.001)
+  out = stage.apply(store, stage.compute(store, TileGrid(store.xyz, 2.), 1))
+  assert len(out) == len(store) - lost and out.spans[1] == (2000, 2000)
+  assert stage.describe(store, out).endswith(f'(per file #0: 0, #1: {lost:_}, #2: 0)')
+
+  out = Deduplication(policy='max_id').apply(store, Deduplication(policy='max_id').compute(store, None, 1))
+  assert len(out) == len(store) - lost and (out.ids == 1).sum() == lost
+
+  stage = Deduplication(policy='avg_color')
+  out = stage.apply(store, stage.compute(store, None, 1))
+  assert (out.rgb[:2000] == 150).all(axis=1).sum() == lost and (out.rgb[2000:] == -1).all()
+
+  # same result from the worker processes
+  monkeypatch.setattr(dedup, 'PARALLEL_MIN_POINTS', 0)
+  for policy in dedup.POLICIES:
+    serial = dedup.deduplicate(store.xyz, store.ids, store.rgb, .001, policy, 1)
+    parallel = dedup.deduplicate(store.xyz, store.ids, store.rgb, .001, policy, 3)
+    assert np.array_equal(serial[0], parallel[0])
+    assert (serial[1] is None and parallel[1] is None) or np.array_equal(serial[1], parallel[1])
+
+
+def test_partition():
+  ijk = dedup.quantize(np.concatenate((plane(1000), plane(1000))), .01)
+  rows, bounds = dedup.partition(ijk, 7)
+  assert np.array_equal(np.sort(rows), np.arange(len(ijk))) and bounds[-1] == len(ijk)
+  for start, stop in zip(bounds[:-1], bounds[1:]):
+    part = rows[start:stop]
+    assert np.all(np.diff(part) > 0)
+    assert np.isin(part[part < 1000] + 1000, part).all() # a duplicate is in the partition of its original
+
+
+def test_union_find():
+  roots = union_find(np.arange(7), np.array([5, 1, 3, 6]), np.array([3, 2, 1, 6]))
+  assert roots.tolist() == [0, 1, 1, 1, 4, 1, 6]
+  assert union_find(np.array([0, 0, 2, 2]), np.array([1]), np.array([3])).tolist() == [0, 0, 0, 0]
+
+
+def test_clustering(make_store):
+  rng = np.random.default_rng(0)
+  blobs = [rng.normal(c, .3, (n, 3)) for c, n in (((0, 0, 0), 3000), ((10, 0, 0), 2000), ((0, 40, 5), 1000))]
+  noise = np.array([[20., 20, 20], [-20, 5, 0]])
+  xyz = np.concatenate(blobs + [noise])
+  ids = cluster_points(xyz, .5, min_size=5)
+  assert ids[:3000].tolist() == [1] * 3000 and ids[3000:5000].tolist() == [2] * 2000
+  assert ids[5000:6000].tolist() == [3] * 1000 and ids[6000:].tolist() == [-1, -1]
+  for tile_size in (.5, 3., 100.):
+    assert np.array_equal(cluster_points(xyz, .5, min_size=5, tile_size=tile_size, workers=3), ids)
+
+  store = make_store(xyz, files=2, colored=False)
+  stage = Clustering(voxel_size=.5, min_size=5)
+  out = stage.apply(store, stage.compute(store, TileGrid(xyz, 2.), 2))
+  assert np.array_equal(out.ids, ids) and not np.allclose(out.colors()[0], out.colors()[3000])
+  assert stage.describe(store, out) == 'found 3 clusters (2 points in none)'
+  with pytest.raises(ValueError, match='voxel size'):
+    Clustering(voxel_size=0)
@@ -0,0 +1,50 @@
+import os
+
+import numpy as np
+
+from src.core.ply import ply_dtype, write_ply
+
+
+def read_ply(path):
+  data = open(path, 'rb').read()
+  end = data.index(b'end_header\n') + len(b'end_header\n')
+  header = data[:end].decode('ascii').splitlines()
+  types = {'double': '<f8', 'float': '<f4', 'uchar': 'u1', 'short': '<i2', 'int': '<i4'}
+  fields = [(line.split()[2], types[line.split()[1]]) for line in header if line.startswith('property')]
+  n = int(next(line for line in header if line.startswith('element vertex')).split()[2])
+  return header, np.frombuffer(data[end:], dtype=np.dtype(fields), count=n)
+
+
+def test_write_ply(tmp_path):
+  rng = np.random.default_rng(0)
+  xyz = rng.normal(size=(1000, 3)) * 1e5
+  colors = rng.random((1000, 3))
+  ids = rng.integers(-1, 40, 1000).astype(np.float64)
+  scalar = np.where(rng.random(1000) < .5, rng.random(1000), np.nan)
+  umask = os.umask(0o022)
+  try:
+    size = write_ply(str(tmp_path / 'a' / 'b.ply'), xyz, colors, ids, scalar, rows=64)
+  finally:
+    os.umask(umask)
+  header, vertices = read_ply(tmp_path / 'a' / 'b.ply')
+  assert header[:2] == ['ply', 'format binary_little_endian 1.0'] and 'element vertex 1000' in header
+  assert size == len('\n'.join(header)) + 1 + 1000 * (3 * 8 + 3 + 2 + 4)
+  assert np.array_equal(np.c_[vertices['x'], vertices['y'], vertices['z']], xyz)
+  assert np.array_equal(np.c_[vertices['red'], vertices['green'], vertices['blue']], np.rint(colors * 255))
+  assert np.array_equal(vertices['id'], ids) and np.array_equal(vertices['scalar'], scalar.astype(np.float32), equal_nan=True)
+  assert os.listdir(tmp_path / 'a') == ['b.ply'] and os.stat(tmp_path / 'a' / 'b.ply').st_mode & 0o777 == 0o644
+
+  # colors computed chunk by chunk, no optional property
+  calls = []
+  chunk_colors = lambda start, stop: calls.append((start, stop)) or colors[start:stop]
+  write_ply(str(tmp_path / 'c.ply'), xyz, chunk_colors, rows=300)
+  header, vertices = read_ply(tmp_path / 'c.ply')
+  assert calls == [(0, 300), (300, 600), (600, 900), (900, 1000)] and vertices.dtype.names[-1] == 'blue'
+  write_ply(str(tmp_path / 'd.ply'), xyz[:0], colors[:0])
+  assert read_ply(tmp_path / 'd.ply')[1].size == 0
+
+
+def test_ply_dtype():
+  assert ply_dtype(np.array([-1., 32767.]))['id'] == np.dtype('<i2')
+  assert ply_dtype(np.array([-1., 40000.]))['id'] == np.dtype('<i4')
+  assert ply_dtype().names == ('x', 'y', 'z', 'red', 'green', 'blue')
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from src.core import preview
+from src.core.config import Config
+from src.core.loader import load_file
+from src.core.preview import preview_file
+
+
+def test_preview_lines(tmp_path, monkeypatch, write_file):
+  monkeypatch.setattr(preview, 'READ_SIZE', 256) # windows need several reads
+  cfg = write_file(tmp_path / 'big.csv', 200_000)
+  full = load_file(cfg)
+  for stratified in (True, False):
+    data, stats = preview_file(cfg, windows=20, lines=50, stratified=stratified, seed=3)
+    assert len(data) == stats.points == 1000 and stats.windows == 20
+    rows = data[:, 0].astype(int) - 10
+    assert len(np.unique(rows)) == len(rows)                # no line is parsed twice
+    assert np.array_equal(data, full[rows], equal_nan=True)                 # whole lines only, offset applied
+    assert np.all(np.diff(rows) > 0) and rows.max() > 150_000 # spread over the file
+    assert stats.bytes_read < stats.file_size / 20 and stats.ratio == stats.bytes_read / stats.file_size
+
+
+def test_preview_small_file(tmp_path, write_file):
+  for header in (True, False):
+    cfg = write_file(tmp_path / 'small.csv', 30, header)
+    data, stats = preview_file(cfg, windows=50, lines=10)
+    full = load_file(cfg)
+    # every line once, the header skipped (the first line only starts a window at offset 0)
+    assert len(data) >= len(full) - 1 and np.array_equal(data, full[-len(data):], equal_nan=True)
+    assert stats.bytes_read >= stats.file_size
+
+  (tmp_path / 'bad.csv').write_text('1,2,3,4\n' * 100 + 'a,b,c,d\n' * 100)
+  with pytest.raises(ValueError, match=r'bad\.csv, byte'):
+    preview_file(Config(str(tmp_path / 'bad.csv'), pattern='{x},{y},{z},{id}', skip_first_line=False))
@@ -0,0 +1,48 @@
+import time
+
+import numpy as np
+
+from src.core.config import Config
+from src.core.loader import iter_chunks, load_file
+from src.core.progressive import ChunkLoader, Throttle
+
+
+def drain(loader):
+  chunks = []
+  while not loader.done:
+    chunks.extend(loader.poll(budget=.1))
+    time.sleep(.001)
+  return chunks
+
+
+def test_iter_chunks(tmp_path, write_files):
+  cfg, = write_files(tmp_path, [25])
+  sizes = [len(c) for c in iter_chunks(cfg, rows=10)]
+  assert sizes == [10, 10, 5]
+  assert np.array_equal(np.concatenate(list(iter_chunks(cfg, rows=10))), load_file(cfg), equal_nan=True)
+
+
+def test_loader_order(tmp_path, write_files):
+  cfgs = write_files(tmp_path, [25, 0, 7])
+  cfgs.insert(1, Config(str(tmp_path / 'missing.csv'), pattern='{x},{y},{z}'))
+  loader = ChunkLoader(cfgs, rows=10, maxsize=2).start()
+  chunks = drain(loader)
+  assert [(c.index, None if c.data is None else len(c.data)) for c in chunks] == \
+    [(0, 10), (0, 10), (0, 5), (0, None), (1, None), (2, None), (3, 7), (3, None)]
+  assert isinstance(chunks[4].error, FileNotFoundError)
+  assert np.array_equal(chunks[6].data[:, 0], np.full(7, 2))
+
+
+def test_loader_cancel(tmp_path, write_files):
+  loader = ChunkLoader(write_files(tmp_path, [1000]), rows=1, maxsize=1).start()
+  time.sleep(.05)
+  assert loader.queue.full() # blocked by the bounded queue
+  loader.cancel()
+  assert loader.queue.empty()
+
+
+def test_throttle():
+  throttle = Throttle(hz=10)
+  assert throttle.ready() and not throttle.ready()
+  time.sleep(.11)
+  assert throttle.ready()
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from src.core.config import Config
+from src.core.raster import BANDS, Raster, collect_raster
+
+
+def brute_force(data, cell):
+  i, j = np.floor(data[:, 0] / cell).astype(int), np.floor(data[:, 1] / cell).astype(int)
+  rows, cols = j.max() - j, i - i.min()
+  grids = np.full((5, rows.max() + 1, cols.max() + 1), np.nan)
+  grids[0], grids[4] = 0, -1
+  for r, c in set(zip(rows, cols)):
+    z, ids = data[(rows == r) & (cols == c), 2], data[(rows == r) & (cols == c), 6].astype(int)
+    grids[:, r, c] = len(z), z.min(), z.max(), z.mean(), np.bincount(ids).argmax()
+  return grids
+
+
+def test_merge_is_exact(make_points):
+  data = make_points(20_000)
+  whole = Raster.of(data, .75)
+  assert whole.points == 20_000 and len(whole) == 17 * 17
+  parts = [Raster.of(p, .75) for p in np.array_split(data, [3, 5000, 5001, 12000])]
+  for merged in (Raster(.75).merge(*parts), parts[4].merge(parts[2]).merge(parts[0], parts[3].merge(parts[1]))):
+    for a, b in zip(merged.to_grids()[0], whole.to_grids()[0]):
+      assert np.allclose(a, b, equal_nan=True)
+  grids, georeference = whole.to_grids()
+  assert np.allclose(grids, brute_force(data, .75), equal_nan=True)
+  assert georeference['origin'] == [-5.25, 7.5] and georeference['shape'] == [17, 17]
+  assert georeference['geotransform'] == [-5.25, .75, 0., 7.5, 0., -.75] and georeference['bands'] == list(BANDS)
+  with pytest.raises(ValueError, match='cell sizes'):
+    whole.merge(Raster(1.))
+
+
+def test_sparse_cells(make_points):
+  data = make_points(4)
+  data[:, :3] = [[0, 0, 1], [0.5, 0.2, 3], [10, -4, 2], [0.1, 0.1, 2]]
+  data[:, 6] = [2, 1, 5, 1]
+  grids, _ = Raster.of(data, 1.).to_grids()
+  assert grids.shape == (5, 5, 11) and np.nansum(grids[0]) == 4 and np.isnan(grids[1]).sum() == 53
+  assert grids[:, 0, 0].tolist() == [3, 1, 3, 2, 1] and grids[:, 4, 10].tolist() == [1, 2, 2, 2, 5]
+  assert Raster(1.).to_grids()[0].shape == (5, 0, 0)
+
+
+def test_collect_raster(tmp_path):
+  cfgs = []
+  for k, n in enumerate([3000, 10]):
+    (tmp_path / f'f{k}.csv').write_text('x,y,z,id\n' + ''.join(f'{i % 7},{k},{i * .5},{i % 3}\n' for i in range(n)))
+    cfgs.append(Config(str(tmp_path / f'f{k}.csv'), pattern='{x},{y},{z},{id}'))
+  cfgs.append(Config(str(tmp_path / 'missing.csv'), pattern='{x},{y},{z}'))
+
+  raster, unknown = collect_raster(cfgs, 2., workers=3)
+  assert unknown == [cfgs[2]] and raster.points == 3010
+  grids, georeference = raster.to_grids()
+  assert grids.shape == (5, 1, 4) and georeference['origin'] == [0., 2.]
+  assert grids[0, 0].tolist() == [862, 861, 858, 429] and grids[1, 0, 0] == 0 and grids[2].max() == 1499.5
@@ -0,0 +1,72 @@
+import os
+
+import numpy as np
+import pytest
+
+from src.core import rowindex
+from src.core.config import Config
+from src.core.loader import iter_chunks, load_file, load_rows
+from src.core.rowindex import RowIndex
+
+
+def test_build(tmp_path, monkeypatch, write_file):
+  monkeypatch.setattr(rowindex, 'SCAN_SIZE', 100) # newlines spread over several reads
+  for header in (True, False):
+    for newline in (True, False):
+      cfg = write_file(tmp_path / 'points.csv', 1000, header, newline)
+      index = RowIndex.build(cfg.file_path, header, every=64)
+      assert len(index) == 1000 and len(index.offsets) == 16
+      with open(cfg.file_path, 'rb') as f:
+        lines = f.read().split(b'\n')[int(header):]
+      starts = np.cumsum([0] + [len(line) + 1 for line in lines])[:-1] + (len(b'x,y,z,id\n') if header else 0)
+      assert np.array_equal(index.offsets, starts[::64])
+      assert sum(b - a for a, b, _, _ in index.blocks()) == 1000
+
+  cfg = write_file(tmp_path / 'empty.csv', 0)
+  assert len(RowIndex.build(cfg.file_path, True)) == 0 and RowIndex.build(cfg.file_path, True).split(4) == []
+
+
+def test_sidecar(tmp_path, write_file):
+  cfg = write_file(tmp_path / 'points.csv', 500)
+  index = RowIndex.get(cfg, every=32)
+  assert os.path.exists(cfg.file_path + '.pcvi')
+  loaded = RowIndex.load(cfg.file_path, True, 32)
+  assert loaded is not None and np.array_equal(loaded.offsets, index.offsets) and len(loaded) == 500
+  assert RowIndex.load(cfg.file_path, False) is None and RowIndex.load(cfg.file_path, True, 64) is None
+
+  write_file(tmp_path / 'points.csv', 600) # stale once the file changes
+  os.utime(cfg.file_path, ns=(0, index.stamp[1] + 10**9))
+  assert RowIndex.load(cfg.file_path, True, 32) is None
+  assert len(RowIndex.get(cfg, every=32)) == 600
+
+
+def test_sidecar_in_cache(tmp_path, monkeypatch, write_file):
+  monkeypatch.setenv('PCV_CACHE_DIR', str(tmp_path / 'cache'))
+  cfg = write_file(tmp_path / 'points.csv', 500)
+  os.mkdir(cfg.file_path + '.pcvi') # the directory of the file cannot hold the sidecar
+  index = RowIndex.get(cfg, every=32)
+  sidecar = RowIndex.sidecars(cfg.file_path)[1]
+  assert sidecar.startswith(str(tmp_path / 'cache')) and os.path.isfile(sidecar)
+  loaded = RowIndex.load(cfg.file_path, True, 32)
+  assert loaded is not None and np.array_equal(loaded.offsets, index.offsets)
+
+
+def test_random_access(tmp_path, write_file):
+  cfg = write_file(tmp_path / 'points.csv', 3000)
+  full = load_file(cfg)
+  index = RowIndex.get(cfg, every=100)
+  assert index.locate(250) == (index.offsets[2], 50)
+  for start, stop in ((0, 10), (250, 1234), (2999, 3000), (1000, 5000)):
+    assert np.array_equal(load_rows(cfg, start, stop, index), full[start:stop], equal_nan=True)
+  assert np.array_equal(np.concatenate(list(iter_chunks(cfg, rows=7, start=123, index=index))), full[123:], equal_nan=True)
+  assert len(load_rows(cfg, 3000, 3100, index)) == 0
+
+  parts = index.split(4)
+  assert parts[0][0] == 0 and parts[-1][1] == 3000 and all(a % 100 == 0 for a, _ in parts)
+  assert all(b == c for (_, b), (c, _) in zip(parts[:-1], parts[1:]))
+  assert np.array_equal(np.concatenate([load_rows(cfg, a, b, index) for a, b in parts]), full, equal_nan=True)
+
+  (tmp_path / 'bad.csv').write_text('x,y,z,id\n' + '1,2,3,4\n' * 150 + 'a,b,c,d\n')
+  bad = Config(str(tmp_path / 'bad.csv'), pattern='{x},{y},{z},{id}')
+  with pytest.raises(ValueError, match=r'bad\.csv:152\)'): # line numbers of the whole file
+    load_rows(bad, 120, 200, RowIndex.get(bad, every=100))
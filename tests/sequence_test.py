@@ -0,0 +1,63 @@
+import threading
+
+import numpy as np
+
+from src.core.config import Config
+from src.core.sequence import FrameRing
+
+
+def make_ring(n, size=1000, **kwargs):
+  decoded = []
+  gate = threading.Semaphore(0) # one decode per release
+
+  def decode(cfg):
+    gate.acquire()
+    k = int(cfg.file_path)
+    decoded.append(k)
+    if k == 13:
+      raise FileNotFoundError(cfg.file_path)
+    return np.full((size, 3), k, dtype=np.float64), np.zeros((size, 3))
+
+  return FrameRing([Config(str(k)) for k in range(n)], decode, **kwargs), decoded, gate
+
+
+def test_window():
+  ring, _, _ = make_ring(10, ahead=3, behind=1)
+  assert ring.window(0) == [0, 1, 9, 2, 3]
+  assert ring.window(8) == [8, 9, 7, 0, 1]
+  assert make_ring(2, ahead=3, behind=1)[0].window(1) == [1, 0]
+
+
+def test_ring_prefetch_and_evict():
+  ring, decoded, gate = make_ring(20, ahead=2, behind=1)
+  ring.start()
+  for _ in range(4):
+    gate.release()
+  assert ring.get(0, timeout=None).xyz[0, 0] == 0
+  assert ring.get(2, timeout=5) is not None and decoded == [0, 1, 19, 2] # nearest first
+  assert ring.seek(1) and ring.hits == 1        # decoded ahead
+  assert sorted(ring.frames) == [0, 1, 2]       # 19 left the window
+  gate.release()
+  assert ring.get(3, timeout=5) is not None
+  assert not ring.seek(10) and ring.misses == 1 # too far, decoded on demand
+  assert not ring.frames
+  gate.release()
+  assert ring.get(10, timeout=5).index == 10
+  for _ in range(10):
+    gate.release()
+  ring.close()
+  assert not ring.frames and ring.peak_bytes == 4 * 2 * 1000 * 3 * 8
+
+
+def test_ring_memory_bound():
+  ring, decoded, gate = make_ring(20, ahead=5, behind=0, max_bytes=3 * 48_000)
+  for _ in range(20):
+    gate.release()
+  ring.start()
+  assert ring.get(0, timeout=5) is not None and ring.get(2, timeout=5) is not None
+  assert ring.get(3, timeout=.2) is None and len(decoded) == 3 # no room for a fourth frame
+  ring.seek(12)
+  frame = ring.get(13, timeout=5)
+  assert frame.error is not None and frame.xyz is None and frame.nbytes == 0
+  assert ring.peak_bytes <= ring.max_bytes
+  ring.close()
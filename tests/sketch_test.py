@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from src.core.colormap import apply_colormap
+from src.core.config import Config
+from src.core.loader import load_file
+from src.core.point import Point, PointFactory
+from src.core.sketch import QuantileSketch
+from src.core.store import PointStore
+from src.utils.parser import parse_percentiles
+
+
+def test_scalar_field(tmp_path):
+  p = PointFactory('{x},{y},{z},{?},{i}')('1,2,3,x,-1.5e2')
+  assert p == Point(1, 2, 3) and p.i == -150 and np.isnan(p.t)
+  assert np.isnan(PointFactory('{x},{y},{z}')('1,2,3').i)
+
+  (tmp_path / 'a.csv').write_text(''.join(f'{k},0,0,{k * 10}\n' for k in range(30)))
+  (tmp_path / 'b.csv').write_text(''.join(f'{k},1,0\n' for k in range(5)))
+  a = load_file(Config(str(tmp_path / 'a.csv'), pattern='{x},{y},{z},{i}', skip_first_line=False))
+  b = load_file(Config(str(tmp_path / 'b.csv'), pattern='{x},{y},{z}', skip_first_line=False))
+  store = PointStore.from_chunks([a, b])
+  assert a.shape == (30, 9) and np.array_equal(store.fields['scalar'][:30], np.arange(30) * 10.)
+  assert np.isnan(store.fields['scalar'][30:]).all() and 'scalar' not in PointStore.from_chunks([b]).fields
+  colors = apply_colormap(store.fields['scalar'], 0, 290)
+  assert np.allclose(colors[30:], .5) and not np.allclose(colors[0], colors[29])
+  assert parse_percentiles('1,99.5') == (1, 99.5)
+
+
+def test_quantiles_within_accuracy():
+  rng = np.random.default_rng(0)
+  values = np.concatenate((rng.lognormal(3, 2, 200_000), -rng.exponential(5, 50_000), np.zeros(500)))
+  sketch = QuantileSketch().add(np.append(values, np.nan))
+  assert sketch.count == len(values) and sketch.zeros == 500
+  q = np.array([0, .01, .02, .1, .25, .5, .75, .98, .99, 1])
+  expected = np.quantile(values, q, method='lower')
+  assert np.all(np.abs(sketch.quantiles(q) - expected) <= .01 * np.abs(expected) + 1e-12)
+  assert sketch.quantiles([0, 1]).tolist() == [values.min(), values.max()] # the ends are exact
+
+
+def test_merge_is_exact():
+  values = np.random.default_rng(1).normal(100, 30, 50_000)
+  parts = [QuantileSketch().add(p) for p in np.array_split(values, 7)]
+  forward, backward = QuantileSketch(), QuantileSketch()
+  for s in parts:
+    forward = forward.merge(s)
+  for s in parts[::-1]:
+    backward = s.merge(backward)
+  whole = QuantileSketch().add(values)
+  q = np.linspace(0, 1, 101)
+  assert np.array_equal(forward.quantiles(q), whole.quantiles(q))
+  assert np.array_equal(backward.quantiles(q), whole.quantiles(q))
+  assert np.isnan(QuantileSketch().quantiles([.5])).all()
+  with pytest.raises(ValueError, match='accuracies'):
+    whole.merge(QuantileSketch(alpha=.05))
@@ -0,0 +1,60 @@
+import numpy as np
+
+from src.core.config import Config
+from src.core.loader import load_file
+from src.core.stats import Histogram, Stats, collect_stats, fit_width, format_table
+
+
+def assert_same(a, b):
+  assert (a.points, a.colored, a.timed, a.ids) == (b.points, b.colored, b.timed, b.ids)
+  assert np.array_equal(a.lo, b.lo) and np.array_equal(a.hi, b.hi)
+  for ha, hb in zip(a.histograms, b.histograms):
+    assert (ha.width, ha.first) == (hb.width, hb.first) and np.array_equal(ha.counts, hb.counts)
+  q = np.linspace(0, 1, 11)
+  assert a.scalar.count == b.scalar.count and np.array_equal(a.scalar.quantiles(q), b.scalar.quantiles(q), equal_nan=True)
+
+
+def test_merge_is_exact(make_points):
+  data = make_points(10_000)
+  whole = Stats.of(data)
+  assert whole.points == 10_000 and whole.colored == 5_000 and sum(whole.ids.values()) == 10_000
+  parts = [Stats.of(p) for p in np.array_split(data, [7, 1000, 1001, 6000])]
+  left = Stats()
+  for s in parts:
+    left = left.merge(s)
+  right = Stats()
+  for s in parts[::-1]:
+    right = s.merge(right)
+  tree = parts[0].merge(parts[3]).merge(parts[1].merge(parts[4]).merge(parts[2]))
+  for merged in (left, right, tree):
+    assert_same(merged, whole)
+
+
+def test_histogram():
+  values = np.random.default_rng(1).uniform(-3.3, 17.1, 5000)
+  width = fit_width(values.min(), values.max())
+  h = Histogram.of(values, width)
+  assert len(h.counts) <= 64 and len(Histogram.of(values, width / 2).counts) > 64
+  expected, _ = np.histogram(values, h.edges)
+  assert np.array_equal(h.counts, expected)
+  coarse = h.coarsen(width * 4)
+  assert coarse.counts.sum() == 5000 and np.array_equal(coarse.counts, np.histogram(values, coarse.edges)[0])
+
+
+def test_collect_stats(tmp_path):
+  cfgs = []
+  for k, n in enumerate([1000, 10]):
+    (tmp_path / f'f{k}.csv').write_text('x,y,z,id\n' + ''.join(f'{i % 7},{k},{i * .5},{i % 3}\n' for i in range(n)))
+    cfgs.append(Config(str(tmp_path / f'f{k}.csv'), pattern='{x},{y},{z},{id}'))
+  cfgs.append(Config(str(tmp_path / 'missing.csv'), pattern='{x},{y},{z}'))
+
+  stats = collect_stats(cfgs, workers=2)
+  assert stats[2] is None
+  for cfg, s in zip(cfgs, stats):
+    if s is not None:
+      assert_same(s, Stats.of(load_file(cfg)))
+  total = stats[0].merge(stats[1])
+  assert total.points == 1010 and total.ids == {0: 338, 1: 336, 2: 336}
+  table = format_table(['f0', 'f1', 'missing'], stats, total)
+  assert 'unknown file' in table and '1_010' in table
+  assert total.to_json()['bounds']['y'] == [0., 1.] and 't' not in total.to_json()['bounds']
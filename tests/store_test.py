@@ -0,0 +1,40 @@
+import numpy as np
+
+from src.core.point import Point
+from src.core.store import PointStore
+from src.core.voxel import VoxelGrid
+
+
+def test_from_points():
+  store = PointStore.from_points([Point(1, 2, 3, 255, 0, 0), Point(4, 5, 6, cid=2)], [(0, 1), (1, 2)])
+  assert len(store) == 2
+  assert np.array_equal(store.xyz, [[1, 2, 3], [4, 5, 6]])
+  assert np.array_equal(store.ids, [-1, 2])
+  assert np.allclose(store.colors()[0], (1, 0, 0))
+  assert store.colors() is store.colors() # cached
+
+
+def test_sample_is_nested():
+  store = PointStore(np.random.default_rng(0).random((1000, 3)), -np.ones((1000, 3)), -np.ones(1000))
+  small, large = store.sample(.1), store.sample(.5)
+  assert len(small) == 100 and len(large) == 500
+  assert set(small) <= set(large)
+
+
+def test_voxel_grid():
+  xyz = np.array([[.1, .1, .1], [.3, .3, .3], [1.1, .1, .1], [-.1, .1, .1]])
+  grid = VoxelGrid.from_xyz(xyz, 1.)
+  assert len(grid) == 3
+  assert np.array_equal(np.sort(grid.counts), [1, 1, 2])
+  assert np.allclose(grid.xyz[grid.inverse[0]], (.2, .2, .2))
+
+
+def test_view():
+  xyz = np.array([[.1, .1, .1], [.3, .3, .3], [1.1, .1, .1]])
+  store = PointStore(xyz, [[255, 0, 0], [0, 0, 255], [0, 255, 0]], [1, 1, 2])
+  pts, rgb = store.view(voxel_size=1.)
+  assert len(pts) == 2
+  assert np.allclose(rgb[np.argmin(pts[:, 0])], (.5, 0, .5))
+  assert store.voxel_grid(1.) is store.voxel_grid(1.)
+  pts, _ = store.view(frac=.5)
+  assert len(pts) == 1
@@ -0,0 +1,41 @@
+import os
+import zlib
+
+import numpy as np
+
+from src.core.thumbnail import VIEWS, Camera, PointRenderer, write_png, write_thumbnails
+
+
+def read_png(path):
+  with open(path, 'rb') as f:
+    data = f.read()
+  w, h = int.from_bytes(data[16:20], 'big'), int.from_bytes(data[20:24], 'big')
+  idat = data.index(b'IDAT')
+  size = int.from_bytes(data[idat - 4:idat], 'big')
+  rows = np.frombuffer(zlib.decompress(data[idat + 4:idat + 4 + size]), dtype=np.uint8).reshape(h, -1)
+  return rows[:, 1:].reshape(h, w, 3)
+
+
+def test_zbuffer():
+  # a red square above a blue one : red from the top, whatever the order of the points
+  g = np.stack(np.meshgrid(np.linspace(0, 1, 200), np.linspace(0, 1, 200)), axis=-1).reshape(-1, 2)
+  xyz = np.concatenate((np.c_[g, np.ones(len(g))], np.c_[g, np.zeros(len(g))]))
+  rgb = np.concatenate((np.tile([1., 0, 0], (len(g), 1)), np.tile([0, 0, 1.], (len(g), 1))))
+  for order in (np.arange(len(xyz)), np.arange(len(xyz))[::-1]):
+    image = PointRenderer(xyz[order], rgb[order], workers=3).render(VIEWS['top'], 64, 32)
+    drawn = (image != 255).any(axis=2)
+    assert drawn.sum() > 500 and (image[drawn] == [255, 0, 0]).all()
+    assert not drawn[:, :10].any() and not drawn[:, -10:].any() # the square is framed in the middle
+  from_below = PointRenderer(xyz, rgb).render(Camera(0, -90), 32, 32)
+  assert (from_below[16, 16] == [0, 0, 255]).all()
+  side = PointRenderer(xyz, rgb, max_points=1000).render(Camera(0, 0, fov=40), 32, 32)
+  assert (side != 255).any(axis=2).sum() > 0 and len(PointRenderer(xyz, rgb, max_points=1000)) == 1000
+
+
+def test_png(tmp_path):
+  image = np.random.default_rng(0).integers(0, 256, (7, 5, 3), dtype=np.uint8)
+  write_png(str(tmp_path / 'x' / 'a.png'), image)
+  assert np.array_equal(read_png(tmp_path / 'x' / 'a.png'), image) and os.listdir(tmp_path / 'x') == ['a.png']
+  paths = write_thumbnails(str(tmp_path / 'out'), np.zeros((0, 3)), np.zeros((0, 3)), size=8)
+  assert [p.rsplit('.', 2)[1] for p in paths] == ['top', 'side', 'iso']
+  assert (read_png(paths[0]) == 255).all() # nothing to draw
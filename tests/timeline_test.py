@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from src.core.cache import DownsampleCache
+from src.core.config import Config
+from src.core.loader import load_file
+from src.core.point import Point, PointFactory
+from src.core.store import PointStore
+from src.core.timeline import TimeIndex
+from src.utils.parser import parse_time_window
+
+
+def test_time_field(tmp_path):
+  p = PointFactory('{x},{y},{z},{t}')('1,2,3,3.25e5')
+  assert p == Point(1, 2, 3) and p.t == 325_000
+  assert np.isnan(PointFactory('{x},{y},{z}')('1,2,3').t)
+
+  (tmp_path / 'a.csv').write_text(''.join(f'{i},0,0,{100 + i / 10}\n' for i in range(50)))
+  (tmp_path / 'b.csv').write_text(''.join(f'{i},1,0\n' for i in range(20)))
+  a = load_file(Config(str(tmp_path / 'a.csv'), pattern='{x},{y},{z},{t}', skip_first_line=False))
+  b = load_file(Config(str(tmp_path / 'b.csv'), pattern='{x},{y},{z}', skip_first_line=False))
+  store = PointStore.from_chunks([a, b])
+  assert np.allclose(store.fields['time'][:50], 100 + np.arange(50) / 10) and np.isnan(store.fields['time'][50:]).all()
+  assert 'time' not in PointStore.from_chunks([b]).fields
+  with pytest.raises(ValueError, match=r'\{t\}'):
+    PointStore.from_chunks([b]).time_window(0, 1)
+
+
+def test_time_index():
+  rng = np.random.default_rng(0)
+  t = np.cumsum(rng.random(10_000))
+  index = TimeIndex.from_times(t)
+  assert index.order is None and index.span == (t[0], t[-1])
+  assert np.array_equal(index.window(100, 200), np.flatnonzero((t >= 100) & (t < 200)))
+
+  t[rng.random(10_000) < .1] = np.nan
+  shuffled = rng.permutation(t)
+  index = TimeIndex.from_times(shuffled)
+  assert index.order is not None and index.count == np.count_nonzero(~np.isnan(t))
+  for start, end in ((100, 200), (-5, 0), (4000, 1e9), (200, 100)):
+    rows = index.window(start, end)
+    assert np.array_equal(rows, np.flatnonzero((shuffled >= start) & (shuffled < end)))
+  # consecutive windows share no point and miss none
+  windows = [index.window(s, s + 500) for s in range(0, 6000, 500)]
+  assert sum(map(len, windows)) == index.count
+
+
+def test_time_window_cached(tmp_path):
+  rng = np.random.default_rng(1)
+  t = rng.random(5000) * 1800 # a half hour drive, scans out of order
+  store = PointStore(rng.random((5000, 3)), -np.ones((5000, 3)), -np.ones(5000), fields={'time': t})
+  store.use_cache(DownsampleCache(str(tmp_path)), 'abc')
+  window = store.time_window(60, 120)
+  assert np.array_equal(window.xyz, store.xyz[(t >= 60) & (t < 120)])
+  assert np.all((window.fields['time'] >= 60) & (window.fields['time'] < 120))
+
+  again = PointStore(store.xyz, store.rgb, store.ids, fields={'time': t})
+  again.use_cache(DownsampleCache(str(tmp_path)), 'abc')
+  assert again.cache.get('abc', 'time') is not None
+  assert np.array_equal(again.time_index().order, store.time_index().order) # read back from the cache
+  assert parse_time_window('60,120.5') == (60, 120.5)
+  for bad in ('60', '120,60', 'a,b'):
+    with pytest.raises(ValueError):
+      parse_time_window(bad)